@@ -1,43 +1,176 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, File, HTTPException, Request, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from app.services.image_service import generate_travel_photo, query_travel_photo_result
-from typing import Optional
+from app.core.config import settings
+from app.services.image_service import (
+    enqueue_travel_photo,
+    enqueue_travel_photos_batch,
+    generate_travel_photo,
+    generate_travel_photos_batch,
+    query_travel_photo_result,
+    query_travel_photo_results_batch,
+    submission_queue,
+    watch_travel_photo_result,
+)
+from app.services.quality_gate import InputQualityError
+from app.services.scene_library import SceneNotFoundError, scene_library
+from app.services.upload_service import store_upload
+from app.utils.admission import PRIORITY_FREE, PRIORITY_PAID, OverloadedError, request_priority
+from app.utils.credential_pool import credential_pool
+from app.utils.json_codec import FastJSONResponse, dumps_str
+from app.utils.static_files import STATIC_URL_PREFIX
+from app.utils.volcano_client import volcano_client
+from starlette.requests import HTTPConnection
+from typing import List, Optional
 
-router = APIRouter()
+router = APIRouter(default_response_class=FastJSONResponse)
 
 class TravelPhotoRequest(BaseModel):
     user_image_url: str
-    scene_image_url: str
-    location: str
+    scene_image_url: Optional[str] = None
+    scene_id: Optional[str] = None  # 场景库中的场景ID，与scene_image_url二选一
+    location: Optional[str] = None  # 使用scene_id时默认为场景所属地点
     style: str = "natural"  # natural, artistic, vintage, modern, cinematic
     quality: str = "high"   # high, ultra, professional
 
-@router.post("/generate-travel-photo")
+class BatchTravelPhotoRequest(BaseModel):
+    items: List[TravelPhotoRequest]
+
+class BatchTaskStatusRequest(BaseModel):
+    task_ids: List[str]
+
+def check_batch_size(size: int):
+    if size == 0 or size > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"批量数量需在1到{settings.BATCH_MAX_ITEMS}之间")
+
+def check_scene_input(item: TravelPhotoRequest):
+    """
+    场景照片需通过scene_image_url或scene_id二选一提供，未使用scene_id时必须指定地点
+    """
+    if bool(item.scene_image_url) == bool(item.scene_id):
+        raise HTTPException(status_code=400, detail="scene_image_url和scene_id需且只需提供一个")
+    if not item.scene_id and not item.location:
+        raise HTTPException(status_code=400, detail="缺少location")
+
+def overloaded(prefix: str, e: OverloadedError) -> HTTPException:
+    """
+    上游配额已满（429）或熔断（503）时快速返回，并告知客户端重试时间
+    """
+    return HTTPException(status_code=e.status_code, detail=f"{prefix}: {str(e)}",
+                         headers={"Retry-After": str(e.retry_after)})
+
+async def set_request_priority(request: Request):
+    """
+    根据网关设置的用户等级确定上游调用的排队优先级，付费用户优先
+    """
+    tier = request.headers.get(settings.PAID_TIER_HEADER, "")
+    request_priority.set(PRIORITY_PAID if tier.lower() == "paid" else PRIORITY_FREE)
+
+def public_url(request: HTTPConnection, path: str) -> str:
+    """
+    拼接对外可访问的完整URL，供火山引擎拉取图片
+    """
+    base_url = settings.PUBLIC_BASE_URL or str(request.base_url)
+    return base_url.rstrip("/") + path
+
+def absolute_result(request: HTTPConnection, result):
+    """
+    镜像到本地的结果是静态文件路径，返回给客户端前转换为完整URL
+    """
+    if isinstance(result, str) and result.startswith(STATIC_URL_PREFIX + "/"):
+        return public_url(request, result)
+    return result
+
+def absolute_event(request: HTTPConnection, event: dict) -> dict:
+    return {
+        **event,
+        "image_url": absolute_result(request, event["image_url"]),
+        "thumbnail_url": absolute_result(request, event["thumbnail_url"]),
+    }
+
+@router.post("/upload")
+async def upload_image_endpoint(request: Request, file: UploadFile = File(...)):
+    """
+    上传图片API接口，返回可用于生成接口的图片URL
+    """
+    try:
+        path = await store_upload(file)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"上传失败: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"上传失败: {str(e)}")
+    
+    return {
+        "success": True,
+        "result": {"url": public_url(request, path), "path": path},
+        "message": "上传成功"
+    }
+
+@router.post("/generate-travel-photo", dependencies=[Depends(set_request_priority)])
 async def generate_travel_photo_endpoint(request: TravelPhotoRequest):
     """
     生成旅游打卡照片API接口
     """
+    check_scene_input(request)
     try:
-        # 调用图像生成服务
-        result = await generate_travel_photo(
+        # 调用图像生成服务；开启持久化提交队列时写入队列后立即返回job_id
+        submit = generate_travel_photo if submission_queue is None else enqueue_travel_photo
+        result = await submit(
             request.user_image_url, 
             request.scene_image_url, 
             request.location,
             request.style,
-            request.quality
+            request.quality,
+            request.scene_id
         )
         
         return {
             "success": True,
             "result": result,
-            "message": "照片生成任务已提交"
+            "message": "照片生成任务已提交" if submission_queue is None else "照片生成任务已排队"
         }
     
+    except SceneNotFoundError as e:
+        raise HTTPException(status_code=404, detail=f"生成照片失败: {str(e)}")
+    except InputQualityError as e:
+        raise HTTPException(status_code=422, detail={"message": f"生成照片失败: {str(e)}", "reasons": e.reasons})
+    except OverloadedError as e:
+        raise overloaded("生成照片失败", e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"生成照片失败: {str(e)}")
 
+@router.post("/generate-travel-photo/batch", dependencies=[Depends(set_request_priority)])
+async def generate_travel_photo_batch_endpoint(request: BatchTravelPhotoRequest):
+    """
+    批量生成旅游打卡照片API接口，逐项返回task_id或错误信息
+    """
+    check_batch_size(len(request.items))
+    for item in request.items:
+        check_scene_input(item)
+    
+    submit = generate_travel_photos_batch if submission_queue is None else enqueue_travel_photos_batch
+    result = await submit([item.dict() for item in request.items])
+    
+    return {
+        "success": True,
+        "result": result,
+        "message": "批量任务已提交"
+    }
+
+@router.get("/scenes")
+async def list_scenes(location: Optional[str] = None):
+    """
+    查询场景库中的场景，指定location时只返回该地点的场景
+    """
+    scenes = scene_library.find(location) if location else scene_library
+    return {
+        "success": True,
+        "result": [{"scene_id": scene.scene_id, "location": scene.location, "url": scene.url} for scene in scenes],
+        "message": "查询成功"
+    }
+
 @router.get("/task-status/{task_id}")
-async def get_task_status(task_id: str):
+async def get_task_status(request: Request, task_id: str):
     """
     查询任务状态API接口
     """
@@ -47,9 +180,95 @@ async def get_task_status(task_id: str):
         
         return {
             "success": True,
-            "result": result,
+            "result": absolute_result(request, result),
             "message": "查询成功"
         }
     
+    except OverloadedError as e:
+        raise overloaded("查询失败", e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"查询失败: {str(e)}")
+
+
+@router.post("/task-status/batch")
+async def get_task_status_batch(request: Request, body: BatchTaskStatusRequest):
+    """
+    批量查询任务状态API接口，逐项返回结果或错误信息
+    """
+    check_batch_size(len(body.task_ids))
+    
+    result = await query_travel_photo_results_batch(body.task_ids)
+    for item in result:
+        if "result" in item:
+            item["result"] = absolute_result(request, item["result"])
+    
+    return {
+        "success": True,
+        "result": result,
+        "message": "查询成功"
+    }
+
+@router.get("/task-events/{task_id}")
+async def stream_task_events(request: Request, task_id: str):
+    """
+    通过Server-Sent Events推送任务状态变化，任务进入终态后结束
+    """
+    try:
+        events = await watch_travel_photo_result(task_id, settings.TASK_EVENTS_HEARTBEAT)
+    except OverloadedError as e:
+        raise overloaded("查询失败", e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"查询失败: {str(e)}")
+    
+    async def event_stream():
+        async for event in events:
+            if event is None:
+                # 心跳注释，防止代理断开空闲连接
+                yield ": keep-alive\n\n"
+            else:
+                event = absolute_event(request, event)
+                yield f"event: status\ndata: {dumps_str(event)}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/ws/task-events/{task_id}")
+async def websocket_task_events(websocket: WebSocket, task_id: str):
+    """
+    通过WebSocket推送任务状态变化，任务进入终态后关闭连接
+    """
+    await websocket.accept()
+    try:
+        events = await watch_travel_photo_result(task_id, settings.TASK_EVENTS_HEARTBEAT)
+    except Exception as e:
+        await websocket.send_json({"success": False, "message": f"查询失败: {str(e)}"})
+        await websocket.close(code=1011)
+        return
+    
+    try:
+        async for event in events:
+            if event is None:
+                await websocket.send_json({"type": "heartbeat"})
+            else:
+                await websocket.send_json({"type": "status", **absolute_event(websocket, event)})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        # 排队任务提交上游后才订阅上游任务，此时的查询失败在推送过程中出现
+        await websocket.send_json({"success": False, "message": f"查询失败: {str(e)}"})
+        await websocket.close(code=1011)
+
+@router.get("/upstream-status")
+async def get_upstream_status():
+    """
+    查询火山引擎各访问密钥、区域和接口的熔断器状态、最近的延迟分位数以及各访问密钥的状态
+    """
+    return {
+        "success": True,
+        "result": {"breakers": volcano_client.health(), "credentials": credential_pool.snapshot()},
+        "message": "查询成功"
+    }
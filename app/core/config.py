@@ -1,19 +1,200 @@
+import math
 import os
 from dotenv import load_dotenv
 
 # 加载.env文件
 load_dotenv()
 
+def parse_credentials(value: str, default_region: str) -> list:
+    """
+    解析凭证池配置，多组凭证以逗号分隔，每组格式为 access_key:secret_key[:region[:weight]]
+    权重必须是大于0的有限数，否则抛出ValueError并指出是第几组凭证（访问密钥只保留前4位）
+    """
+    credentials = []
+    for index, item in enumerate(value.split(","), 1):
+        parts = [part.strip() for part in item.split(":")]
+        if len(parts) < 2 or not parts[0] or not parts[1]:
+            continue
+        region = parts[2] if len(parts) > 2 and parts[2] else default_region
+        weight = 1.0
+        if len(parts) > 3 and parts[3]:
+            try:
+                weight = float(parts[3])
+            except ValueError:
+                weight = math.nan
+            if not math.isfinite(weight) or weight <= 0:
+                raise ValueError(f"VOLCANO_CREDENTIALS第{index}组凭证（{parts[0][:4]}***）的权重无效: {parts[3]}，"
+                                 "权重必须是大于0的有限数")
+        credentials.append((parts[0], parts[1], region, weight))
+    return credentials
+
 class Settings:
     # 火山引擎API配置
     VOLCANO_ACCESS_KEY: str = os.getenv("VOLCANO_ACCESS_KEY")
     VOLCANO_SECRET_KEY: str = os.getenv("VOLCANO_SECRET_KEY")
     VOLCANO_REGION: str = os.getenv("VOLCANO_REGION", "cn-north-1")
+    VOLCANO_ENDPOINT: str = os.getenv("VOLCANO_ENDPOINT", "https://visual.volcengineapi.com")
+    
+    # 火山引擎凭证池（为空时使用上面的单组凭证），权重通常按各密钥的配额设置
+    VOLCANO_CREDENTIALS: list = parse_credentials(
+        os.getenv("VOLCANO_CREDENTIALS", "")
+        or f"{os.getenv('VOLCANO_ACCESS_KEY', '')}:{os.getenv('VOLCANO_SECRET_KEY', '')}",
+        VOLCANO_REGION,
+    )
+    VOLCANO_CREDENTIAL_MAX_FAILURES: int = int(os.getenv("VOLCANO_CREDENTIAL_MAX_FAILURES", "5"))
+    VOLCANO_CREDENTIAL_EJECT_SECONDS: float = float(os.getenv("VOLCANO_CREDENTIAL_EJECT_SECONDS", "30"))
+    VOLCANO_TASK_PIN_MAX_ENTRIES: int = int(os.getenv("VOLCANO_TASK_PIN_MAX_ENTRIES", "100000"))
+    
+    # 火山引擎HTTP连接池配置
+    VOLCANO_MAX_CONNECTIONS: int = int(os.getenv("VOLCANO_MAX_CONNECTIONS", "100"))
+    VOLCANO_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("VOLCANO_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    VOLCANO_KEEPALIVE_EXPIRY: float = float(os.getenv("VOLCANO_KEEPALIVE_EXPIRY", "30"))
+    VOLCANO_CONNECT_TIMEOUT: float = float(os.getenv("VOLCANO_CONNECT_TIMEOUT", "5"))
+    VOLCANO_TIMEOUT: float = float(os.getenv("VOLCANO_TIMEOUT", "30"))
+    
+    # 火山引擎各Action的超时、重试、对冲与熔断配置
+    VOLCANO_SUBMIT_CONNECT_TIMEOUT: float = float(os.getenv("VOLCANO_SUBMIT_CONNECT_TIMEOUT", "5"))
+    VOLCANO_SUBMIT_READ_TIMEOUT: float = float(os.getenv("VOLCANO_SUBMIT_READ_TIMEOUT", "30"))
+    VOLCANO_QUERY_CONNECT_TIMEOUT: float = float(os.getenv("VOLCANO_QUERY_CONNECT_TIMEOUT", "3"))
+    VOLCANO_QUERY_READ_TIMEOUT: float = float(os.getenv("VOLCANO_QUERY_READ_TIMEOUT", "10"))
+    VOLCANO_MAX_RETRIES: int = int(os.getenv("VOLCANO_MAX_RETRIES", "2"))  # 提交只在连接未建立时重试
+    VOLCANO_RETRY_BASE_DELAY: float = float(os.getenv("VOLCANO_RETRY_BASE_DELAY", "0.2"))
+    VOLCANO_RETRY_MAX_DELAY: float = float(os.getenv("VOLCANO_RETRY_MAX_DELAY", "2"))
+    VOLCANO_HEDGE_PERCENTILE: float = float(os.getenv("VOLCANO_HEDGE_PERCENTILE", "95"))  # 0表示不对冲
+    VOLCANO_HEDGE_MIN_DELAY: float = float(os.getenv("VOLCANO_HEDGE_MIN_DELAY", "0.05"))
+    VOLCANO_BREAKER_FAILURES: int = int(os.getenv("VOLCANO_BREAKER_FAILURES", "5"))  # 0表示不熔断
+    VOLCANO_BREAKER_RECOVERY: float = float(os.getenv("VOLCANO_BREAKER_RECOVERY", "10"))
+    
+    # 任务状态轮询配置
+    TASK_POLL_MIN_INTERVAL: float = float(os.getenv("TASK_POLL_MIN_INTERVAL", "1"))
+    TASK_POLL_MAX_INTERVAL: float = float(os.getenv("TASK_POLL_MAX_INTERVAL", "10"))
+    TASK_POLL_BACKOFF: float = float(os.getenv("TASK_POLL_BACKOFF", "1.5"))
+    TASK_POLL_CONCURRENCY: int = int(os.getenv("TASK_POLL_CONCURRENCY", "20"))
+    TASK_RESULT_TTL: float = float(os.getenv("TASK_RESULT_TTL", "3600"))
+    TASK_EVENTS_HEARTBEAT: float = float(os.getenv("TASK_EVENTS_HEARTBEAT", "15"))
+    TASK_POLL_BATCH_SIZE: int = int(os.getenv("TASK_POLL_BATCH_SIZE", "100"))
+    TASK_POLL_LEASE: float = float(os.getenv("TASK_POLL_LEASE", "30"))  # 认领后未写回的任务在此之后可被其他进程接手
+    
+    # 任务状态存储配置（多worker部署时使用sqlite在进程间共享）
+    TASK_STORE_BACKEND: str = os.getenv("TASK_STORE_BACKEND", "memory")  # memory, sqlite
+    TASK_STORE_PATH: str = os.getenv("TASK_STORE_PATH", "data/tasks.db")
+    TASK_STORE_SYNC_INTERVAL: float = float(os.getenv("TASK_STORE_SYNC_INTERVAL", "1"))
+    
+    # 提交去重缓存配置（TTL不大于0时禁用）
+    SUBMISSION_CACHE_BACKEND: str = os.getenv("SUBMISSION_CACHE_BACKEND", "memory")  # memory, sqlite
+    SUBMISSION_CACHE_TTL: float = float(os.getenv("SUBMISSION_CACHE_TTL", "600"))
+    SUBMISSION_CACHE_MAX_ENTRIES: int = int(os.getenv("SUBMISSION_CACHE_MAX_ENTRIES", "10000"))
+    SUBMISSION_CACHE_PATH: str = os.getenv("SUBMISSION_CACHE_PATH", "data/submission_cache.db")
+    
+    # 持久化提交队列（开启后生成接口写入本地sqlite队列即返回job_id，由后台协程提交上游）
+    SUBMISSION_QUEUE_ENABLED: bool = os.getenv("SUBMISSION_QUEUE_ENABLED", "False").lower() == "true"
+    SUBMISSION_QUEUE_PATH: str = os.getenv("SUBMISSION_QUEUE_PATH", "data/submission_queue.db")
+    SUBMISSION_QUEUE_WORKERS: int = int(os.getenv("SUBMISSION_QUEUE_WORKERS", "8"))  # 每个进程同时提交的任务数
+    SUBMISSION_QUEUE_MAX_ATTEMPTS: int = int(os.getenv("SUBMISSION_QUEUE_MAX_ATTEMPTS", "5"))
+    SUBMISSION_QUEUE_RETRY_DELAY: float = float(os.getenv("SUBMISSION_QUEUE_RETRY_DELAY", "1"))  # 首次重试等待，之后加倍
+    SUBMISSION_QUEUE_LEASE: float = float(os.getenv("SUBMISSION_QUEUE_LEASE", "60"))  # 认领后未完成的任务在此之后重新提交
+    SUBMISSION_QUEUE_POLL_INTERVAL: float = float(os.getenv("SUBMISSION_QUEUE_POLL_INTERVAL", "0.5"))
+    
+    # 相似输入结果缓存（按输入图片的感知哈希复用已生成的结果，开启后每次提交前需下载两张输入图片）
+    PHASH_CACHE_ENABLED: bool = os.getenv("PHASH_CACHE_ENABLED", "False").lower() == "true"
+    PHASH_CACHE_ALGORITHM: str = os.getenv("PHASH_CACHE_ALGORITHM", "dhash")  # dhash, ahash
+    PHASH_CACHE_MAX_DISTANCE: int = int(os.getenv("PHASH_CACHE_MAX_DISTANCE", "3"))  # 每张图片允许的汉明距离
+    PHASH_CACHE_MAX_ENTRIES: int = int(os.getenv("PHASH_CACHE_MAX_ENTRIES", "100000"))
+    PHASH_CACHE_TTL: float = float(os.getenv("PHASH_CACHE_TTL", "43200"))  # 应短于上游结果URL的有效期
+    PHASH_CACHE_URL_ENTRIES: int = int(os.getenv("PHASH_CACHE_URL_ENTRIES", "10000"))  # 已计算哈希的URL数
+    PHASH_CACHE_FETCH_TIMEOUT: float = float(os.getenv("PHASH_CACHE_FETCH_TIMEOUT", "5"))
+    
+    # 提交前输入质量检查（下载用户照片检查分辨率、宽高比、清晰度和曝光）
+    # 阈值按quality分级，格式为 "high:20,ultra:35,professional:50"，不带等级的值作用于全部等级
+    QUALITY_GATE_MODE: str = os.getenv("QUALITY_GATE_MODE", "off")  # off, flag（只记录）, reject（拒绝提交）
+    QUALITY_GATE_MIN_SIDE: str = os.getenv("QUALITY_GATE_MIN_SIDE", "high:256,ultra:512,professional:768")
+    QUALITY_GATE_MAX_ASPECT: str = os.getenv("QUALITY_GATE_MAX_ASPECT", "3")
+    QUALITY_GATE_MIN_SHARPNESS: str = os.getenv("QUALITY_GATE_MIN_SHARPNESS", "high:20,ultra:35,professional:50")  # 拉普拉斯方差
+    QUALITY_GATE_MIN_BRIGHTNESS: str = os.getenv("QUALITY_GATE_MIN_BRIGHTNESS", "high:40,ultra:45,professional:50")
+    QUALITY_GATE_MAX_BRIGHTNESS: str = os.getenv("QUALITY_GATE_MAX_BRIGHTNESS", "high:220,ultra:215,professional:210")
+    QUALITY_GATE_MAX_CLIPPED: str = os.getenv("QUALITY_GATE_MAX_CLIPPED", "high:0.5,ultra:0.4,professional:0.3")  # 截断像素比例
+    QUALITY_GATE_URL_ENTRIES: int = int(os.getenv("QUALITY_GATE_URL_ENTRIES", "10000"))  # 记住检查结果的URL数
+    QUALITY_GATE_FETCH_TIMEOUT: float = float(os.getenv("QUALITY_GATE_FETCH_TIMEOUT", "5"))
+    
+    # 批量生成配置
+    BATCH_MAX_ITEMS: int = int(os.getenv("BATCH_MAX_ITEMS", "50"))
+    BATCH_CONCURRENCY: int = int(os.getenv("BATCH_CONCURRENCY", "10"))
+    
+    # Prompt缓存配置
+    PROMPT_CACHE_SIZE: int = int(os.getenv("PROMPT_CACHE_SIZE", "4096"))
+    PROMPT_WARM_LOCATIONS: list = [loc.strip() for loc in os.getenv("PROMPT_WARM_LOCATIONS", "").split(",") if loc.strip()]
+    
+    # 地点目录配置（JSON/YAML文件，为空时只使用内置地点）
+    LOCATION_CATALOG_PATH: str = os.getenv("LOCATION_CATALOG_PATH", "")
+    LOCATION_CATALOG_RELOAD_INTERVAL: float = float(os.getenv("LOCATION_CATALOG_RELOAD_INTERVAL", "5"))
+    LOCATION_FUZZY_THRESHOLD: float = float(os.getenv("LOCATION_FUZZY_THRESHOLD", "0.6"))
+    
+    # 场景库配置（由python -m app.services.scene_library离线构建的索引文件，为空时不接受scene_id）
+    SCENE_LIBRARY_PATH: str = os.getenv("SCENE_LIBRARY_PATH", "")
+    
+    # 图片处理配置
+    IMAGE_MAX_UPLOAD_BYTES: int = int(os.getenv("IMAGE_MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+    IMAGE_MAX_PIXELS: int = int(os.getenv("IMAGE_MAX_PIXELS", "60000000"))
+    IMAGE_READ_CHUNK_SIZE: int = int(os.getenv("IMAGE_READ_CHUNK_SIZE", str(256 * 1024)))
+    IMAGE_PROCESS_WORKERS: int = int(os.getenv("IMAGE_PROCESS_WORKERS", str(os.cpu_count() or 4)))
+    
+    # 下载用户提供的图片URL的限制：只允许http/https，拒绝解析到内网、回环、链路本地等非公网地址的URL（每次重定向都重新检查）
+    IMAGE_FETCH_ALLOW_PRIVATE: bool = os.getenv("IMAGE_FETCH_ALLOW_PRIVATE", "False").lower() == "true"  # 仅用于本地测试
+    IMAGE_FETCH_MAX_REDIRECTS: int = int(os.getenv("IMAGE_FETCH_MAX_REDIRECTS", "3"))
+    
+    # 上传图片配置
+    PUBLIC_BASE_URL: str = os.getenv("PUBLIC_BASE_URL", "")  # 对外访问地址，为空时使用请求的地址
+    UPLOAD_IMAGE_FORMAT: str = os.getenv("UPLOAD_IMAGE_FORMAT", "JPEG")  # JPEG, WEBP
+    UPLOAD_IMAGE_QUALITY: int = int(os.getenv("UPLOAD_IMAGE_QUALITY", "85"))
+    UPLOAD_MAX_DIMENSION: int = int(os.getenv("UPLOAD_MAX_DIMENSION", "1536"))
+    UPLOAD_TARGET_BYTES: int = int(os.getenv("UPLOAD_TARGET_BYTES", str(512 * 1024)))
+    STATIC_CACHE_MAX_AGE: int = int(os.getenv("STATIC_CACHE_MAX_AGE", "31536000"))
+    
+    # 生成结果镜像配置
+    RESULT_MIRROR_ENABLED: bool = os.getenv("RESULT_MIRROR_ENABLED", "True").lower() == "true"
+    RESULT_MIRROR_CONCURRENCY: int = int(os.getenv("RESULT_MIRROR_CONCURRENCY", "4"))
+    RESULT_CACHE_MAX_BYTES: int = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+    RESULT_THUMBNAIL_SIZE: int = int(os.getenv("RESULT_THUMBNAIL_SIZE", "256"))  # 0表示不生成缩略图
+    RESULT_DOWNLOAD_CHUNK_SIZE: int = int(os.getenv("RESULT_DOWNLOAD_CHUNK_SIZE", str(64 * 1024)))
+    RESULT_DOWNLOAD_MAX_BYTES: int = int(os.getenv("RESULT_DOWNLOAD_MAX_BYTES", str(50 * 1024 * 1024)))
+    
+    # 上游配额与准入控制配置（按访问密钥计，为整个服务的总量，由各worker进程按SERVER_WORKERS均分；QPS不大于0时不限速）
+    VOLCANO_SUBMIT_QPS: float = float(os.getenv("VOLCANO_SUBMIT_QPS", "2"))
+    VOLCANO_SUBMIT_BURST: float = float(os.getenv("VOLCANO_SUBMIT_BURST", "2"))
+    VOLCANO_QUERY_QPS: float = float(os.getenv("VOLCANO_QUERY_QPS", "10"))
+    VOLCANO_QUERY_BURST: float = float(os.getenv("VOLCANO_QUERY_BURST", "10"))
+    VOLCANO_MAX_CONCURRENCY: int = int(os.getenv("VOLCANO_MAX_CONCURRENCY", "10"))  # 0表示不限并发
+    ADMISSION_QUEUE_SIZE: int = int(os.getenv("ADMISSION_QUEUE_SIZE", "100"))
+    ADMISSION_MAX_WAIT: float = float(os.getenv("ADMISSION_MAX_WAIT", "10"))
+    PAID_TIER_HEADER: str = os.getenv("PAID_TIER_HEADER", "X-User-Tier")  # 由网关设置，值为paid时优先处理
+    
+    # 指标配置（开启时提供GET /metrics）
+    METRICS_ENABLED: bool = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+    
+    # 日志配置（结构化日志经队列由后台线程写出）
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT: str = os.getenv("LOG_FORMAT", "json")  # json, text
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # 队列满时丢弃新日志
+    LOG_PAYLOAD_SAMPLE_RATE: float = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0"))  # 记录上游响应内容的比例，0~1
+    REQUEST_ID_HEADER: str = os.getenv("REQUEST_ID_HEADER", "X-Request-ID")
+    
+    # 服务器配置（python main.py启动时使用，DEBUG时以单进程自动重载模式运行）
+    SERVER_HOST: str = os.getenv("SERVER_HOST", "0.0.0.0")
+    SERVER_PORT: int = int(os.getenv("SERVER_PORT", "8000"))
+    SERVER_WORKERS: int = int(os.getenv("SERVER_WORKERS", "1"))  # 大于1时需要TASK_STORE_BACKEND=sqlite
+    SERVER_LOOP: str = os.getenv("SERVER_LOOP", "auto")  # auto, asyncio, uvloop
+    SERVER_HTTP: str = os.getenv("SERVER_HTTP", "auto")  # auto, h11, httptools
+    SERVER_KEEPALIVE_TIMEOUT: int = int(os.getenv("SERVER_KEEPALIVE_TIMEOUT", "5"))
+    SERVER_BACKLOG: int = int(os.getenv("SERVER_BACKLOG", "2048"))
+    SERVER_LIMIT_CONCURRENCY: int = int(os.getenv("SERVER_LIMIT_CONCURRENCY", "0"))  # 每个worker的最大连接数，0表示不限
+    SERVER_LIMIT_MAX_REQUESTS: int = int(os.getenv("SERVER_LIMIT_MAX_REQUESTS", "0"))  # 处理多少请求后重启worker，0表示不重启
+    SERVER_GRACEFUL_SHUTDOWN_TIMEOUT: int = int(os.getenv("SERVER_GRACEFUL_SHUTDOWN_TIMEOUT", "30"))
+    SERVER_ACCESS_LOG: bool = os.getenv("SERVER_ACCESS_LOG", "False").lower() == "true"
     
     # 应用配置
     APP_NAME: str = "WanderAI Backend"
     DEBUG: bool = os.getenv("DEBUG", "False").lower() == "true"
-    
+
     # 静态文件配置
     STATIC_FOLDER: str = os.getenv("STATIC_FOLDER", "static")
     UPLOAD_FOLDER: str = os.getenv("UPLOAD_FOLDER", "static/uploads")
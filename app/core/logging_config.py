@@ -0,0 +1,197 @@
+"""
+结构化日志
+调用线程只生成消息文本并捕获上下文（请求ID、任务ID），随后放入有界队列；
+由后台线程格式化为JSON（或文本）写出，请求路径上没有同步I/O，队列满时丢弃新日志而不是阻塞。
+上游响应内容等详细日志按LOG_PAYLOAD_SAMPLE_RATE抽样记录，URL中的查询参数会被去掉
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+
+from app.core.config import settings
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+task_id_var: ContextVar[Optional[str]] = ContextVar("task_id", default=None)
+
+# LogRecord自带的属性，其余属性视为通过extra传入的结构化字段
+_RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id", "task_id"}
+_URL_QUERY = re.compile(r"""(https?://[^\s"'?]+)\?[^\s"']*""")
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._\-]{1,128}$")
+
+_EXCEPTION_FORMATTER = logging.Formatter()
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional["BufferedQueueHandler"] = None
+
+
+def redact_urls(text: str) -> str:
+    """
+    去掉文本中URL的查询参数（可能包含签名或访问令牌）
+    """
+    return _URL_QUERY.sub(r"\1?<redacted>", text)
+
+
+def sample_payload() -> bool:
+    """
+    是否记录本次请求的详细内容
+    """
+    rate = settings.LOG_PAYLOAD_SAMPLE_RATE
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+class ContextFilter(logging.Filter):
+    """
+    在记录日志的调用上下文中附加请求ID和任务ID
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.task_id = task_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    每条日志输出为一行JSON
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in ("request_id", "task_id"):
+            value = getattr(record, key, None)
+            if value is not None:
+                payload[key] = value
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exception"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """
+    便于本地阅读的单行文本格式，结构化字段以key=value附在末尾
+    """
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = {key: value for key, value in record.__dict__.items()
+                  if key not in _RECORD_ATTRIBUTES or key in ("request_id", "task_id")}
+        extras = " ".join(f"{key}={value}" for key, value in fields.items() if value is not None)
+        return f"{line} {extras}" if extras else line
+
+
+class BufferedQueueHandler(logging.handlers.QueueHandler):
+    """
+    非阻塞的队列日志处理器：队列满时丢弃日志并计数
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 只在调用线程中生成消息文本（参数可能在之后被修改），JSON序列化留给后台线程；
+        # 根日志记录器只有这一个处理器，直接修改记录而不复制
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _EXCEPTION_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging():
+    """
+    配置根日志记录器：经由队列交给后台线程写到标准输出（重复调用无副作用）
+    """
+    global _listener, _handler
+    if _listener is not None:
+        return
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(TextFormatter() if settings.LOG_FORMAT == "text" else JsonFormatter())
+    _handler = BufferedQueueHandler(queue.Queue(settings.LOG_QUEUE_SIZE))
+    _handler.addFilter(ContextFilter())
+    root = logging.getLogger()
+    root.handlers = [_handler]
+    root.setLevel(settings.LOG_LEVEL.upper())
+    # httpx每个请求都会输出一条INFO日志，上游请求已有指标统计
+    for name in ("httpx", "httpcore"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    _listener = logging.handlers.QueueListener(_handler.queue, stream_handler)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """
+    写出队列中剩余的日志并停止后台线程
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def dropped_logs() -> int:
+    return _handler.dropped if _handler is not None else 0
+
+
+class RequestContextMiddleware:
+    """
+    为每个请求设置请求ID（沿用调用方传入的请求ID头，否则生成），并在响应头中返回
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.header = settings.REQUEST_ID_HEADER.lower().encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == self.header:
+                request_id = value.decode("latin-1")
+                break
+        if request_id is None or not _REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(self.header, request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id_var.reset(token)
@@ -0,0 +1,63 @@
+"""
+生产环境服务器启动
+根据Settings构造uvicorn参数：多worker进程、事件循环与HTTP解析器实现、keep-alive与backlog限制、优雅退出超时；
+只有DEBUG时才以单进程自动重载模式运行；多worker时任务状态必须保存在共享的任务存储中，
+上游配额不足以均分给各worker时输出警告
+"""
+import logging
+import os
+
+import uvicorn
+
+from app.core.config import settings
+from app.utils.admission import overcommitted_limits
+
+# 项目根目录（main.py所在目录），多worker和自动重载模式下uvicorn按导入字符串加载应用
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+APP_IMPORT_STRING = "main:app"
+
+logger = logging.getLogger(__name__)
+
+
+def uvicorn_options() -> dict:
+    """
+    由配置生成uvicorn.run的参数
+    """
+    options = {
+        "host": settings.SERVER_HOST,
+        "port": settings.SERVER_PORT,
+        "loop": settings.SERVER_LOOP,
+        "http": settings.SERVER_HTTP,
+        "timeout_keep_alive": settings.SERVER_KEEPALIVE_TIMEOUT,
+        "backlog": settings.SERVER_BACKLOG,
+        "limit_concurrency": settings.SERVER_LIMIT_CONCURRENCY or None,
+        "limit_max_requests": settings.SERVER_LIMIT_MAX_REQUESTS or None,
+        "timeout_graceful_shutdown": settings.SERVER_GRACEFUL_SHUTDOWN_TIMEOUT or None,
+        "access_log": settings.SERVER_ACCESS_LOG,
+        "app_dir": PROJECT_ROOT,
+    }
+    if settings.DEBUG:
+        # 自动重载只用于开发，监视器常驻占用CPU且只能单进程运行
+        options.update(reload=True, reload_dirs=[os.path.join(PROJECT_ROOT, "app")], workers=1)
+    else:
+        options["workers"] = max(1, settings.SERVER_WORKERS)
+    return options
+
+
+def run():
+    """
+    按配置启动服务器
+    """
+    options = uvicorn_options()
+    # 内存任务存储只属于单个worker，任务提交后可能被其他worker查询不到
+    if options["workers"] > 1 and settings.TASK_STORE_BACKEND == "memory":
+        logger.error("Task state is not shared between workers with TASK_STORE_BACKEND=memory",
+                     extra={"workers": options["workers"]})
+        raise SystemExit(f"SERVER_WORKERS={options['workers']}时任务状态需要在worker之间共享，"
+                         "请设置TASK_STORE_BACKEND=sqlite或将SERVER_WORKERS设为1")
+    # 配额按worker数均分，份额不足1时按1计，多个worker合计会超过访问密钥的配额而被上游限流
+    overcommitted = overcommitted_limits(options["workers"])
+    if overcommitted:
+        logger.warning("Upstream quota is too small to split between workers",
+                       extra={"workers": options["workers"], "limits": overcommitted})
+    uvicorn.run(APP_IMPORT_STRING, **options)
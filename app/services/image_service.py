@@ -1,35 +1,270 @@
-from typing import Optional
+import asyncio
+import time
+from typing import AsyncIterator, List, Optional
+from app.core.config import settings
+from app.utils.metrics import REGISTRY, SERVICE_SECONDS
 from app.utils.volcano_api import call_volcano_image_api
-from app.utils.volcano_task_query import query_volcano_task_result
+from app.services.quality_gate import InputQualityError, create_quality_gate
+from app.services.result_cache import Fingerprint, create_result_cache
+from app.services.scene_library import SceneNotFoundError, scene_library
+from app.services.submission_cache import create_submission_cache
+from app.services.submission_queue import FAILED, SUBMITTED, Job, create_submission_queue, is_job_id
+from app.services.task_registry import FAILED_STATUSES, task_registry
 
+submission_cache = create_submission_cache()
+result_cache = create_result_cache()
+quality_gate = create_quality_gate()
+
+@SERVICE_SECONDS.labels("generate_travel_photo").time()
 async def generate_travel_photo(
     user_image_url: str,
-    scene_image_url: str,
-    location: str,
+    scene_image_url: Optional[str],
+    location: Optional[str],
     style: str = "natural",
-    quality: str = "high"
+    quality: str = "high",
+    scene_id: Optional[str] = None
 ):
     """
     生成旅游打卡照片服务
     参数:
         user_image_url: 用户照片URL地址
-        scene_image_url: 场景照片URL地址
-        location: 旅游地点
+        scene_image_url: 场景照片URL地址（指定scene_id时可为空）
+        location: 旅游地点（指定scene_id时可为空，默认为场景所属地点）
         style: 风格类型 (natural, artistic, vintage, modern, cinematic)
         quality: 质量等级 (high, ultra, professional)
+        scene_id: 场景库中的场景ID，代替scene_image_url
     """
-    # 调用火山引擎API生成照片
-    result = await call_volcano_image_api(user_image_url, scene_image_url, location, style, quality)
+    if scene_id:
+        # 上游拉取场景库登记的原图URL，本地只用预渲染的像素计算指纹
+        scene = scene_library.get(scene_id)
+        scene_image_url = scene.url
+        location = location or scene.location
+    
+    # 明显无法生成可用结果的用户照片在提交前拦截，不消耗上游配额
+    if quality_gate is not None:
+        await quality_gate.check(user_image_url, quality)
+    
+    async def submit():
+        # 调用火山引擎API生成照片
+        return await call_volcano_image_api(user_image_url, scene_image_url, location, style, quality)
+    
+    # 输入图片与已有任务足够相似时直接复用，不再提交上游
+    fingerprint = None
+    if result_cache is not None:
+        fingerprint = await result_cache.fingerprint(user_image_url, scene_image_url, location, style, quality,
+                                                     scene_id)
+        if fingerprint is not None:
+            reused = await _reuse_similar_task(fingerprint)
+            if reused is not None:
+                return reused
+    
+    if submission_cache is None:
+        result = await submit()
+    else:
+        # 相同参数的重复提交复用已有任务，已失效的任务重新提交
+        key = submission_cache.make_key(user_image_url, scene_image_url, location, style, quality)
+        result = await submission_cache.get_or_submit(key, submit)
+        entry = await task_registry.lookup(result)
+        if entry is not None and entry.status in FAILED_STATUSES:
+            await submission_cache.invalidate(key)
+            result = await submission_cache.get_or_submit(key, submit)
+    
+    # 登记任务，由后台轮询器统一跟踪状态
+    await task_registry.register(result)
+    if fingerprint is not None:
+        result_cache.add(fingerprint, result)
     
     return result
 
+async def _reuse_similar_task(fingerprint: Fingerprint) -> Optional[str]:
+    """
+    查找输入相似的已有任务：进行中或已完成时返回其task_id，已失败或无法恢复结果时返回None
+    """
+    found = result_cache.lookup(fingerprint)
+    if found is None:
+        return None
+    task_id, cached_result = found
+    entry = await task_registry.lookup(task_id)
+    if entry is None:
+        # 任务记录已被清理，用缓存的结果重新登记为已完成
+        if cached_result is None:
+            result_cache.discard(task_id)
+            return None
+        await task_registry.register_completed(task_id, cached_result)
+        return task_id
+    if entry.status in FAILED_STATUSES:
+        result_cache.discard(task_id)
+        return None
+    if entry.status == "done" and isinstance(entry.result, str):
+        result_cache.set_result(task_id, entry.result)
+    return task_id
+
+# 开启持久化提交队列时，生成请求先写入队列，由后台协程调用generate_travel_photo提交上游；
+# 输入照片不合格、场景不存在等错误重试也不会成功，直接标记为失败
+submission_queue = create_submission_queue(generate_travel_photo, (InputQualityError, SceneNotFoundError))
+if submission_queue is not None:
+    REGISTRY.add_collector(submission_queue.collect_metrics)
+
+@SERVICE_SECONDS.labels("enqueue_travel_photo").time()
+async def enqueue_travel_photo(
+    user_image_url: str,
+    scene_image_url: Optional[str],
+    location: Optional[str],
+    style: str = "natural",
+    quality: str = "high",
+    scene_id: Optional[str] = None
+) -> str:
+    """
+    把生成请求写入持久化提交队列，立即返回本地job_id（参数同generate_travel_photo）
+    """
+    # 场景ID在内存中即可校验，未知场景直接报错，不进入队列
+    if scene_id:
+        scene_library.get(scene_id)
+    
+    job_ids = await submission_queue.enqueue([{
+        "user_image_url": user_image_url,
+        "scene_image_url": scene_image_url,
+        "location": location,
+        "style": style,
+        "quality": quality,
+        "scene_id": scene_id,
+    }])
+    
+    return job_ids[0]
+
+async def enqueue_travel_photos_batch(items: List[dict]) -> List[dict]:
+    """
+    批量把生成请求写入持久化提交队列，整批在一个事务内写入
+    参数:
+        items: 每项为generate_travel_photo的参数字典
+    返回:
+        与items顺序一致的列表，每项包含task_id（即job_id）或error
+    """
+    results: List[Optional[dict]] = [None] * len(items)
+    accepted = []
+    for index, item in enumerate(items):
+        try:
+            if item.get("scene_id"):
+                scene_library.get(item["scene_id"])
+        except SceneNotFoundError as e:
+            results[index] = {"index": index, "error": str(e)}
+        else:
+            accepted.append(index)
+    
+    job_ids = await submission_queue.enqueue([items[index] for index in accepted])
+    for index, job_id in zip(accepted, job_ids):
+        results[index] = {"index": index, "task_id": job_id, "error": None}
+    
+    return results
+
+async def _get_job(job_id: str) -> Job:
+    job = await submission_queue.get(job_id)
+    if job is None:
+        raise ValueError(f"任务不存在: {job_id}")
+    return job
+
+@SERVICE_SECONDS.labels("query_travel_photo_result").time()
 async def query_travel_photo_result(task_id: str):
     """
     查询旅游打卡照片生成结果
     参数:
-        task_id: 任务ID
+        task_id: 任务ID（上游task_id或持久化提交队列的job_id）
     """
-    # 调用火山引擎任务查询API
-    result = await query_volcano_task_result(task_id)
+    # 队列中的任务提交上游后按上游task_id查询，尚未提交时返回排队状态
+    if submission_queue is not None and is_job_id(task_id):
+        job = await _get_job(task_id)
+        if job.status != SUBMITTED:
+            return job.to_result()
+        task_id = job.task_id
+    
+    # 从任务注册表读取状态，上游查询由后台轮询器完成
+    result = await task_registry.get_result(task_id)
     
     return result
+
+
+async def watch_travel_photo_result(task_id: str, heartbeat: Optional[float] = None):
+    """
+    订阅旅游打卡照片生成状态变化
+    先确认任务存在（失败时直接抛出异常），再返回状态事件的异步迭代器
+    参数:
+        task_id: 任务ID
+        heartbeat: 心跳间隔（秒），无变化时迭代器产出None
+    """
+    # 队列中尚未提交上游的任务立即开始推送排队状态，不等提交完成
+    if submission_queue is not None and is_job_id(task_id):
+        job = await _get_job(task_id)
+        if job.status != SUBMITTED:
+            return _watch_job(job, heartbeat)
+        task_id = job.task_id
+    
+    entry = await task_registry.resolve(task_id)
+    
+    return task_registry.watch(entry, heartbeat)
+
+async def _watch_job(job: Job, heartbeat: Optional[float]) -> AsyncIterator[Optional[dict]]:
+    """
+    推送队列中任务的状态：提交上游前推送queued/submitting，等待期间按心跳间隔产出None；
+    提交成功后转为订阅上游任务，提交失败时推送failed后结束
+    """
+    event, sent_at = None, time.monotonic()
+    while not job.finished:
+        if job.to_event() != event:
+            event, sent_at = job.to_event(), time.monotonic()
+            yield event
+        elif heartbeat and time.monotonic() - sent_at >= heartbeat:
+            sent_at = time.monotonic()
+            yield None
+        job = await submission_queue.wait_finished(job.job_id, settings.SUBMISSION_QUEUE_POLL_INTERVAL)
+        if job is None:
+            # 任务在等待期间被清理
+            return
+    if job.status == FAILED:
+        yield job.to_event()
+        return
+    
+    entry = await task_registry.resolve(job.task_id)
+    async for update in task_registry.watch(entry, heartbeat):
+        yield update
+
+
+async def _run_batch(items: list, worker) -> List[dict]:
+    """
+    在信号量限制下并发执行批量任务，单项失败只记录错误，不影响整批
+    """
+    semaphore = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+    
+    async def run(index: int, item):
+        async with semaphore:
+            try:
+                return {"index": index, **(await worker(item)), "error": None}
+            except Exception as e:
+                return {"index": index, "error": str(e)}
+    
+    return await asyncio.gather(*(run(index, item) for index, item in enumerate(items)))
+
+async def generate_travel_photos_batch(items: List[dict]) -> List[dict]:
+    """
+    批量生成旅游打卡照片
+    参数:
+        items: 每项为generate_travel_photo的参数字典
+    返回:
+        与items顺序一致的列表，每项包含task_id或error
+    """
+    async def worker(item: dict):
+        return {"task_id": await generate_travel_photo(**item)}
+    
+    return await _run_batch(items, worker)
+
+async def query_travel_photo_results_batch(task_ids: List[str]) -> List[dict]:
+    """
+    批量查询旅游打卡照片生成结果
+    参数:
+        task_ids: 任务ID列表
+    返回:
+        与task_ids顺序一致的列表，每项包含result或error
+    """
+    async def worker(task_id: str):
+        return {"task_id": task_id, "result": await query_travel_photo_result(task_id)}
+    
+    return await _run_batch(task_ids, worker)
@@ -0,0 +1,204 @@
+"""
+提交前输入质量检查
+提交上游前下载用户照片，在灰度小图上计算分辨率、宽高比、清晰度（拉普拉斯方差）和曝光指标，
+模糊、欠曝/过曝或过小的照片几乎只能生成无法使用的结果，却仍然消耗一次提交配额和多次查询。
+阈值按quality分级配置；QUALITY_GATE_MODE为reject时直接拒绝并返回不合格项，为flag时只记录日志和指标。
+同一URL的检查结果只计算一次，照片无法下载或解码时不拦截（由上游照常处理）
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.utils.image_utils import ImageQuality, download_image, measure_quality, run_in_image_pool
+from app.utils.metrics import INPUT_QUALITY_CHECKS
+
+logger = logging.getLogger(__name__)
+
+QUALITY_TIERS = ("high", "ultra", "professional")
+
+# 照片无法下载（含URL不允许下载）或无法解码时不拦截，其他异常照常抛出
+UNAVAILABLE_ERRORS = (httpx.HTTPError, OSError, SyntaxError, ValueError)
+
+
+class InputQualityError(ValueError):
+    """
+    用户照片未通过质量检查
+    参数:
+        reasons: 不合格项列表，每项包含check、value、limit和message
+    """
+
+    def __init__(self, reasons: List[dict]):
+        super().__init__("用户照片质量不合格: " + "；".join(reason["message"] for reason in reasons))
+        self.reasons = reasons
+
+
+@dataclass(frozen=True)
+class QualityThresholds:
+    min_side: float        # 短边最少像素数
+    max_aspect: float      # 长边与短边之比的上限
+    min_sharpness: float   # 拉普拉斯方差下限
+    min_brightness: float  # 平均亮度下限
+    max_brightness: float  # 平均亮度上限
+    max_clipped: float     # 截断像素比例上限
+
+
+def parse_tier_values(spec: str) -> Dict[str, float]:
+    """
+    解析按质量等级配置的阈值，如 "high:20,ultra:35,professional:50"；不带等级的值作用于全部等级
+    """
+    values: Dict[str, float] = {}
+    default = None
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        tier, _, value = item.rpartition(":")
+        if tier:
+            values[tier.strip()] = float(value)
+        else:
+            default = float(value)
+    if default is not None:
+        for tier in QUALITY_TIERS:
+            values.setdefault(tier, default)
+    return values
+
+
+def load_thresholds() -> Dict[str, QualityThresholds]:
+    """
+    从配置构建各质量等级的阈值
+    """
+    fields = {
+        "min_side": parse_tier_values(settings.QUALITY_GATE_MIN_SIDE),
+        "max_aspect": parse_tier_values(settings.QUALITY_GATE_MAX_ASPECT),
+        "min_sharpness": parse_tier_values(settings.QUALITY_GATE_MIN_SHARPNESS),
+        "min_brightness": parse_tier_values(settings.QUALITY_GATE_MIN_BRIGHTNESS),
+        "max_brightness": parse_tier_values(settings.QUALITY_GATE_MAX_BRIGHTNESS),
+        "max_clipped": parse_tier_values(settings.QUALITY_GATE_MAX_CLIPPED),
+    }
+    thresholds = {}
+    for tier in QUALITY_TIERS:
+        missing = [name for name, values in fields.items() if tier not in values]
+        if missing:
+            raise ValueError(f"质量等级{tier}缺少输入质量阈值: {', '.join(missing)}")
+        thresholds[tier] = QualityThresholds(**{name: values[tier] for name, values in fields.items()})
+    return thresholds
+
+
+def evaluate(quality: ImageQuality, thresholds: QualityThresholds) -> List[dict]:
+    """
+    按阈值检查图片质量指标，返回不合格项（全部合格时为空列表）
+    """
+    short_side, long_side = sorted((quality.width, quality.height))
+    checks = (
+        ("resolution", short_side, thresholds.min_side, short_side < thresholds.min_side,
+         f"照片分辨率过低（短边{short_side}像素，至少{thresholds.min_side:g}像素）"),
+        ("aspect", round(long_side / short_side, 2), thresholds.max_aspect, long_side > short_side * thresholds.max_aspect,
+         f"照片宽高比过大（{long_side / short_side:.1f}，最多{thresholds.max_aspect:g}）"),
+        ("sharpness", round(quality.sharpness, 1), thresholds.min_sharpness, quality.sharpness < thresholds.min_sharpness,
+         f"照片模糊（清晰度{quality.sharpness:.1f}，至少{thresholds.min_sharpness:g}）"),
+        ("underexposed", round(quality.brightness, 1), thresholds.min_brightness,
+         quality.brightness < thresholds.min_brightness,
+         f"照片过暗（平均亮度{quality.brightness:.0f}，至少{thresholds.min_brightness:g}）"),
+        ("overexposed", round(quality.brightness, 1), thresholds.max_brightness,
+         quality.brightness > thresholds.max_brightness,
+         f"照片过亮（平均亮度{quality.brightness:.0f}，最多{thresholds.max_brightness:g}）"),
+        ("clipped", round(quality.clipped, 3), thresholds.max_clipped, quality.clipped > thresholds.max_clipped,
+         f"照片大面积欠曝或过曝（{quality.clipped:.0%}的像素被截断，最多{thresholds.max_clipped:.0%}）"),
+    )
+    return [{"check": check, "value": value, "limit": limit, "message": message}
+            for check, value, limit, failed, message in checks if failed]
+
+
+class QualityGate:
+    """
+    提交前的用户照片质量检查
+    参数:
+        thresholds: 各质量等级的阈值
+        reject: True时拒绝不合格的照片，False时只记录
+        max_entries: 记住检查结果的URL数
+    """
+
+    def __init__(self, thresholds: Dict[str, QualityThresholds], reject: bool = True, max_entries: int = 10000):
+        self.thresholds = thresholds
+        self.reject = reject
+        self.max_entries = max_entries
+        self._measured: "OrderedDict[str, ImageQuality]" = OrderedDict()
+        self._fetching: Dict[str, asyncio.Task] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        """
+        打开下载用户照片的连接池（应用启动时调用）
+        """
+        if self._client is None:
+            # 重定向由download_image逐跳检查后跟随
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(settings.QUALITY_GATE_FETCH_TIMEOUT))
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def check(self, user_image_url: str, quality: str):
+        """
+        检查用户照片，reject模式下不合格时抛出InputQualityError
+        """
+        try:
+            measured = await self._measure(user_image_url)
+        except UNAVAILABLE_ERRORS as e:
+            logger.warning("Input quality check unavailable", extra={"error": str(e)})
+            INPUT_QUALITY_CHECKS.labels("unavailable").inc()
+            return
+        reasons = evaluate(measured, self.thresholds.get(quality, self.thresholds["high"]))
+        if not reasons:
+            INPUT_QUALITY_CHECKS.labels("passed").inc()
+            return
+        logger.info("Input quality check failed",
+                    extra={"checks": [reason["check"] for reason in reasons], "reject": self.reject})
+        INPUT_QUALITY_CHECKS.labels("rejected" if self.reject else "flagged").inc()
+        if self.reject:
+            raise InputQualityError(reasons)
+
+    async def _measure(self, url: str) -> ImageQuality:
+        """
+        返回图片URL的质量指标，同一URL只下载计算一次，并发请求共享同一次下载
+        """
+        measured = self._measured.get(url)
+        if measured is not None:
+            self._measured.move_to_end(url)
+            return measured
+        fetching = self._fetching.get(url)
+        if fetching is None:
+            fetching = asyncio.ensure_future(self._fetch(url))
+            self._fetching[url] = fetching
+        return await asyncio.shield(fetching)
+
+    async def _fetch(self, url: str) -> ImageQuality:
+        try:
+            if self._client is None:
+                await self.start()
+            data = await download_image(self._client, url)
+            measured = await run_in_image_pool(measure_quality, data)
+            self._measured[url] = measured
+            while len(self._measured) > self.max_entries:
+                self._measured.popitem(last=False)
+            return measured
+        finally:
+            self._fetching.pop(url, None)
+
+
+def create_quality_gate() -> Optional[QualityGate]:
+    """
+    根据配置创建输入质量检查，QUALITY_GATE_MODE为off时返回None
+    """
+    mode = settings.QUALITY_GATE_MODE.lower()
+    if mode == "off":
+        return None
+    if mode not in ("flag", "reject"):
+        raise ValueError(f"不支持的QUALITY_GATE_MODE: {settings.QUALITY_GATE_MODE}")
+    return QualityGate(load_thresholds(), reject=mode == "reject", max_entries=settings.QUALITY_GATE_URL_ENTRIES)
@@ -0,0 +1,191 @@
+"""
+相似输入结果缓存
+提交前下载两张输入图片并计算感知哈希，以 (用户照片哈希, 场景照片哈希, 地点, 风格, 质量) 为键记录已提交的任务；
+重新上传或重新签名的同一张照片URL不同但哈希相近，两张图片的汉明距离都不超过PHASH_CACHE_MAX_DISTANCE时
+直接复用已有任务（已完成时立即返回生成结果），不再调用上游提交。
+同一URL的哈希只计算一次（热门场景照片只下载一次），条目数超过上限时按LRU淘汰；
+缓存保存在进程内存中，多worker部署时各进程分别缓存
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from app.core.config import settings
+from app.services.scene_library import scene_library
+from app.services.task_registry import TaskEntry, task_registry
+from app.utils.image_utils import download_image, run_in_image_pool
+from app.utils.metrics import RESULT_CACHE_LOOKUPS
+from app.utils.perceptual_hash import MultiIndexHashTable, hamming_distance, image_hash
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    """
+    一次生成请求的内容指纹
+    """
+    user_hash: int
+    scene_hash: int
+    params: Tuple[str, str, str]  # (地点, 风格, 质量)
+
+
+@dataclass
+class CachedResult:
+    fingerprint: Fingerprint
+    expires_at: float
+    result: Optional[str] = None  # 任务完成后的图片URL
+
+
+class ResultCache:
+    """
+    按感知哈希索引的结果缓存
+    参数:
+        max_entries: 最大条目数
+        ttl: 条目有效期（秒）
+        max_distance: 每张图片允许的最大汉明距离
+        algorithm: 感知哈希算法（dhash或ahash）
+    """
+
+    def __init__(self, max_entries: int, ttl: float, max_distance: int, algorithm: str = "dhash"):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.algorithm = algorithm
+        # task_id -> 缓存条目，按最近使用排序
+        self._entries: "OrderedDict[str, CachedResult]" = OrderedDict()
+        # 按用户照片哈希建立索引，候选再核对场景照片哈希（热门场景照片的哈希相同，不适合作为索引）
+        self._index = MultiIndexHashTable(max_distance)
+        self._url_hashes: "OrderedDict[str, int]" = OrderedDict()
+        self._fetching: Dict[str, asyncio.Task] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        """
+        打开下载输入图片的连接池并监听任务完成事件（应用启动时调用）
+        """
+        if self._client is None:
+            # 重定向由download_image逐跳检查后跟随
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(settings.PHASH_CACHE_FETCH_TIMEOUT))
+            task_registry.add_done_listener(self._on_done)
+
+    async def close(self):
+        if self._client is not None:
+            task_registry.remove_done_listener(self._on_done)
+            await self._client.aclose()
+            self._client = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def fingerprint(self, user_image_url: str, scene_image_url: str, location: str, style: str,
+                          quality: str, scene_id: Optional[str] = None) -> Optional[Fingerprint]:
+        """
+        计算请求的内容指纹，图片下载或解码失败时返回None（此时不使用缓存）
+        指定scene_id时场景照片的哈希由场景库中的像素计算，不下载场景照片
+        """
+        scene_hash = (scene_library.perceptual_hash(scene_id, self.algorithm) if scene_id
+                      else self._url_hash(scene_image_url))
+        try:
+            user_hash, scene_hash = await asyncio.gather(self._url_hash(user_image_url), scene_hash)
+        except Exception as e:
+            logger.warning("Perceptual hash unavailable", extra={"error": str(e)})
+            RESULT_CACHE_LOOKUPS.labels("unavailable").inc()
+            return None
+        return Fingerprint(user_hash, scene_hash, (location, style, quality))
+
+    def lookup(self, fingerprint: Fingerprint) -> Optional[Tuple[str, Optional[str]]]:
+        """
+        查找两张图片都足够相近的已有任务，返回 (task_id, 已知的结果URL)，多个命中时取距离之和最小的
+        """
+        now = time.time()
+        best, best_distance = None, None
+        for task_id in self._index.candidates(fingerprint.params, fingerprint.user_hash):
+            cached = self._entries.get(task_id)
+            if cached is None:
+                continue
+            if cached.expires_at <= now:
+                self.discard(task_id)
+                continue
+            user_distance = hamming_distance(cached.fingerprint.user_hash, fingerprint.user_hash)
+            scene_distance = hamming_distance(cached.fingerprint.scene_hash, fingerprint.scene_hash)
+            if user_distance > self.max_distance or scene_distance > self.max_distance:
+                continue
+            if best_distance is None or user_distance + scene_distance < best_distance:
+                best, best_distance = task_id, user_distance + scene_distance
+        RESULT_CACHE_LOOKUPS.labels("miss" if best is None else "hit").inc()
+        if best is None:
+            return None
+        self._entries.move_to_end(best)
+        return best, self._entries[best].result
+
+    def add(self, fingerprint: Fingerprint, task_id: str):
+        """
+        记录新提交的任务
+        """
+        if task_id in self._entries:
+            self._entries.move_to_end(task_id)
+            return
+        self._entries[task_id] = CachedResult(fingerprint, time.time() + self.ttl)
+        self._index.add(task_id, fingerprint.params, fingerprint.user_hash)
+        while len(self._entries) > self.max_entries:
+            self.discard(next(iter(self._entries)))
+
+    def set_result(self, task_id: str, result: str):
+        cached = self._entries.get(task_id)
+        if cached is not None:
+            cached.result = result
+
+    def discard(self, task_id: str):
+        cached = self._entries.pop(task_id, None)
+        if cached is not None:
+            self._index.remove(task_id, cached.fingerprint.params, cached.fingerprint.user_hash)
+
+    def _on_done(self, entry: TaskEntry):
+        if isinstance(entry.result, str):
+            self.set_result(entry.task_id, entry.result)
+
+    async def _url_hash(self, url: str) -> int:
+        """
+        返回图片URL的感知哈希，同一URL只下载计算一次，并发请求共享同一次下载
+        """
+        hash_value = self._url_hashes.get(url)
+        if hash_value is not None:
+            self._url_hashes.move_to_end(url)
+            return hash_value
+        fetching = self._fetching.get(url)
+        if fetching is None:
+            fetching = asyncio.ensure_future(self._fetch_hash(url))
+            self._fetching[url] = fetching
+        # shield：单个调用方被取消时不影响其他等待同一下载的调用方
+        return await asyncio.shield(fetching)
+
+    async def _fetch_hash(self, url: str) -> int:
+        try:
+            if self._client is None:
+                await self.start()
+            data = await download_image(self._client, url)
+            hash_value = await run_in_image_pool(image_hash, data, self.algorithm)
+            self._url_hashes[url] = hash_value
+            while len(self._url_hashes) > settings.PHASH_CACHE_URL_ENTRIES:
+                self._url_hashes.popitem(last=False)
+            return hash_value
+        finally:
+            self._fetching.pop(url, None)
+
+
+def create_result_cache() -> Optional[ResultCache]:
+    """
+    根据配置创建相似输入结果缓存，未开启时返回None
+    """
+    if not settings.PHASH_CACHE_ENABLED:
+        return None
+    if settings.PHASH_CACHE_ALGORITHM not in ("dhash", "ahash"):
+        raise ValueError(f"不支持的PHASH_CACHE_ALGORITHM: {settings.PHASH_CACHE_ALGORITHM}")
+    return ResultCache(settings.PHASH_CACHE_MAX_ENTRIES, settings.PHASH_CACHE_TTL,
+                       settings.PHASH_CACHE_MAX_DISTANCE, settings.PHASH_CACHE_ALGORITHM)
@@ -0,0 +1,276 @@
+"""
+生成结果镜像
+任务完成后在后台把火山引擎返回的图片分块流式下载到RESULT_FOLDER，可选生成缩略图，
+之后通过本地静态文件URL提供访问；目录总大小按最近访问时间淘汰控制在上限以内。
+访问时间记录在文件的atime上，淘汰时扫描整个目录，多个worker进程下载的文件和重启前的文件都计入上限
+"""
+import asyncio
+import glob
+import hashlib
+import logging
+import os
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from app.core.config import settings
+from app.services.task_registry import TaskEntry, task_registry
+from app.utils.image_utils import encode_image, load_image_fit, run_in_image_pool
+from app.utils.static_files import static_url
+
+CONTENT_TYPE_EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+}
+THUMBNAIL_SUFFIX = "_thumb"
+
+# 同一文件两次记录访问时间的最小间隔（秒），以及进程内记住的最近访问文件数
+TOUCH_INTERVAL = 60.0
+TOUCH_CACHE_SIZE = 10000
+
+logger = logging.getLogger(__name__)
+
+
+def result_key(task_id: str) -> str:
+    """
+    任务对应的本地文件名（不含扩展名），同一任务的结果内容不会变化
+    """
+    return hashlib.sha256(task_id.encode('utf-8')).hexdigest()[:32]
+
+
+def make_thumbnail(source_path: str, thumbnail_path: str):
+    """
+    生成缩略图（同步函数，在图片处理线程池中执行），先写入临时文件再原子替换
+    """
+    with open(source_path, "rb") as f:
+        image = load_image_fit(f.read(), settings.RESULT_THUMBNAIL_SIZE)
+    data = encode_image(image, "JPEG", 80)
+    tmp_path = f"{thumbnail_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, thumbnail_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def file_key(path: str) -> str:
+    """
+    结果文件或缩略图对应的键
+    """
+    return os.path.basename(path).split(".")[0].split(THUMBNAIL_SUFFIX)[0]
+
+
+def mark_used(path: str):
+    """
+    把文件的atime更新为当前时间作为最近访问时间，保留mtime（同步函数，在线程中执行）
+    """
+    try:
+        os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+    except OSError:
+        pass
+
+
+def scan_results() -> List[Tuple[str, int, float]]:
+    """
+    按最近访问时间从旧到新列出结果目录中的 (键, 占用字节数, 最近访问时间)，结果与缩略图合并计算（同步函数）
+    """
+    sizes: Dict[str, int] = {}
+    used: Dict[str, float] = {}
+    with os.scandir(settings.RESULT_FOLDER) as entries:
+        for entry in entries:
+            if entry.name.endswith(".tmp") or "." not in entry.name:
+                continue
+            try:
+                stat_result = entry.stat()
+            except OSError:
+                # 扫描期间被其他进程删除
+                continue
+            key = file_key(entry.name)
+            sizes[key] = sizes.get(key, 0) + stat_result.st_size
+            used[key] = max(used.get(key, 0.0), stat_result.st_atime, stat_result.st_mtime)
+    return [(key, sizes[key], used[key]) for key in sorted(sizes, key=used.get)]
+
+
+def select_evictions(keep: Optional[str] = None) -> List[str]:
+    """
+    结果目录总大小超过上限时，选出需要淘汰的最久未访问的结果（同步函数）
+    参数:
+        keep: 不淘汰的键（刚镜像完成的结果）
+    """
+    results = scan_results()
+    total = sum(size for _, size, _ in results)
+    keys = []
+    for key, size, _ in results[:-1]:
+        if total <= settings.RESULT_CACHE_MAX_BYTES:
+            break
+        if key == keep:
+            continue
+        keys.append(key)
+        total -= size
+    return keys
+
+
+def remove_files(keys: List[str]):
+    """
+    删除结果文件及其缩略图（同步函数，在线程中执行）
+    """
+    for key in keys:
+        for path in glob.glob(os.path.join(settings.RESULT_FOLDER, key + "*")):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class ResultMirror:
+    """
+    结果镜像服务，监听任务注册表中的完成事件
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._pending: set = set()
+        self._evict_lock = asyncio.Lock()
+        # 路径 -> 本进程最近一次记录访问时间的时刻（time.monotonic()）
+        self._touched: Dict[str, float] = {}
+
+    async def start(self):
+        """
+        按上限清理已有文件并开始监听（应用启动时调用）
+        """
+        if not settings.RESULT_MIRROR_ENABLED or self._client is not None:
+            return
+        await asyncio.to_thread(os.makedirs, settings.RESULT_FOLDER, exist_ok=True)
+        await self._evict()
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.VOLCANO_TIMEOUT, connect=settings.VOLCANO_CONNECT_TIMEOUT),
+            follow_redirects=True,
+        )
+        self._semaphore = asyncio.Semaphore(settings.RESULT_MIRROR_CONCURRENCY)
+        task_registry.add_done_listener(self.schedule)
+
+    async def close(self):
+        if self._client is None:
+            return
+        task_registry.remove_done_listener(self.schedule)
+        for pending in list(self._pending):
+            pending.cancel()
+        await asyncio.gather(*self._pending, return_exceptions=True)
+        await self._client.aclose()
+        self._client = None
+
+    def schedule(self, entry: TaskEntry):
+        """
+        任务完成时的回调：在后台镜像结果，不阻塞轮询器
+        """
+        if not isinstance(entry.result, str) or entry.local_url:
+            return
+        pending = asyncio.create_task(self._mirror(entry))
+        self._pending.add(pending)
+        pending.add_done_callback(self._pending.discard)
+
+    def touch(self, path: str):
+        """
+        静态文件被访问时调用，在线程中更新文件的最近访问时间，同一文件每TOUCH_INTERVAL秒最多更新一次
+        """
+        if os.path.dirname(os.path.abspath(path)) != os.path.abspath(settings.RESULT_FOLDER):
+            return
+        now = time.monotonic()
+        if now - self._touched.get(path, -TOUCH_INTERVAL) < TOUCH_INTERVAL:
+            return
+        if len(self._touched) >= TOUCH_CACHE_SIZE:
+            self._touched.clear()
+        self._touched[path] = now
+        asyncio.get_running_loop().run_in_executor(None, mark_used, path)
+
+    async def _mirror(self, entry: TaskEntry):
+        key = result_key(entry.task_id)
+        thumbnail_path = os.path.join(settings.RESULT_FOLDER, key + THUMBNAIL_SUFFIX + ".jpg")
+        try:
+            async with self._semaphore:
+                path = await asyncio.to_thread(self._find_existing, key)
+                if path is None:
+                    path = await self._download(entry.result, key)
+                else:
+                    await asyncio.to_thread(mark_used, path)
+                if settings.RESULT_THUMBNAIL_SIZE > 0 and not await asyncio.to_thread(os.path.exists, thumbnail_path):
+                    await run_in_image_pool(make_thumbnail, path, thumbnail_path)
+            has_thumbnail = await asyncio.to_thread(self._has_thumbnail, thumbnail_path)
+        except Exception as e:
+            # 镜像失败时继续使用上游URL
+            logger.warning("Result mirror failed", extra={"error": str(e)})
+            return
+
+        if has_thumbnail:
+            entry.thumbnail_url = static_url(thumbnail_path)
+        entry.local_url = static_url(path)
+        await task_registry.save(entry)
+        await self._evict(key)
+
+    async def _download(self, url: str, key: str) -> str:
+        """
+        分块流式下载到临时文件，完成后原子替换，内存中最多只保留一个分块；文件操作在线程中执行
+        """
+        tmp_path = os.path.join(settings.RESULT_FOLDER, f"{key}.{uuid.uuid4().hex}.tmp")
+        try:
+            async with self._client.stream("GET", url) as response:
+                response.raise_for_status()
+                content_type = response.headers.get("content-type", "").split(";")[0].strip()
+                extension = CONTENT_TYPE_EXTENSIONS.get(content_type, "jpg")
+                received = 0
+                f = await asyncio.to_thread(open, tmp_path, "wb")
+                try:
+                    async for chunk in response.aiter_bytes(settings.RESULT_DOWNLOAD_CHUNK_SIZE):
+                        received += len(chunk)
+                        if received > settings.RESULT_DOWNLOAD_MAX_BYTES:
+                            raise ValueError("结果图片超过大小限制")
+                        await asyncio.to_thread(f.write, chunk)
+                finally:
+                    await asyncio.to_thread(f.close)
+            path = os.path.join(settings.RESULT_FOLDER, f"{key}.{extension}")
+            await asyncio.to_thread(os.replace, tmp_path, path)
+            return path
+        finally:
+            await asyncio.to_thread(self._remove_if_exists, tmp_path)
+
+    def _find_existing(self, key: str) -> Optional[str]:
+        for extension in CONTENT_TYPE_EXTENSIONS.values():
+            path = os.path.join(settings.RESULT_FOLDER, f"{key}.{extension}")
+            if os.path.exists(path):
+                return path
+        return None
+
+    @staticmethod
+    def _remove_if_exists(path: str):
+        if os.path.exists(path):
+            os.remove(path)
+
+    @staticmethod
+    def _has_thumbnail(thumbnail_path: str) -> bool:
+        return settings.RESULT_THUMBNAIL_SIZE > 0 and os.path.exists(thumbnail_path)
+
+    async def _evict(self, keep: Optional[str] = None):
+        """
+        扫描结果目录，总大小超过上限时删除最久未访问的结果，并清除对应任务记录的本地地址
+        参数:
+            keep: 不淘汰的键（刚镜像完成的结果）
+        """
+        async with self._evict_lock:
+            keys = await asyncio.to_thread(select_evictions, keep)
+            if not keys:
+                return
+            # 先清除地址再删除文件，避免返回指向已删除文件的URL；文件可能由其他worker下载，按任务状态存储查找所属任务
+            owners = {result_key(task_id): task_id for task_id in await task_registry.store.list_mirrored()}
+            evicted = [owners[key] for key in keys if key in owners]
+            if evicted:
+                await task_registry.clear_local_urls(evicted)
+            await asyncio.to_thread(remove_files, keys)
+
+
+result_mirror = ResultMirror()
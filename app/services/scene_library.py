@@ -0,0 +1,303 @@
+"""
+预渲染场景库
+场景照片来自固定的景点目录，离线构建步骤把每张场景照片解码并缩放为512x512 RGB一次，
+全部写入同一个uint8数组文件，另有JSON索引记录每个场景的ID、地点、原图URL和在数组文件中的字节偏移；
+服务启动时以只读方式内存映射数组文件，多个worker共享同一份页缓存，读取场景像素只需缺页，不再下载和解码JPEG。
+请求可以用scene_id代替scene_image_url，上游仍然拉取目录中登记的原图URL
+
+构建:
+    python -m app.services.scene_library scenes.yaml data/scenes.json --workers 8
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from app.core.config import settings
+from app.services.upload_service import write_file_atomic
+from app.utils.image_utils import TARGET_SIZE, check_image_size, load_image, probe_image_size, run_in_image_pool
+from app.utils.location_index import load_catalog, normalize_location
+from app.utils.perceptual_hash import HASH_FUNCTIONS
+
+# NumPy和PIL在打开场景库时才导入
+if TYPE_CHECKING:
+    import numpy as np
+    from PIL import Image
+
+INDEX_VERSION = 1
+
+# 每个场景的数组形状：高 x 宽 x RGB
+FRAME_SHAPE = (TARGET_SIZE[1], TARGET_SIZE[0], 3)
+
+logger = logging.getLogger(__name__)
+
+
+class SceneNotFoundError(LookupError):
+    """
+    场景库中不存在请求的scene_id
+    """
+
+
+@dataclass(frozen=True)
+class Scene:
+    scene_id: str
+    location: str
+    url: str     # 原图URL，提交上游时使用
+    offset: int  # 像素数据在数组文件中的字节偏移
+
+
+class SceneLibrary:
+    """
+    内存映射的场景库
+    参数:
+        path: 索引文件路径，为空时场景库为空（不接受scene_id）
+    """
+
+    def __init__(self, path: str = ""):
+        self.path = path
+        self._scenes: Dict[str, Scene] = {}
+        self._by_location: Dict[str, List[Scene]] = {}
+        self._data: Optional["np.memmap"] = None
+        self._shape: Tuple[int, int, int] = FRAME_SHAPE
+        self._hashes: Dict[Tuple[str, str], int] = {}
+
+    def open(self):
+        """
+        读取索引并内存映射数组文件（应用启动时调用）
+        """
+        if not self.path:
+            return
+        import numpy as np
+        with open(self.path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        if index.get("version") != INDEX_VERSION:
+            raise ValueError(f"不支持的场景库索引版本: {index.get('version')}")
+
+        shape = tuple(index["shape"])
+        frame_bytes = int(np.prod(shape))
+        scenes = [Scene(item["scene_id"], item["location"], item["url"], item["offset"]) for item in index["scenes"]]
+        data = None
+        if scenes:
+            data_path = os.path.join(os.path.dirname(self.path), index["data"])
+            data = np.memmap(data_path, dtype=np.uint8, mode="r")
+            if max(scene.offset for scene in scenes) + frame_bytes > data.size:
+                raise ValueError(f"场景库数据文件不完整: {data_path}")
+
+        by_location: Dict[str, List[Scene]] = {}
+        for scene in scenes:
+            by_location.setdefault(normalize_location(scene.location), []).append(scene)
+        self._scenes = {scene.scene_id: scene for scene in scenes}
+        self._by_location = by_location
+        self._data = data
+        self._shape = shape
+        self._hashes.clear()
+        logger.info("Scene library opened", extra={"scenes": len(scenes), "path": self.path})
+
+    def close(self):
+        self._scenes = {}
+        self._by_location = {}
+        self._data = None
+        self._hashes.clear()
+
+    def __len__(self) -> int:
+        return len(self._scenes)
+
+    def __contains__(self, scene_id: str) -> bool:
+        return scene_id in self._scenes
+
+    def __iter__(self) -> Iterator[Scene]:
+        return iter(self._scenes.values())
+
+    def get(self, scene_id: str) -> Scene:
+        scene = self._scenes.get(scene_id)
+        if scene is None:
+            raise SceneNotFoundError(f"场景不存在: {scene_id}")
+        return scene
+
+    def find(self, location: str) -> List[Scene]:
+        """
+        返回某个地点的全部场景（地点名称按归一化后比较）
+        """
+        return list(self._by_location.get(normalize_location(location), ()))
+
+    def pixels(self, scene_id: str) -> "np.ndarray":
+        """
+        返回场景的像素数组（高 x 宽 x RGB，只读），直接引用内存映射，不复制数据
+        """
+        scene = self.get(scene_id)
+        size = self._shape[0] * self._shape[1] * self._shape[2]
+        return self._data[scene.offset:scene.offset + size].reshape(self._shape)
+
+    def image(self, scene_id: str) -> "Image.Image":
+        from PIL import Image
+        return Image.fromarray(self.pixels(scene_id), "RGB")
+
+    async def perceptual_hash(self, scene_id: str, algorithm: str = "dhash") -> int:
+        """
+        返回场景的感知哈希，在图片处理线程池中由内存映射的像素计算，每个场景只计算一次
+        """
+        key = (scene_id, algorithm)
+        hash_value = self._hashes.get(key)
+        if hash_value is None:
+            self.get(scene_id)
+            hash_value = await run_in_image_pool(self._compute_hash, scene_id, algorithm)
+            self._hashes[key] = hash_value
+        return hash_value
+
+    def _compute_hash(self, scene_id: str, algorithm: str) -> int:
+        return HASH_FUNCTIONS[algorithm](self.image(scene_id))
+
+
+scene_library = SceneLibrary(settings.SCENE_LIBRARY_PATH)
+
+
+def render_scene(data: bytes) -> "np.ndarray":
+    """
+    解码并缩放一张场景照片，返回uint8像素数组（同步函数，在线程池中执行）
+    """
+    import numpy as np
+    size = probe_image_size(data)
+    if size is None:
+        raise ValueError("无法识别的图片格式")
+    check_image_size(size)
+    return np.asarray(load_image(data, TARGET_SIZE), dtype=np.uint8)
+
+
+def read_scene_source(entry: dict, base_dir: str, client: httpx.Client) -> bytes:
+    """
+    读取场景原图：优先使用目录中的本地文件path（相对目录文件所在位置），否则下载url
+    """
+    if entry.get("path"):
+        with open(os.path.join(base_dir, entry["path"]), "rb") as f:
+            data = f.read()
+    else:
+        response = client.get(entry["url"])
+        response.raise_for_status()
+        data = response.content
+    if len(data) > settings.IMAGE_MAX_UPLOAD_BYTES:
+        raise ValueError(f"图片大小超过限制({settings.IMAGE_MAX_UPLOAD_BYTES}字节)")
+    return data
+
+
+def _parse_scenes(entries: List[dict]) -> List[dict]:
+    """
+    校验场景目录条目：每个场景需有scene_id（字典格式时为键名）、location和url，scene_id不能重复
+    """
+    scenes, seen = [], set()
+    for entry in entries:
+        scene_id = str(entry.get("scene_id") or entry.get("name") or "")
+        if not scene_id or not entry.get("location") or not entry.get("url"):
+            raise ValueError(f"场景目录条目缺少scene_id、location或url: {entry}")
+        if scene_id in seen:
+            raise ValueError(f"场景ID重复: {scene_id}")
+        seen.add(scene_id)
+        scenes.append({**entry, "scene_id": scene_id})
+    return scenes
+
+
+def build_library(catalog_path: str, output_path: str, workers: int) -> List[Tuple[str, str]]:
+    """
+    从场景目录构建场景库：并行解码缩放每张场景照片，写入新的数组文件后再原子替换索引，
+    已打开旧场景库的进程继续使用旧文件的映射，不受影响
+    参数:
+        catalog_path: 场景目录（JSON/YAML），每项包含scene_id、location、url以及可选的本地文件path
+        output_path: 索引文件路径，数组文件写在同一目录下
+        workers: 并行解码的线程数
+    返回:
+        处理失败的 (scene_id, 错误信息) 列表，失败的场景不写入场景库
+    """
+    import numpy as np
+    scenes = _parse_scenes(load_catalog(catalog_path))
+    base_dir = os.path.dirname(os.path.abspath(catalog_path))
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(output_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(output_path))[0]
+    data_name = f"{stem}-{uuid.uuid4().hex[:12]}.bin"
+    data_path = os.path.join(output_dir, data_name)
+    frame_bytes = int(np.prod(FRAME_SHAPE))
+
+    failed: List[Tuple[str, str]] = []
+    rendered = [False] * len(scenes)
+    array = np.memmap(data_path, dtype=np.uint8, mode="w+", shape=(max(len(scenes), 1), *FRAME_SHAPE))
+    try:
+        with httpx.Client(timeout=30, follow_redirects=True) as client, \
+                ThreadPoolExecutor(max_workers=workers) as pool:
+            def render(row: int):
+                try:
+                    array[row] = render_scene(read_scene_source(scenes[row], base_dir, client))
+                    rendered[row] = True
+                except Exception as e:
+                    failed.append((scenes[row]["scene_id"], str(e)))
+
+            list(pool.map(render, range(len(scenes))))
+
+        # 去掉失败场景留下的空行，成功的场景依次前移
+        kept = []
+        for row, ok in enumerate(rendered):
+            if ok:
+                if row != len(kept):
+                    array[len(kept)] = array[row]
+                kept.append(scenes[row])
+        array.flush()
+        del array
+        os.truncate(data_path, len(kept) * frame_bytes)
+    except BaseException:
+        os.remove(data_path)
+        raise
+
+    previous_data = None
+    if os.path.exists(output_path):
+        try:
+            with open(output_path, "r", encoding="utf-8") as f:
+                previous_data = json.load(f).get("data")
+        except (OSError, ValueError):
+            pass
+
+    index = {
+        "version": INDEX_VERSION,
+        "data": data_name,
+        "shape": list(FRAME_SHAPE),
+        "scenes": [
+            {"scene_id": scene["scene_id"], "location": scene["location"], "url": scene["url"],
+             "offset": row * frame_bytes}
+            for row, scene in enumerate(kept)
+        ],
+    }
+    write_file_atomic(output_path, json.dumps(index, ensure_ascii=False).encode("utf-8"))
+    # 旧数组文件：已映射它的进程在关闭前仍可读取（Linux下删除只移除目录项）
+    if previous_data and previous_data != data_name:
+        try:
+            os.remove(os.path.join(output_dir, previous_data))
+        except OSError:
+            pass
+    return failed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="构建预渲染场景库")
+    parser.add_argument("catalog", help="场景目录文件（JSON/YAML）")
+    parser.add_argument("output", help="场景库索引文件路径，即SCENE_LIBRARY_PATH")
+    parser.add_argument("--workers", type=int, default=settings.IMAGE_PROCESS_WORKERS, help="并行解码的线程数")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    failed = build_library(args.catalog, args.output, args.workers)
+    for scene_id, error in failed:
+        print(f"failed  {scene_id}: {error}", file=sys.stderr)
+    with open(args.output, "r", encoding="utf-8") as f:
+        count = len(json.load(f)["scenes"])
+    print(f"built {count} scenes into {args.output} in {time.perf_counter() - started:.1f}s, {len(failed)} failed",
+          file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+"""
+生成任务提交去重缓存
+相同输入的重复提交（连点、前端超时重试）直接复用已有的task_id，
+并发中的相同提交合并为一次上游调用（single-flight）
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from app.core.config import settings
+
+
+class MemorySubmissionBackend:
+    """
+    内存后端：带TTL的LRU
+    参数:
+        ttl: 缓存有效期（秒）
+        max_entries: 最大条目数，超出时淘汰最久未使用的条目
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[str]:
+        item = self._entries.get(key)
+        if item is None:
+            return None
+        task_id, expires_at = item
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return task_id
+
+    async def set(self, key: str, task_id: str):
+        self._entries[key] = (task_id, time.time() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def close(self):
+        pass
+
+
+class SqliteSubmissionBackend:
+    """
+    sqlite后端：数据落盘，进程重启后仍可去重
+    数据库操作在线程中执行，多进程并发写入由sqlite的文件锁串行化
+    参数:
+        path: 数据库文件路径
+        ttl: 缓存有效期（秒）
+        max_entries: 最大条目数，超出时按最近使用时间淘汰
+    """
+
+    # 每写入多少条检查一次容量，避免每次写入都统计行数
+    EVICT_EVERY = 100
+
+    def __init__(self, path: str, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS submissions ("
+            "key TEXT PRIMARY KEY, task_id TEXT NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_submissions_last_used ON submissions(last_used)")
+
+    async def _run_db(self, func, *args):
+        return await asyncio.to_thread(self._locked, func, *args)
+
+    def _locked(self, func, *args):
+        with self._lock:
+            return func(*args)
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        # 游标在持锁期间关闭，避免在其他线程中被回收时与正在进行的语句冲突
+        cursor = self._conn.execute(sql, params)
+        try:
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    async def get(self, key: str) -> Optional[str]:
+        def query():
+            now = time.time()
+            rows = self._execute("SELECT task_id FROM submissions WHERE key = ? AND expires_at > ?", (key, now))
+            if not rows:
+                return None
+            self._execute("UPDATE submissions SET last_used = ? WHERE key = ?", (now, key))
+            return rows[0][0]
+
+        return await self._run_db(query)
+
+    async def set(self, key: str, task_id: str):
+        def store():
+            now = time.time()
+            self._execute(
+                "INSERT OR REPLACE INTO submissions (key, task_id, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, task_id, now + self.ttl, now)
+            )
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict(now)
+
+        await self._run_db(store)
+
+    async def delete(self, key: str):
+        await self._run_db(self._execute, "DELETE FROM submissions WHERE key = ?", (key,))
+
+    def _evict(self, now: float):
+        self._execute("DELETE FROM submissions WHERE expires_at <= ?", (now,))
+        # 沿last_used索引找到第max_entries新的条目，删除比它更旧的条目，不需要扫描全表
+        self._execute(
+            "DELETE FROM submissions WHERE last_used < "
+            "(SELECT last_used FROM submissions ORDER BY last_used DESC LIMIT 1 OFFSET ?)",
+            (self.max_entries - 1,)
+        )
+
+    def close(self):
+        self._conn.close()
+
+
+class SubmissionCache:
+    """
+    提交去重缓存，组合存储后端与进程内的single-flight合并
+    参数:
+        backend: 存储后端，需实现异步的get/set/delete
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def make_key(user_image_url: str, scene_image_url: str, location: str, style: str, quality: str) -> str:
+        """
+        根据全部生成参数计算内容键
+        """
+        payload = json.dumps([user_image_url, scene_image_url, location, style, quality], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    async def get_or_submit(self, key: str, submit: Callable[[], Awaitable[str]]) -> str:
+        """
+        命中缓存时返回已有task_id；相同键的并发提交共享同一次上游调用
+        参数:
+            key: 内容键
+            submit: 实际提交任务的协程函数，返回task_id
+        """
+        task_id = await self.backend.get(key)
+        if task_id:
+            return task_id
+
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            inflight = asyncio.ensure_future(self._submit(key, submit))
+            self._inflight[key] = inflight
+        # shield：单个调用方被取消时不影响其他等待同一提交的调用方
+        return await asyncio.shield(inflight)
+
+    async def invalidate(self, key: str):
+        await self.backend.delete(key)
+
+    async def _submit(self, key: str, submit: Callable[[], Awaitable[str]]) -> str:
+        try:
+            task_id = await submit()
+            await self.backend.set(key, task_id)
+            return task_id
+        finally:
+            self._inflight.pop(key, None)
+
+
+def create_submission_cache() -> Optional[SubmissionCache]:
+    """
+    根据配置创建提交去重缓存，TTL不大于0时禁用
+    """
+    if settings.SUBMISSION_CACHE_TTL <= 0:
+        return None
+    if settings.SUBMISSION_CACHE_BACKEND == "sqlite":
+        backend = SqliteSubmissionBackend(settings.SUBMISSION_CACHE_PATH,
+                                          settings.SUBMISSION_CACHE_TTL,
+                                          settings.SUBMISSION_CACHE_MAX_ENTRIES)
+    elif settings.SUBMISSION_CACHE_BACKEND == "memory":
+        backend = MemorySubmissionBackend(settings.SUBMISSION_CACHE_TTL,
+                                          settings.SUBMISSION_CACHE_MAX_ENTRIES)
+    else:
+        raise ValueError(f"不支持的SUBMISSION_CACHE_BACKEND: {settings.SUBMISSION_CACHE_BACKEND}")
+    return SubmissionCache(backend)
@@ -0,0 +1,355 @@
+"""
+持久化提交队列（write-behind）
+开启后生成接口只把请求参数写入本地sqlite队列（WAL模式）并立即返回本地生成的job_id，
+由后台协程按SUBMISSION_QUEUE_WORKERS的并发调用上游提交，接口延迟不再包含上游提交延迟，
+流量突增时按本地磁盘的速度接收请求，积压的任务随后按上游配额逐步提交。
+队列落盘，进程重启后未提交的任务继续提交；多个worker进程共享同一个队列文件时由各进程原子认领，
+认领的进程在提交期间定期续租，进程崩溃等原因导致SUBMISSION_QUEUE_LEASE秒内未续租的任务由其他进程重新提交（此时上游可能收到重复提交）。
+提交成功后记录上游task_id，task-status等接口据此把job_id解析为上游任务
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Type
+
+from app.core.config import settings
+from app.core.logging_config import task_id_var
+from app.utils.admission import OverloadedError, request_priority
+from app.utils.metrics import SUBMISSION_QUEUE_DEPTH, SUBMISSION_QUEUE_JOBS
+
+logger = logging.getLogger(__name__)
+
+JOB_ID_PREFIX = "job-"
+
+# 任务状态：queued（等待提交）、submitting（已被某个进程认领）、submitted（已取得上游task_id）、failed
+QUEUED = "queued"
+SUBMITTING = "submitting"
+SUBMITTED = "submitted"
+FAILED = "failed"
+
+# 清理已结束任务的间隔（秒）
+PURGE_INTERVAL = 60
+
+
+def is_job_id(task_id: str) -> bool:
+    return task_id.startswith(JOB_ID_PREFIX)
+
+
+async def _wait_event(event: asyncio.Event, timeout: float):
+    """
+    等待事件被设置，最多等待timeout秒
+    不使用asyncio.wait_for：Python 3.11中事件恰好在取消的同时被设置时，wait_for会吞掉取消，
+    stop()取消提交协程时协程继续运行，stop()一直等待
+    """
+    waiter = asyncio.ensure_future(event.wait())
+    try:
+        await asyncio.wait({waiter}, timeout=timeout)
+    finally:
+        waiter.cancel()
+
+
+@dataclass
+class Job:
+    job_id: str
+    params: dict
+    priority: int
+    status: str
+    task_id: Optional[str] = None      # 上游task_id，提交成功后填入
+    last_error: Optional[str] = None
+    attempts: int = 0                  # 提交失败的次数（配额已满而推迟的不计入）
+    next_attempt_at: float = 0.0
+    created_at: float = 0.0
+    updated_at: float = 0.0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (SUBMITTED, FAILED)
+
+    def to_result(self) -> dict:
+        """
+        尚未取得上游task_id时返回的任务状态（与上游任务未完成时的返回格式一致）
+        """
+        if self.status == FAILED:
+            return {"task_id": self.job_id, "status": FAILED, "error": self.last_error}
+        return {"task_id": self.job_id, "status": self.status}
+
+    def to_event(self) -> dict:
+        """
+        尚未取得上游task_id时推送给订阅者的事件内容（与上游任务的事件格式一致）
+        """
+        return {**self.to_result(), "image_url": None, "thumbnail_url": None}
+
+
+class SubmissionQueue:
+    """
+    sqlite持久化的提交队列与后台提交协程
+    参数:
+        path: 数据库文件路径
+        submit_func: 提交函数，以任务参数为关键字参数调用，返回上游task_id
+        permanent_errors: 重试也无法成功的异常类型（如输入照片不合格），出现时直接标记为失败
+    """
+
+    COLUMNS = ("job_id", "params", "priority", "status", "task_id", "last_error", "attempts",
+               "next_attempt_at", "created_at", "updated_at")
+
+    def __init__(self, path: str, submit_func: Callable[..., Awaitable[str]],
+                 permanent_errors: Tuple[Type[BaseException], ...] = ()):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._submit_func = submit_func
+        self._permanent_errors = permanent_errors
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, params TEXT NOT NULL, priority INTEGER NOT NULL, status TEXT NOT NULL, "
+            "task_id TEXT, last_error TEXT, attempts INTEGER NOT NULL, next_attempt_at REAL NOT NULL, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_due ON jobs(status, next_attempt_at)")
+        self._select = f"SELECT {', '.join(self.COLUMNS)} FROM jobs"
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # 本进程提交完成时唤醒等待中的订阅者，其他进程完成的任务靠轮询发现
+        self._finished = asyncio.Event()
+        self._purged_at = 0.0
+        self._renewed_at = 0.0
+
+    async def _run_db(self, func, *args):
+        return await asyncio.to_thread(self._locked, func, *args)
+
+    def _locked(self, func, *args):
+        with self._lock:
+            return func(*args)
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        # 游标在持锁期间关闭，避免在其他线程中被回收时与正在进行的语句冲突
+        cursor = self._conn.execute(sql, params)
+        try:
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def _executemany(self, sql: str, rows: list):
+        self._conn.executemany(sql, rows).close()
+
+    def _transaction(self, func, *args):
+        # BEGIN IMMEDIATE在事务开始时即获取写锁，保证认领的原子性
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = func(*args)
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+        return result
+
+    @staticmethod
+    def _job(row: tuple) -> Job:
+        return Job(row[0], json.loads(row[1]), *row[2:])
+
+    async def start(self):
+        """
+        启动后台提交协程（应用启动时调用）
+        """
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        停止提交协程；正在提交的任务放回队列，下次启动（或由其他进程）重新提交
+        """
+        if self._dispatcher is None:
+            return
+        self._dispatcher.cancel()
+        inflight = dict(self._inflight)
+        for task in inflight.values():
+            task.cancel()
+        await asyncio.gather(self._dispatcher, *inflight.values(), return_exceptions=True)
+        self._dispatcher = None
+        if inflight:
+            await self._run_db(self._executemany,
+                               "UPDATE jobs SET status = ?, next_attempt_at = ? WHERE job_id = ? AND status = ?",
+                               [(QUEUED, time.time(), job_id, SUBMITTING) for job_id in inflight])
+
+    def close(self):
+        self._conn.close()
+
+    async def enqueue(self, items: Iterable[dict], priority: Optional[int] = None) -> List[str]:
+        """
+        把生成请求写入队列（同一批在一个事务内写入），返回各自的job_id
+        参数:
+            items: 每项为提交函数的关键字参数
+            priority: 上游准入的排队优先级，默认取当前请求的request_priority
+        """
+        priority = request_priority.get() if priority is None else priority
+        now = time.time()
+        rows = [(f"{JOB_ID_PREFIX}{uuid.uuid4().hex}", json.dumps(item, ensure_ascii=False), priority, QUEUED,
+                 None, None, 0, now, now, now) for item in items]
+        await self._run_db(self._transaction, self._executemany,
+                           f"INSERT INTO jobs VALUES ({', '.join('?' * len(self.COLUMNS))})", rows)
+        self._wakeup.set()
+        return [row[0] for row in rows]
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        rows = await self._run_db(self._execute, f"{self._select} WHERE job_id = ?", (job_id,))
+        return self._job(rows[0]) if rows else None
+
+    async def wait_finished(self, job_id: str, timeout: Optional[float] = None) -> Optional[Job]:
+        """
+        等待任务提交成功或失败，返回任务的最新状态，任务不存在时返回None
+        参数:
+            job_id: 任务ID
+            timeout: 最长等待时间（秒），超时后返回尚未结束的任务，默认一直等待
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            finished = self._finished
+            job = await self.get(job_id)
+            if job is None or job.finished:
+                return job
+            wait = settings.SUBMISSION_QUEUE_POLL_INTERVAL
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return job
+                wait = min(wait, remaining)
+            await _wait_event(finished, wait)
+
+    async def count_pending(self) -> int:
+        rows = await self._run_db(self._execute, "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)",
+                                  (QUEUED, SUBMITTING))
+        return rows[0][0]
+
+    async def collect_metrics(self):
+        SUBMISSION_QUEUE_DEPTH.set(await self.count_pending())
+
+    async def _claim(self, limit: int) -> List[Job]:
+        """
+        认领最多limit个到期任务（含租约已过期的submitting任务），按优先级和入队顺序；
+        本进程正在提交的任务即使租约已过期也不再认领，避免重复提交
+        """
+        now = time.time()
+        inflight = tuple(self._inflight)
+
+        def claim():
+            excluded = f"AND job_id NOT IN ({', '.join('?' * len(inflight))}) " if inflight else ""
+            rows = self._execute(
+                f"{self._select} WHERE status IN (?, ?) AND next_attempt_at <= ? {excluded}"
+                "ORDER BY priority, created_at LIMIT ?", (QUEUED, SUBMITTING, now, *inflight, limit))
+            self._executemany("UPDATE jobs SET status = ?, next_attempt_at = ? WHERE job_id = ?",
+                                   [(SUBMITTING, now + settings.SUBMISSION_QUEUE_LEASE, row[0]) for row in rows])
+            return [self._job(row) for row in rows]
+
+        return await self._run_db(self._transaction, claim)
+
+    async def _renew(self, now: float):
+        """
+        为本进程正在提交的任务续租，提交耗时超过租约（如长时间排队等待上游配额）时不被其他进程重新认领
+        """
+        if self._inflight and now - self._renewed_at >= settings.SUBMISSION_QUEUE_LEASE / 3:
+            self._renewed_at = now
+            await self._run_db(self._executemany,
+                               "UPDATE jobs SET next_attempt_at = ? WHERE job_id = ? AND status = ?",
+                               [(now + settings.SUBMISSION_QUEUE_LEASE, job_id, SUBMITTING)
+                                for job_id in self._inflight])
+
+    async def _save(self, job: Job):
+        job.updated_at = time.time()
+        await self._run_db(self._execute,
+                           "UPDATE jobs SET status = ?, task_id = ?, last_error = ?, attempts = ?, "
+                           "next_attempt_at = ?, updated_at = ? WHERE job_id = ?",
+                           (job.status, job.task_id, job.last_error, job.attempts, job.next_attempt_at,
+                            job.updated_at, job.job_id))
+
+    async def _process(self, job: Job):
+        """
+        提交一个任务：成功时记录上游task_id；配额已满时按建议时间推迟；其他错误退避重试，超过次数后标记为失败
+        """
+        token = task_id_var.set(job.job_id)
+        priority_token = request_priority.set(job.priority)
+        try:
+            job.task_id = await self._submit_func(**job.params)
+            job.status = SUBMITTED
+            job.last_error = None
+            result = "submitted"
+        except OverloadedError as e:
+            job.status = QUEUED
+            job.next_attempt_at = time.time() + e.retry_after
+            job.last_error = str(e)
+            result = "deferred"
+        except Exception as e:
+            job.attempts += 1
+            job.last_error = str(e)
+            if isinstance(e, self._permanent_errors) or job.attempts >= settings.SUBMISSION_QUEUE_MAX_ATTEMPTS:
+                job.status = FAILED
+                result = "failed"
+                logger.warning("Queued submission failed", extra={"attempts": job.attempts, "error": str(e)})
+            else:
+                job.status = QUEUED
+                job.next_attempt_at = time.time() + settings.SUBMISSION_QUEUE_RETRY_DELAY * 2 ** (job.attempts - 1)
+                result = "retried"
+        finally:
+            request_priority.reset(priority_token)
+            task_id_var.reset(token)
+
+        await self._save(job)
+        SUBMISSION_QUEUE_JOBS.labels(result).inc()
+        if job.finished:
+            finished, self._finished = self._finished, asyncio.Event()
+            finished.set()
+
+    async def _process_and_release(self, job: Job):
+        try:
+            await self._process(job)
+        except Exception:
+            # 写回失败时保持认领状态，租约到期后重新提交
+            logger.error("Submission queue error", exc_info=True)
+        finally:
+            if self._inflight.get(job.job_id) is asyncio.current_task():
+                del self._inflight[job.job_id]
+            self._wakeup.set()
+
+    async def _purge(self, now: float):
+        if now - self._purged_at > PURGE_INTERVAL:
+            self._purged_at = now
+            await self._run_db(self._execute, "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                               (SUBMITTED, FAILED, now - settings.TASK_RESULT_TTL))
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                free = settings.SUBMISSION_QUEUE_WORKERS - len(self._inflight)
+                if free > 0:
+                    for job in await self._claim(free):
+                        self._inflight[job.job_id] = asyncio.create_task(self._process_and_release(job))
+                now = time.time()
+                await self._renew(now)
+                await self._purge(now)
+            except Exception:
+                # 队列文件暂时不可用时稍后重试，不让提交协程退出
+                logger.error("Submission queue error", exc_info=True)
+
+            # 其他进程写入的任务和推迟到期的任务只能通过轮询发现
+            await _wait_event(self._wakeup, settings.SUBMISSION_QUEUE_POLL_INTERVAL)
+
+
+def create_submission_queue(submit_func: Callable[..., Awaitable[str]],
+                            permanent_errors: Tuple[Type[BaseException], ...] = ()) -> Optional[SubmissionQueue]:
+    """
+    根据配置创建持久化提交队列，未开启时返回None
+    """
+    if not settings.SUBMISSION_QUEUE_ENABLED:
+        return None
+    return SubmissionQueue(settings.SUBMISSION_QUEUE_PATH, submit_func, permanent_errors)
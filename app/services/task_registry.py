@@ -0,0 +1,441 @@
+"""
+任务状态注册表
+记录已提交的生成任务，由后台协程批量轮询火山引擎，
+task-status接口直接从任务状态存储返回结果，上游查询量只与存活任务数有关；
+多个worker进程共享同一个TaskStore时，到期任务由各进程原子认领，轮询工作被分摊而不是重复；
+SSE/WebSocket订阅者共享同一任务的轮询结果
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.logging_config import task_id_var
+from app.services.task_store import (
+    FAILED_STATUSES,
+    TERMINAL_STATUSES,
+    MemoryTaskStore,
+    TaskRecord,
+    TaskStore,
+    create_task_store,
+)
+from app.utils.admission import OverloadedError
+from app.utils.metrics import REGISTRY, TASKS_PENDING, TASKS_TRACKED
+from app.utils.volcano_api import query_volcano_task_result
+
+logger = logging.getLogger(__name__)
+
+# 单次批量读取的任务数，低于sqlite的参数个数上限
+SYNC_CHUNK_SIZE = 500
+# 清理共享存储中过期终态任务的间隔（秒）
+STORE_PURGE_INTERVAL = 60
+
+
+async def _wait_event(event: asyncio.Event, timeout: Optional[float]) -> bool:
+    """
+    等待事件被设置，最多等待timeout秒，返回事件是否已被设置
+    Python 3.11的asyncio.wait_for在事件被设置的同时收到取消时会丢弃取消，
+    stop()取消轮询协程时协程不退出，这里改用asyncio.wait
+    """
+    waiter = asyncio.ensure_future(event.wait())
+    try:
+        await asyncio.wait({waiter}, timeout=timeout)
+    finally:
+        waiter.cancel()
+    return event.is_set()
+
+
+@dataclass
+class TaskEntry:
+    task_id: str
+    status: Optional[str] = None       # None表示尚未从上游获取到状态
+    result: Any = None                 # 完成后的图片URL
+    local_url: Optional[str] = None    # 结果镜像到本地后的静态文件路径
+    thumbnail_url: Optional[str] = None
+    last_error: Optional[str] = None
+    last_exception: Optional[Exception] = None
+    interval: float = 0.0
+    next_poll_at: float = 0.0
+    updated_at: float = field(default_factory=time.time)
+    ready: asyncio.Event = field(default_factory=asyncio.Event)
+    # 状态版本号与变更事件：所有订阅者共享同一个Event，变更时整体唤醒后替换
+    version: int = 0
+    changed: asyncio.Event = field(default_factory=asyncio.Event)
+
+    @property
+    def terminal(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def to_result(self):
+        """
+        转换为与query_volcano_task_result一致的返回格式
+        """
+        if self.status == "done" and self.result:
+            return self.local_url or self.result
+        return {"task_id": self.task_id, "status": self.status}
+
+    def to_event(self) -> dict:
+        """
+        转换为推送给订阅者的事件内容
+        """
+        return {
+            "task_id": self.task_id,
+            "status": self.status,
+            "image_url": (self.local_url or self.result) if self.status == "done" else None,
+            "thumbnail_url": self.thumbnail_url,
+        }
+
+    def to_record(self) -> TaskRecord:
+        return TaskRecord(self.task_id, self.status, self.result, self.local_url, self.thumbnail_url,
+                          self.last_error, self.interval, self.next_poll_at, self.updated_at)
+
+    def notify(self):
+        """
+        唤醒所有等待本任务状态变化的订阅者
+        """
+        self.version += 1
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class TaskRegistry:
+    """
+    任务注册表与后台轮询器
+    任务状态保存在TaskStore中，进程内的TaskEntry作为本进程订阅者的视图
+    参数:
+        query_func: 单个任务的上游查询函数
+        store: 任务状态存储，默认为内存存储
+    """
+
+    def __init__(self, query_func: Callable[[str], Awaitable[Any]] = query_volcano_task_result,
+                 store: Optional[TaskStore] = None):
+        self._query_func = query_func
+        self._store = store or MemoryTaskStore()
+        self._tasks: Dict[str, TaskEntry] = {}
+        self._wakeup = asyncio.Event()
+        self._poller: Optional[asyncio.Task] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._done_listeners: List[Callable[[TaskEntry], None]] = []
+        self._purged_at = 0.0
+
+    @property
+    def store(self) -> TaskStore:
+        return self._store
+
+    async def start(self):
+        """
+        启动后台轮询协程（应用启动时调用）
+        """
+        if self._poller is None:
+            self._semaphore = asyncio.Semaphore(settings.TASK_POLL_CONCURRENCY)
+            self._poller = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        停止后台轮询协程（应用关闭时调用）
+        """
+        if self._poller is not None:
+            self._poller.cancel()
+            try:
+                await self._poller
+            except asyncio.CancelledError:
+                pass
+            self._poller = None
+
+    async def register(self, task_id: str, status: str = "in_queue") -> TaskEntry:
+        """
+        登记新提交的任务并写入任务状态存储，已存在时直接返回原记录
+        参数:
+            task_id: 任务ID
+            status: 初始状态
+        """
+        entry = self._tasks.get(task_id)
+        if entry is None:
+            now = time.time()
+            entry = TaskEntry(task_id=task_id, status=status,
+                              interval=settings.TASK_POLL_MIN_INTERVAL,
+                              next_poll_at=now + settings.TASK_POLL_MIN_INTERVAL,
+                              updated_at=now)
+            entry.ready.set()
+            self._tasks[task_id] = entry
+            await self._store.add([entry.to_record()])
+            self._wakeup.set()
+        return entry
+
+    async def register_completed(self, task_id: str, result: str) -> TaskEntry:
+        """
+        登记已知结果的已完成任务（如由结果缓存复用、但已从任务状态存储中清理的任务），不再查询上游
+        参数:
+            task_id: 任务ID
+            result: 生成结果的图片URL
+        """
+        now = time.time()
+        entry = self._tasks.get(task_id)
+        if entry is None:
+            entry = TaskEntry(task_id=task_id)
+            self._tasks[task_id] = entry
+        entry.status = "done"
+        entry.result = result
+        entry.interval = settings.TASK_POLL_MIN_INTERVAL
+        entry.next_poll_at = now
+        entry.updated_at = now
+        entry.ready.set()
+        entry.notify()
+        await self._store.add([entry.to_record()])
+        for listener in self._done_listeners:
+            listener(entry)
+        return entry
+
+    def add_done_listener(self, listener: Callable[[TaskEntry], None]):
+        """
+        注册任务完成回调，回调在轮询到任务完成的进程中同步调用，耗时操作应自行调度为后台任务
+        """
+        self._done_listeners.append(listener)
+
+    def remove_done_listener(self, listener: Callable[[TaskEntry], None]):
+        if listener in self._done_listeners:
+            self._done_listeners.remove(listener)
+
+    def get(self, task_id: str) -> Optional[TaskEntry]:
+        return self._tasks.get(task_id)
+
+    def pending_count(self) -> int:
+        return sum(1 for entry in self._tasks.values() if not entry.terminal)
+
+    async def collect_metrics(self):
+        """
+        采集/metrics时更新任务数指标
+        """
+        TASKS_PENDING.set(await self._store.count_pending())
+        TASKS_TRACKED.set(len(self._tasks))
+
+    async def lookup(self, task_id: str) -> Optional[TaskEntry]:
+        """
+        从任务状态存储读取任务最新状态，未登记时返回None
+        参数:
+            task_id: 任务ID
+        """
+        record = (await self._store.get_many([task_id])).get(task_id)
+        if record is None:
+            return None
+        return self._apply(record)
+
+    async def save(self, entry: TaskEntry):
+        """
+        把进程内对任务记录的修改（如结果镜像地址）写回任务状态存储
+        """
+        entry.updated_at = time.time()
+        await self._store.update_many([entry.to_record()])
+
+    async def clear_local_urls(self, task_ids: List[str]):
+        """
+        本地镜像文件被淘汰后清除对应任务的本地地址
+        """
+        now = time.time()
+        records = list((await self._store.get_many(task_ids)).values())
+        for record in records:
+            record.local_url = None
+            record.thumbnail_url = None
+            record.updated_at = now
+        await self._store.update_many(records)
+        for task_id in task_ids:
+            entry = self._tasks.get(task_id)
+            if entry is not None:
+                entry.local_url = None
+                entry.thumbnail_url = None
+                entry.updated_at = now
+
+    async def resolve(self, task_id: str) -> TaskEntry:
+        """
+        返回已知状态的任务记录；未登记的任务（如重启前提交的）就地查询一次后登记
+        参数:
+            task_id: 任务ID
+        """
+        entry = self._tasks.get(task_id)
+        if entry is None or entry.ready.is_set():
+            found = await self.lookup(task_id)
+            if found is not None:
+                return found
+            entry = self._tasks.get(task_id)
+            if entry is None:
+                # 同一进程内的并发请求等待这一次查询的结果
+                entry = TaskEntry(task_id=task_id, interval=settings.TASK_POLL_MIN_INTERVAL)
+                self._tasks[task_id] = entry
+                await self._refresh(entry)
+                if entry.status is not None:
+                    await self._store.add([entry.to_record()])
+                    self._wakeup.set()
+        await entry.ready.wait()
+        if entry.status is None:
+            if isinstance(entry.last_exception, OverloadedError):
+                raise entry.last_exception
+            raise ValueError(entry.last_error or "任务状态未知")
+        return entry
+
+    async def get_result(self, task_id: str):
+        """
+        从任务状态存储返回任务状态
+        参数:
+            task_id: 任务ID
+        """
+        entry = await self.resolve(task_id)
+        return entry.to_result()
+
+    async def watch(self, entry: TaskEntry, heartbeat: Optional[float] = None) -> AsyncIterator[Optional[dict]]:
+        """
+        订阅任务状态变化，先推送当前状态，之后每次变化推送一次，进入终态后结束
+        参数:
+            entry: resolve返回的任务记录
+            heartbeat: 心跳间隔（秒），超时无变化时产出None
+        """
+        version = -1
+        while True:
+            if entry.version != version:
+                version = entry.version
+                yield entry.to_event()
+                if entry.terminal:
+                    return
+            if not await _wait_event(entry.changed, heartbeat):
+                yield None
+
+    async def _refresh(self, entry: TaskEntry):
+        """
+        查询单个任务并按结果调整下次轮询时间
+        """
+        previous = entry.status
+        token = task_id_var.set(entry.task_id)
+        try:
+            result = await self._query_func(entry.task_id)
+        except Exception as e:
+            entry.last_error = str(e)
+            entry.last_exception = e
+            if entry.status is None:
+                # 首次查询即失败的未知任务不保留，交由客户端下次请求重新登记
+                self._tasks.pop(entry.task_id, None)
+                entry.ready.set()
+                return
+            entry.interval = min(entry.interval * settings.TASK_POLL_BACKOFF, settings.TASK_POLL_MAX_INTERVAL)
+            if isinstance(e, OverloadedError):
+                # 配额已满时至少等待建议的重试时间
+                entry.interval = max(entry.interval, e.retry_after)
+        else:
+            entry.last_error = None
+            entry.last_exception = None
+            if isinstance(result, dict):
+                entry.status = result.get("status")
+            else:
+                entry.status = "done"
+                entry.result = result
+            entry.ready.set()
+            # 状态有变化时通知订阅者并恢复最短间隔，否则指数退避
+            if entry.status != previous:
+                entry.interval = settings.TASK_POLL_MIN_INTERVAL
+                entry.notify()
+                if entry.terminal:
+                    logger.info("Task finished", extra={"status": entry.status})
+                if entry.status == "done":
+                    for listener in self._done_listeners:
+                        listener(entry)
+            else:
+                entry.interval = min(entry.interval * settings.TASK_POLL_BACKOFF, settings.TASK_POLL_MAX_INTERVAL)
+        finally:
+            task_id_var.reset(token)
+
+        entry.updated_at = time.time()
+        entry.next_poll_at = entry.updated_at + entry.interval
+
+    async def _refresh_limited(self, entry: TaskEntry):
+        async with self._semaphore:
+            await self._refresh(entry)
+
+    def _apply(self, record: TaskRecord) -> TaskEntry:
+        """
+        用存储中的记录更新进程内的任务视图，状态或结果变化时通知订阅者
+        """
+        entry = self._tasks.get(record.task_id)
+        if entry is None:
+            entry = TaskEntry(task_id=record.task_id)
+            self._tasks[record.task_id] = entry
+        elif entry.ready.is_set() and record.updated_at < entry.updated_at:
+            # 本进程已有更新的状态（刚轮询过但尚未写回）
+            return entry
+
+        changed = (entry.status, entry.result, entry.local_url) != (record.status, record.result, record.local_url)
+        entry.status = record.status
+        entry.result = record.result
+        entry.local_url = record.local_url
+        entry.thumbnail_url = record.thumbnail_url
+        entry.last_error = record.last_error
+        entry.interval = record.interval
+        entry.next_poll_at = record.next_poll_at
+        entry.updated_at = record.updated_at
+        entry.ready.set()
+        if changed:
+            entry.notify()
+        return entry
+
+    async def _poll_due(self) -> List[str]:
+        """
+        认领一批到期任务，并发查询后批量写回，返回本轮轮询的任务ID
+        """
+        records = await self._store.claim_due(time.time(), settings.TASK_POLL_BATCH_SIZE, settings.TASK_POLL_LEASE)
+        if not records:
+            return []
+        entries = [self._apply(record) for record in records]
+        await asyncio.gather(*(self._refresh_limited(entry) for entry in entries))
+        await self._store.update_many([entry.to_record() for entry in entries])
+        return [entry.task_id for entry in entries]
+
+    async def _sync(self, skip: List[str]):
+        """
+        从存储读取本进程关注的未终结任务，获取其他进程轮询到的状态变化
+        """
+        skip = set(skip)
+        task_ids = [task_id for task_id, entry in self._tasks.items()
+                    if entry.ready.is_set() and entry.status is not None and not entry.terminal
+                    and task_id not in skip]
+        for start in range(0, len(task_ids), SYNC_CHUNK_SIZE):
+            records = await self._store.get_many(task_ids[start:start + SYNC_CHUNK_SIZE])
+            for record in records.values():
+                self._apply(record)
+
+    async def _purge(self, now: float):
+        """
+        清理超过保留时间的终态任务
+        """
+        expired = [task_id for task_id, entry in self._tasks.items()
+                   if entry.terminal and now - entry.updated_at > settings.TASK_RESULT_TTL]
+        for task_id in expired:
+            del self._tasks[task_id]
+        if now - self._purged_at > STORE_PURGE_INTERVAL:
+            self._purged_at = now
+            await self._store.purge(now - settings.TASK_RESULT_TTL)
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            polled: List[str] = []
+            try:
+                polled = await self._poll_due()
+                await self._sync(polled)
+                now = time.time()
+                await self._purge(now)
+                next_due = await self._store.next_due()
+            except Exception:
+                # 存储暂时不可用时稍后重试，不让轮询协程退出
+                logger.error("Task poller error", exc_info=True)
+                now, next_due = time.time(), None
+
+            # 其他进程登记的任务只能通过存储发现，最多等待TASK_STORE_SYNC_INTERVAL秒
+            timeout = settings.TASK_STORE_SYNC_INTERVAL
+            if len(polled) >= settings.TASK_POLL_BATCH_SIZE:
+                timeout = 0.0
+            elif next_due is not None:
+                timeout = min(timeout, max(0.0, next_due - now))
+            await _wait_event(self._wakeup, timeout)
+
+
+task_registry = TaskRegistry(store=create_task_store())
+REGISTRY.add_collector(task_registry.collect_metrics)
@@ -0,0 +1,290 @@
+"""
+任务状态存储
+任务注册表通过TaskStore在多个worker进程（或多台机器）之间共享任务状态：
+各进程的轮询器原子地认领到期任务，查询后批量写回，同一任务同一时刻只由一个进程轮询
+"""
+import asyncio
+import dataclasses
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from app.core.config import settings
+
+# 火山引擎的终态，进入终态后不再轮询
+FAILED_STATUSES = frozenset({"not_found", "expired", "failed"})
+TERMINAL_STATUSES = FAILED_STATUSES | {"done"}
+
+
+@dataclass
+class TaskRecord:
+    task_id: str
+    status: str
+    result: Optional[str] = None
+    local_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    last_error: Optional[str] = None
+    interval: float = 0.0
+    next_poll_at: float = 0.0   # 墙上时钟（time.time()），多进程之间可比较
+    updated_at: float = 0.0
+
+    @property
+    def terminal(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+
+class TaskStore(ABC):
+    """
+    任务状态存储接口，所有操作均为批量操作，单次调用内是原子的
+
+    Redis兼容后端可按如下方式实现：每个任务一个hash保存TaskRecord字段，
+    未进入终态的任务以next_poll_at为score放入一个sorted set；
+    claim_due用Lua脚本ZRANGEBYSCORE取出到期成员并以now + lease为新score写回，
+    update_many在MULTI中写hash并更新（终态时ZREM）score，purge按updated_at清理终态任务
+    """
+
+    @abstractmethod
+    async def add(self, records: Iterable[TaskRecord]):
+        """
+        登记任务，已存在的任务保持不变
+        """
+
+    @abstractmethod
+    async def get_many(self, task_ids: Iterable[str]) -> Dict[str, TaskRecord]:
+        """
+        批量读取任务，不存在的任务不出现在结果中
+        """
+
+    @abstractmethod
+    async def claim_due(self, now: float, limit: int, lease: float) -> List[TaskRecord]:
+        """
+        认领最多limit个到期的未终结任务，并把它们的next_poll_at推后lease秒，
+        认领期间其他进程不会再取到这些任务；轮询进程异常退出时租约到期后由其他进程接手
+        """
+
+    @abstractmethod
+    async def update_many(self, records: Iterable[TaskRecord]):
+        """
+        批量写回任务状态（同时释放认领）
+        """
+
+    @abstractmethod
+    async def list_pending(self, limit: int) -> List[TaskRecord]:
+        """
+        按next_poll_at顺序列出未终结的任务
+        """
+
+    @abstractmethod
+    async def list_mirrored(self) -> List[str]:
+        """
+        列出记录了本地镜像地址的任务ID
+        """
+
+    @abstractmethod
+    async def next_due(self) -> Optional[float]:
+        """
+        未终结任务中最早的next_poll_at，没有时返回None
+        """
+
+    @abstractmethod
+    async def count_pending(self) -> int:
+        """
+        未终结的任务数
+        """
+
+    @abstractmethod
+    async def purge(self, before: float) -> int:
+        """
+        删除updated_at早于before的终态任务，返回删除数量
+        """
+
+    def close(self):
+        pass
+
+
+class MemoryTaskStore(TaskStore):
+    """
+    内存存储：单进程部署使用
+    """
+
+    def __init__(self):
+        self._records: Dict[str, TaskRecord] = {}
+
+    async def add(self, records: Iterable[TaskRecord]):
+        for record in records:
+            self._records.setdefault(record.task_id, dataclasses.replace(record))
+
+    async def get_many(self, task_ids: Iterable[str]) -> Dict[str, TaskRecord]:
+        return {task_id: dataclasses.replace(self._records[task_id])
+                for task_id in task_ids if task_id in self._records}
+
+    async def claim_due(self, now: float, limit: int, lease: float) -> List[TaskRecord]:
+        due = sorted((record for record in self._records.values()
+                      if not record.terminal and record.next_poll_at <= now),
+                     key=lambda record: record.next_poll_at)[:limit]
+        claimed = [dataclasses.replace(record) for record in due]
+        for record in due:
+            record.next_poll_at = now + lease
+        return claimed
+
+    async def update_many(self, records: Iterable[TaskRecord]):
+        for record in records:
+            self._records[record.task_id] = dataclasses.replace(record)
+
+    async def list_pending(self, limit: int) -> List[TaskRecord]:
+        pending = sorted((record for record in self._records.values() if not record.terminal),
+                         key=lambda record: record.next_poll_at)
+        return [dataclasses.replace(record) for record in pending[:limit]]
+
+    async def list_mirrored(self) -> List[str]:
+        return [task_id for task_id, record in self._records.items() if record.local_url]
+
+    async def next_due(self) -> Optional[float]:
+        return min((record.next_poll_at for record in self._records.values() if not record.terminal),
+                   default=None)
+
+    async def count_pending(self) -> int:
+        return sum(1 for record in self._records.values() if not record.terminal)
+
+    async def purge(self, before: float) -> int:
+        expired = [task_id for task_id, record in self._records.items()
+                   if record.terminal and record.updated_at < before]
+        for task_id in expired:
+            del self._records[task_id]
+        return len(expired)
+
+
+class SqliteTaskStore(TaskStore):
+    """
+    sqlite存储（WAL模式）：同一台机器上的多个worker进程共享
+    数据库操作在线程中执行，多进程并发写入由sqlite的文件锁串行化
+    参数:
+        path: 数据库文件路径
+    """
+
+    COLUMNS = ("task_id", "status", "result", "local_url", "thumbnail_url", "last_error",
+               "interval", "next_poll_at", "updated_at")
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        self._execute("PRAGMA journal_mode=WAL")
+        self._execute("PRAGMA synchronous=NORMAL")
+        self._execute(
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            "task_id TEXT PRIMARY KEY, status TEXT NOT NULL, result TEXT, local_url TEXT, "
+            "thumbnail_url TEXT, last_error TEXT, interval REAL NOT NULL, next_poll_at REAL NOT NULL, "
+            "updated_at REAL NOT NULL, terminal INTEGER NOT NULL)"
+        )
+        self._execute("CREATE INDEX IF NOT EXISTS idx_tasks_due ON tasks(terminal, next_poll_at)")
+        self._execute("CREATE INDEX IF NOT EXISTS idx_tasks_updated ON tasks(terminal, updated_at)")
+        self._select = f"SELECT {', '.join(self.COLUMNS)} FROM tasks"
+
+    async def _run(self, func, *args):
+        return await asyncio.to_thread(self._locked, func, *args)
+
+    def _locked(self, func, *args):
+        with self._lock:
+            return func(*args)
+
+    def _transaction(self, func, *args):
+        # BEGIN IMMEDIATE在事务开始时即获取写锁，保证读后写的原子性
+        self._execute("BEGIN IMMEDIATE")
+        try:
+            result = func(*args)
+        except BaseException:
+            self._execute("ROLLBACK")
+            raise
+        self._execute("COMMIT")
+        return result
+
+    # 所有语句都经由_execute/_executemany执行：游标必须在持锁期间关闭，
+    # 否则会在其他线程中被回收，与正在进行的语句冲突
+    def _execute(self, sql: str, params: Iterable = ()) -> list:
+        cursor = self._conn.execute(sql, tuple(params))
+        try:
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def _executemany(self, sql: str, rows: list) -> int:
+        cursor = self._conn.executemany(sql, rows)
+        try:
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def _row(record: TaskRecord) -> tuple:
+        return (record.task_id, record.status, record.result, record.local_url, record.thumbnail_url,
+                record.last_error, record.interval, record.next_poll_at, record.updated_at, int(record.terminal))
+
+    async def add(self, records: Iterable[TaskRecord]):
+        rows = [self._row(record) for record in records]
+        await self._run(self._executemany, "INSERT OR IGNORE INTO tasks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    async def get_many(self, task_ids: Iterable[str]) -> Dict[str, TaskRecord]:
+        task_ids = list(task_ids)
+        if not task_ids:
+            return {}
+
+        rows = await self._run(self._execute, f"{self._select} WHERE task_id IN ({', '.join('?' * len(task_ids))})",
+                               task_ids)
+        return {row[0]: TaskRecord(*row) for row in rows}
+
+    async def claim_due(self, now: float, limit: int, lease: float) -> List[TaskRecord]:
+        def claim():
+            rows = self._execute(
+                f"{self._select} WHERE terminal = 0 AND next_poll_at <= ? ORDER BY next_poll_at LIMIT ?", (now, limit))
+            self._executemany("UPDATE tasks SET next_poll_at = ? WHERE task_id = ?",
+                              [(now + lease, row[0]) for row in rows])
+            return [TaskRecord(*row) for row in rows]
+
+        return await self._run(self._transaction, claim)
+
+    async def update_many(self, records: Iterable[TaskRecord]):
+        rows = [self._row(record)[1:] + (record.task_id,) for record in records]
+        await self._run(self._transaction, self._executemany,
+                        "UPDATE tasks SET status = ?, result = ?, local_url = ?, thumbnail_url = ?, last_error = ?, "
+                        "interval = ?, next_poll_at = ?, updated_at = ?, terminal = ? WHERE task_id = ?", rows)
+
+    async def list_pending(self, limit: int) -> List[TaskRecord]:
+        rows = await self._run(self._execute, f"{self._select} WHERE terminal = 0 ORDER BY next_poll_at LIMIT ?",
+                               (limit,))
+        return [TaskRecord(*row) for row in rows]
+
+    async def list_mirrored(self) -> List[str]:
+        rows = await self._run(self._execute, "SELECT task_id FROM tasks WHERE local_url IS NOT NULL")
+        return [row[0] for row in rows]
+
+    async def next_due(self) -> Optional[float]:
+        rows = await self._run(self._execute, "SELECT MIN(next_poll_at) FROM tasks WHERE terminal = 0")
+        return rows[0][0]
+
+    async def count_pending(self) -> int:
+        rows = await self._run(self._execute, "SELECT COUNT(*) FROM tasks WHERE terminal = 0")
+        return rows[0][0]
+
+    async def purge(self, before: float) -> int:
+        return await self._run(self._executemany, "DELETE FROM tasks WHERE terminal = 1 AND updated_at < ?",
+                               [(before,)])
+
+    def close(self):
+        self._conn.close()
+
+
+def create_task_store() -> TaskStore:
+    """
+    根据配置创建任务状态存储
+    """
+    if settings.TASK_STORE_BACKEND == "sqlite":
+        return SqliteTaskStore(settings.TASK_STORE_PATH)
+    if settings.TASK_STORE_BACKEND == "memory":
+        return MemoryTaskStore()
+    raise ValueError(f"不支持的TASK_STORE_BACKEND: {settings.TASK_STORE_BACKEND}")
@@ -0,0 +1,49 @@
+import hashlib
+import os
+import uuid
+from fastapi import UploadFile
+from app.core.config import settings
+from app.utils.image_utils import encode_image, load_image_fit, read_upload, run_in_image_pool
+from app.utils.static_files import static_url
+
+def write_file_atomic(path: str, data: bytes):
+    """
+    先写临时文件再原子替换，并发写入同一文件时读者不会看到写了一半的内容
+    """
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def compress_upload(data: bytes) -> bytes:
+    """
+    归一化并压缩上传的图片（同步函数，在图片处理线程池中执行）
+    """
+    image = load_image_fit(data, settings.UPLOAD_MAX_DIMENSION)
+    return encode_image(image, settings.UPLOAD_IMAGE_FORMAT, settings.UPLOAD_IMAGE_QUALITY,
+                        settings.UPLOAD_TARGET_BYTES)
+
+def save_upload(data: bytes, path: str):
+    """
+    目标文件不存在时压缩并写入（同步函数，在图片处理线程池中执行）
+    """
+    if os.path.exists(path):
+        return
+    write_file_atomic(path, compress_upload(data))
+
+async def store_upload(upload: UploadFile) -> str:
+    """
+    保存上传的图片并返回静态文件URL路径
+    文件名取原始内容的哈希，相同的上传只处理和存储一次
+    参数:
+        upload: 上传的图片文件
+    """
+    data = await read_upload(upload)
+    
+    extension = "webp" if settings.UPLOAD_IMAGE_FORMAT.upper() == "WEBP" else "jpg"
+    filename = f"{hashlib.sha256(data).hexdigest()[:32]}.{extension}"
+    path = os.path.join(settings.UPLOAD_FOLDER, filename)
+    
+    await run_in_image_pool(save_upload, data, path)
+    
+    return static_url(path)
@@ -0,0 +1,275 @@
+"""
+上游调用准入控制
+火山引擎按访问密钥限制QPS和并发。每个 (访问密钥, Action) 一个令牌桶控制速率，
+每个访问密钥共享一个并发上限和一个有界的优先级等待队列；
+队列已满或等待超时时快速拒绝并给出建议的重试时间，避免超额请求压垮上游。
+令牌桶和并发计数在进程内维护，配置的配额按worker数均分给各worker进程
+"""
+import asyncio
+import bisect
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+# 优先级（数值越小越优先）：任务轮询最便宜且推动已提交的任务完成，其次是付费用户的提交
+PRIORITY_POLL = 0
+PRIORITY_PAID = 1
+PRIORITY_FREE = 2
+
+# 当前请求的优先级，由API层根据用户等级设置
+request_priority: ContextVar[int] = ContextVar("request_priority", default=PRIORITY_FREE)
+
+
+class OverloadedError(Exception):
+    """
+    上游配额已满，请求被准入控制拒绝
+    参数:
+        retry_after: 建议的重试等待时间（秒）
+    """
+    status_code = 429
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    令牌桶
+    参数:
+        rate: 每秒补充的令牌数
+        burst: 桶容量
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self) -> float:
+        """
+        距离下一个令牌可用的秒数
+        """
+        return max(0.0, (1.0 - self.tokens) / self.rate)
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "action", "future")
+
+    def __init__(self, priority: int, seq: int, action: str, future: asyncio.Future):
+        self.priority = priority
+        self.seq = seq
+        self.action = action
+        self.future = future
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class _KeyState:
+    """
+    单个访问密钥的准入状态
+    """
+
+    def __init__(self):
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.in_flight = 0
+        self.waiters: List[_Waiter] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class AdmissionController:
+    """
+    准入控制器
+    参数:
+        limits: 各Action的 (QPS, 突发容量)，QPS不大于0表示不限速
+        max_concurrency: 每个访问密钥的最大并发请求数
+        queue_size: 每个访问密钥的等待队列长度
+        max_wait: 单个请求最长排队时间（秒）
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[float, float]], max_concurrency: int,
+                 queue_size: int, max_wait: float):
+        self.limits = limits
+        self.max_concurrency = max_concurrency
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self._keys: Dict[str, _KeyState] = {}
+        self._seq = itertools.count()
+
+    @asynccontextmanager
+    async def acquire(self, access_key: str, action: str, priority: Optional[int] = None):
+        """
+        获取一次上游调用的许可，退出上下文时释放并发名额
+        参数:
+            access_key: 访问密钥
+            action: 火山引擎Action名称
+            priority: 优先级，默认取当前请求的request_priority
+        """
+        if priority is None:
+            priority = request_priority.get()
+        state = self._keys.get(access_key)
+        if state is None:
+            state = self._keys[access_key] = _KeyState()
+
+        if not state.waiters and self._try_take(state, action):
+            state.in_flight += 1
+        else:
+            await self._wait(state, action, priority)
+        try:
+            yield
+        finally:
+            state.in_flight -= 1
+            self._dispatch(state)
+
+    def _bucket(self, state: _KeyState, action: str) -> Optional[TokenBucket]:
+        bucket = state.buckets.get(action)
+        if bucket is None:
+            rate, burst = self.limits.get(action, (0.0, 0.0))
+            if rate <= 0:
+                return None
+            bucket = state.buckets[action] = TokenBucket(rate, max(1.0, burst))
+        return bucket
+
+    def _try_take(self, state: _KeyState, action: str) -> bool:
+        """
+        有空闲并发名额且令牌可用时占用一个令牌
+        """
+        if self.max_concurrency > 0 and state.in_flight >= self.max_concurrency:
+            return False
+        bucket = self._bucket(state, action)
+        if bucket is None:
+            return True
+        bucket.refill(time.monotonic())
+        if bucket.tokens >= 1.0:
+            bucket.tokens -= 1.0
+            return True
+        return False
+
+    async def _wait(self, state: _KeyState, action: str, priority: int):
+        waiter = _Waiter(priority, next(self._seq), action, asyncio.get_running_loop().create_future())
+        if len(state.waiters) >= self.queue_size:
+            # 队列已满：新请求优先级更高时挤掉队尾优先级最低的请求，否则直接拒绝
+            if not state.waiters or not waiter < state.waiters[-1]:
+                raise OverloadedError("上游请求过多，请稍后重试", self._retry_after(state, action))
+            evicted = state.waiters.pop()
+            evicted.future.set_exception(
+                OverloadedError("上游请求过多，请稍后重试", self._retry_after(state, evicted.action)))
+
+        bisect.insort(state.waiters, waiter)
+        self._dispatch(state)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            self._abandon(state, waiter)
+            raise
+
+        if not waiter.future.done() or waiter.future.cancelled():
+            self._abandon(state, waiter)
+            raise OverloadedError("上游请求排队超时，请稍后重试", self._retry_after(state, action))
+
+    def _abandon(self, state: _KeyState, waiter: _Waiter):
+        """
+        放弃排队：仍在队列中则移除，已被授予许可则归还并发名额（被挤出队列的请求不占名额）
+        """
+        if waiter in state.waiters:
+            state.waiters.remove(waiter)
+        elif waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+            state.in_flight -= 1
+            self._dispatch(state)
+        if not waiter.future.done():
+            waiter.future.cancel()
+
+    def _dispatch(self, state: _KeyState):
+        """
+        按优先级顺序授予许可；某个Action暂无令牌时不阻塞其他Action的等待者
+        """
+        blocked = set()
+        index = 0
+        while index < len(state.waiters):
+            if self.max_concurrency > 0 and state.in_flight >= self.max_concurrency:
+                return
+            waiter = state.waiters[index]
+            if waiter.action in blocked or not self._try_take(state, waiter.action):
+                blocked.add(waiter.action)
+                index += 1
+                continue
+            del state.waiters[index]
+            state.in_flight += 1
+            waiter.future.set_result(None)
+
+        # 仍有因令牌不足而等待的请求时，在下一个令牌可用时再次分派
+        if blocked and state.timer is None:
+            delay = min(self._bucket(state, action).wait_time() for action in blocked)
+            state.timer = asyncio.get_running_loop().call_later(delay, self._on_timer, state)
+
+    def _on_timer(self, state: _KeyState):
+        state.timer = None
+        self._dispatch(state)
+
+    def _retry_after(self, state: _KeyState, action: str) -> int:
+        """
+        按当前排队长度和令牌补充速率估算重试等待时间
+        """
+        bucket = self._bucket(state, action)
+        if bucket is None:
+            return 1
+        return max(1, math.ceil((len(state.waiters) + 1) / bucket.rate))
+
+
+def create_admission_controller(workers: Optional[int] = None) -> AdmissionController:
+    """
+    根据配置创建准入控制器，配额（QPS、突发容量和并发上限）按worker数均分，
+    多个worker进程合计不超过访问密钥的配额
+    参数:
+        workers: worker进程数，默认为SERVER_WORKERS（DEBUG时为单进程）
+    """
+    if workers is None:
+        workers = 1 if settings.DEBUG else settings.SERVER_WORKERS
+    workers = max(1, workers)
+
+    def share(rate: float, burst: float) -> Tuple[float, float]:
+        return rate / workers, burst / workers
+
+    max_concurrency = settings.VOLCANO_MAX_CONCURRENCY
+    return AdmissionController(
+        limits={
+            "CVSync2AsyncSubmitTask": share(settings.VOLCANO_SUBMIT_QPS, settings.VOLCANO_SUBMIT_BURST),
+            "CVSync2AsyncGetResult": share(settings.VOLCANO_QUERY_QPS, settings.VOLCANO_QUERY_BURST),
+        },
+        max_concurrency=max(1, max_concurrency // workers) if max_concurrency > 0 else 0,
+        queue_size=settings.ADMISSION_QUEUE_SIZE,
+        max_wait=settings.ADMISSION_MAX_WAIT,
+    )
+
+
+def overcommitted_limits(workers: int) -> List[str]:
+    """
+    按worker数均分后合计会超过配额的配置项：每个worker的突发容量和并发上限至少为1，
+    worker数超过突发容量或并发上限时各worker的份额之和大于配额
+    参数:
+        workers: worker进程数
+    """
+    limits = []
+    for qps, burst, name in ((settings.VOLCANO_SUBMIT_QPS, settings.VOLCANO_SUBMIT_BURST, "VOLCANO_SUBMIT_BURST"),
+                             (settings.VOLCANO_QUERY_QPS, settings.VOLCANO_QUERY_BURST, "VOLCANO_QUERY_BURST")):
+        if qps > 0 and burst < workers:
+            limits.append(name)
+    if 0 < settings.VOLCANO_MAX_CONCURRENCY < workers:
+        limits.append("VOLCANO_MAX_CONCURRENCY")
+    return limits
+
+
+admission = create_admission_controller()
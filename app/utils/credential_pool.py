@@ -0,0 +1,176 @@
+"""
+火山引擎凭证池
+在多组访问密钥（可分属不同区域）之间分配提交请求：按权重归一化后的在途请求数最少者优先，
+任务创建时使用的凭证会被记录，之后的状态查询发往同一凭证；
+被上游限流、鉴权失败或连续出错的凭证暂时剔除，冷却后自动恢复；
+某个凭证的熔断器打开时提交换用其他凭证
+"""
+import logging
+import random
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+from app.core.config import settings
+from app.utils.admission import OverloadedError
+from app.utils.resilience import CircuitOpenError
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamThrottledError(OverloadedError):
+    """
+    火山引擎对当前访问密钥限流
+    """
+
+
+class CredentialRejectedError(ValueError):
+    """
+    火山引擎拒绝了当前访问密钥（无效或无权限）
+    """
+
+
+def mask_access_key(access_key: str) -> str:
+    """
+    只保留访问密钥前4位，用于日志和状态接口
+    """
+    return access_key[:4] + "***"
+
+
+@dataclass(eq=False)
+class Credential:
+    access_key: str
+    secret_key: str
+    region: str
+    weight: float = 1.0
+    outstanding: int = 0
+    failures: int = 0
+    ejected_until: float = 0.0
+
+    @property
+    def available(self) -> bool:
+        return self.ejected_until <= time.monotonic()
+
+    def snapshot(self) -> dict:
+        return {
+            "access_key": mask_access_key(self.access_key),
+            "region": self.region,
+            "weight": self.weight,
+            "outstanding": self.outstanding,
+            "consecutive_failures": self.failures,
+            "ejected_for": max(0.0, round(self.ejected_until - time.monotonic(), 1)),
+        }
+
+
+class CredentialPool:
+    """
+    凭证池
+    参数:
+        credentials: (access_key, secret_key, region, weight) 列表
+        max_failures: 连续失败多少次后剔除
+        eject_seconds: 剔除时长（秒），上游给出更长的重试时间时以上游为准
+        max_pins: 最多记录多少个任务与凭证的对应关系
+    """
+
+    def __init__(self, credentials: List[Tuple[str, str, str, float]], max_failures: int,
+                 eject_seconds: float, max_pins: int):
+        self.credentials = [Credential(*item) for item in credentials]
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self.max_pins = max_pins
+        self._pins: "OrderedDict[str, Credential]" = OrderedDict()
+
+    def choose(self, exclude: Tuple[Credential, ...] = ()) -> Credential:
+        """
+        选择按权重归一化后在途请求最少的可用凭证，相同时随机选择
+        """
+        if not self.credentials:
+            raise ValueError("VOLCANO_ACCESS_KEY或VOLCANO_SECRET_KEY未在配置文件中设置")
+        candidates = [c for c in self.credentials if c.available and c not in exclude]
+        if not candidates:
+            remaining = min(c.ejected_until for c in self.credentials) - time.monotonic()
+            raise OverloadedError("火山引擎访问密钥均不可用，请稍后重试", max(1, int(remaining + 0.999)))
+        lowest = min(c.outstanding / c.weight for c in candidates)
+        return random.choice([c for c in candidates if c.outstanding / c.weight == lowest])
+
+    def pin(self, task_id: str, credential: Credential):
+        """
+        记录任务由哪个凭证创建
+        """
+        self._pins[task_id] = credential
+        self._pins.move_to_end(task_id)
+        while len(self._pins) > self.max_pins:
+            self._pins.popitem(last=False)
+
+    def pinned(self, task_id: str) -> Optional[Credential]:
+        return self._pins.get(task_id)
+
+    def candidates_for_task(self, task_id: str) -> List[Credential]:
+        """
+        查询任务时应尝试的凭证：已记录的凭证，或（如服务重启后）全部凭证
+        """
+        credential = self._pins.get(task_id)
+        if credential is not None:
+            return [credential]
+        return sorted(self.credentials, key=lambda c: not c.available)
+
+    async def call(self, credential: Credential, func: Callable[[Credential], Awaitable[T]]) -> T:
+        """
+        使用指定凭证调用上游，并根据结果更新凭证健康状态
+        """
+        credential.outstanding += 1
+        try:
+            result = await func(credential)
+        except UpstreamThrottledError as e:
+            self.eject(credential, e.retry_after)
+            raise
+        except CredentialRejectedError:
+            self.eject(credential)
+            raise
+        except OverloadedError:
+            # 本地准入控制拒绝或熔断器已打开，不重复计入凭证的失败次数
+            raise
+        except Exception:
+            credential.failures += 1
+            if self.max_failures > 0 and credential.failures >= self.max_failures:
+                self.eject(credential)
+            raise
+        finally:
+            credential.outstanding -= 1
+        credential.failures = 0
+        return result
+
+    async def submit(self, func: Callable[[Credential], Awaitable[T]]) -> Tuple[Credential, T]:
+        """
+        选择凭证发起提交；凭证被限流、被拒绝或熔断时请求未被受理，换用其他凭证重试
+        """
+        tried: Tuple[Credential, ...] = ()
+        while True:
+            credential = self.choose(exclude=tried)
+            try:
+                return credential, await self.call(credential, func)
+            except (UpstreamThrottledError, CredentialRejectedError, CircuitOpenError):
+                tried += (credential,)
+                if len(tried) >= len(self.credentials):
+                    raise
+
+    def eject(self, credential: Credential, seconds: float = 0):
+        credential.ejected_until = time.monotonic() + max(seconds, self.eject_seconds)
+        credential.failures = 0
+        logger.warning("Credential ejected", extra={"access_key": mask_access_key(credential.access_key),
+                                                    "region": credential.region,
+                                                    "seconds": round(credential.ejected_until - time.monotonic(), 1)})
+
+    def snapshot(self) -> List[dict]:
+        return [c.snapshot() for c in self.credentials]
+
+
+credential_pool = CredentialPool(
+    settings.VOLCANO_CREDENTIALS,
+    settings.VOLCANO_CREDENTIAL_MAX_FAILURES,
+    settings.VOLCANO_CREDENTIAL_EJECT_SECONDS,
+    settings.VOLCANO_TASK_PIN_MAX_ENTRIES,
+)
@@ -1,34 +1,315 @@
 from fastapi import UploadFile
-import os
-from PIL import Image
+import asyncio
 import io
+import ipaddress
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional, Tuple, Union
+from urllib.parse import urlsplit
+from app.core.config import settings
+from app.utils.metrics import STAGE_SECONDS
+
+# PIL导入较慢且只有图片处理时才需要，在函数内按需导入，启动后由warm()在线程池中预先导入
+if TYPE_CHECKING:
+    import httpx
+    from PIL import Image
+
+# 处理后的统一尺寸
+TARGET_SIZE = (512, 512)
+
+# 只在上传开头的这部分数据里尝试解析图片头，避免每读一块都重新解析
+PROBE_LIMIT = 256 * 1024
+
+DECODE_STAGE = STAGE_SECONDS.labels("image_decode")
+RESIZE_STAGE = STAGE_SECONDS.labels("image_resize")
+ENCODE_STAGE = STAGE_SECONDS.labels("image_encode")
+QUALITY_STAGE = STAGE_SECONDS.labels("image_quality")
+
+# 质量检查在最长边不超过该值的灰度小图上进行，清晰度等指标与原图分辨率无关
+QUALITY_SAMPLE_SIZE = 256
+
+# 亮度不超过/不低于该值的像素视为欠曝/过曝截断
+CLIP_LOW = 5
+CLIP_HIGH = 250
+
+# 解码和缩放在线程池中执行，PIL在这些操作中会释放GIL，不阻塞事件循环
+_executor = ThreadPoolExecutor(max_workers=settings.IMAGE_PROCESS_WORKERS, thread_name_prefix="image")
 
 async def process_images(user_photo: UploadFile, scene_photo: UploadFile):
     """
     处理上传的用户照片和场景照片
+    分块读取并限制大小，先解析图片头检查尺寸，再在线程池中降采样解码并缩放
     """
-    # 读取用户照片
-    user_photo_content = await user_photo.read()
-    user_image = Image.open(io.BytesIO(user_photo_content))
-    
-    # 读取场景照片
-    scene_photo_content = await scene_photo.read()
-    scene_image = Image.open(io.BytesIO(scene_photo_content))
-    
-    # 调整照片尺寸
-    user_image = resize_image(user_image, (512, 512))
-    scene_image = resize_image(scene_image, (512, 512))
-    
-    # 转换为RGB格式
-    if user_image.mode != "RGB":
-        user_image = user_image.convert("RGB")
-    if scene_image.mode != "RGB":
-        scene_image = scene_image.convert("RGB")
-    
+    user_data, scene_data = await asyncio.gather(read_upload(user_photo), read_upload(scene_photo))
+
+    user_image, scene_image = await asyncio.gather(
+        run_in_image_pool(load_image, user_data, TARGET_SIZE),
+        run_in_image_pool(load_image, scene_data, TARGET_SIZE)
+    )
+
     return user_image, scene_image
 
-def resize_image(image: Image.Image, size: tuple) -> Image.Image:
+async def read_upload(upload: UploadFile, max_bytes: Optional[int] = None,
+                      chunk_size: Optional[int] = None) -> bytearray:
+    """
+    分块读取上传文件，超过大小限制或像素限制时立即停止读取
+    参数:
+        upload: 上传的文件
+        max_bytes: 最大字节数，默认为IMAGE_MAX_UPLOAD_BYTES
+        chunk_size: 每次读取的字节数，默认为IMAGE_READ_CHUNK_SIZE
+    """
+    max_bytes = max_bytes or settings.IMAGE_MAX_UPLOAD_BYTES
+    chunk_size = chunk_size or settings.IMAGE_READ_CHUNK_SIZE
+
+    buffer = bytearray()
+    image_size = None
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+        if len(buffer) > max_bytes:
+            raise ValueError(f"图片大小超过限制({max_bytes}字节)")
+        # 图片头通常在文件开头，解析出尺寸后即可在解码前拒绝超大图片
+        if image_size is None and len(buffer) - len(chunk) < PROBE_LIMIT:
+            image_size = probe_image_size(buffer)
+            if image_size is not None:
+                check_image_size(image_size)
+
+    if not buffer:
+        raise ValueError("图片内容为空")
+    if image_size is None:
+        image_size = probe_image_size(buffer)
+        if image_size is None:
+            raise ValueError("无法识别的图片格式")
+        check_image_size(image_size)
+
+    return buffer
+
+def probe_image_size(data: Union[bytes, bytearray]) -> Optional[Tuple[int, int]]:
+    """
+    只解析图片头获取尺寸，不解码像素；数据不完整或无法识别时返回None，
+    像素数超过PIL的解压炸弹阈值时抛出ValueError
+    """
+    from PIL import Image, UnidentifiedImageError
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return image.size
+    except Image.DecompressionBombError as e:
+        raise ValueError(f"图片像素数超过限制({settings.IMAGE_MAX_PIXELS})") from e
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError):
+        return None
+
+def check_image_size(size: Tuple[int, int]):
+    """
+    检查图片像素数是否超过限制
+    """
+    width, height = size
+    if width <= 0 or height <= 0:
+        raise ValueError("图片尺寸无效")
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ValueError(f"图片像素数超过限制({settings.IMAGE_MAX_PIXELS})")
+
+class UnsafeImageURLError(ValueError):
+    """
+    图片URL不允许下载：不是http/https，或主机解析到内网、回环、链路本地等非公网地址
+    """
+
+async def check_image_url(url: str) -> Optional[str]:
+    """
+    检查用户提供的图片URL是否允许下载，不允许时抛出UnsafeImageURLError
+    主机名解析出的所有地址都必须是公网地址，返回检查过的地址供请求直接连接；
+    IMAGE_FETCH_ALLOW_PRIVATE=true时不检查地址，返回None
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https"):
+        raise UnsafeImageURLError(f"图片URL只支持http和https: {parts.scheme or '无协议'}")
+    if not parts.hostname:
+        raise UnsafeImageURLError("图片URL缺少主机名")
+    if settings.IMAGE_FETCH_ALLOW_PRIVATE:
+        return None
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+    except ValueError:
+        raise UnsafeImageURLError("图片URL端口无效")
+    infos = await asyncio.get_running_loop().getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+    if not infos:
+        raise UnsafeImageURLError(f"图片URL主机名无法解析: {parts.hostname}")
+    for info in infos:
+        # IPv6地址可能带有作用域（如 fe80::1%eth0）
+        address = ipaddress.ip_address(info[4][0].split("%")[0])
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        # is_global排除了私有、回环、链路本地、保留和未指定地址
+        if not address.is_global or address.is_multicast:
+            raise UnsafeImageURLError(f"图片URL指向不允许访问的地址: {parts.hostname}")
+    return str(address)
+
+async def download_image(client: "httpx.AsyncClient", url: str, max_bytes: Optional[int] = None) -> bytearray:
+    """
+    分块下载用户提供的图片，超过大小限制时立即停止
+    请求前检查URL（见check_image_url），并直接连接检查过的地址：主机名不会被再次解析，
+    DNS重绑定无法让请求落到内网地址；原主机名通过Host头和TLS SNI传递，证书仍按主机名校验。
+    重定向逐跳处理，每一跳的目标都重新检查
+    参数:
+        client: 下载使用的连接池
+        url: 图片URL
+        max_bytes: 最大字节数，默认为IMAGE_MAX_UPLOAD_BYTES
+    """
+    import httpx
+    max_bytes = max_bytes or settings.IMAGE_MAX_UPLOAD_BYTES
+    target = httpx.URL(url)
+    for _ in range(settings.IMAGE_FETCH_MAX_REDIRECTS + 1):
+        address = await check_image_url(str(target))
+        request_url, headers, extensions = target, None, None
+        if address is not None:
+            request_url = target.copy_with(host=address)
+            headers = {"Host": target.netloc.decode("ascii")}
+            if target.scheme == "https":
+                extensions = {"sni_hostname": target.host}
+        async with client.stream("GET", request_url, headers=headers, extensions=extensions,
+                                 follow_redirects=False) as response:
+            if response.is_redirect:
+                # 相对地址按原URL（而不是连接使用的地址）解析
+                target = target.join(response.headers["Location"])
+                continue
+            response.raise_for_status()
+            data = bytearray()
+            async for chunk in response.aiter_bytes(settings.IMAGE_READ_CHUNK_SIZE):
+                data += chunk
+                if len(data) > max_bytes:
+                    raise ValueError(f"图片大小超过限制({max_bytes}字节)")
+            return data
+    raise ValueError(f"图片URL重定向超过{settings.IMAGE_FETCH_MAX_REDIRECTS}次")
+
+@dataclass(frozen=True)
+class ImageQuality:
+    """
+    图片质量指标
+    """
+    width: int          # 原图宽度
+    height: int         # 原图高度
+    sharpness: float    # 拉普拉斯算子响应的方差，越小越模糊
+    brightness: float   # 平均亮度（0~255）
+    clipped: float      # 欠曝或过曝截断的像素比例（0~1）
+
+@QUALITY_STAGE.time()
+def measure_quality(data: Union[bytes, bytearray], sample_size: int = QUALITY_SAMPLE_SIZE) -> ImageQuality:
+    """
+    计算图片的分辨率、清晰度和曝光指标（同步函数，应在线程池中调用）
+    JPEG通过draft()直接按比例解码为灰度小图，再用NumPy整体计算拉普拉斯方差和亮度直方图
+    """
+    import numpy as np
+    from PIL import Image
+    try:
+        image = Image.open(io.BytesIO(data))
+    except Image.DecompressionBombError as e:
+        raise ValueError(f"图片像素数超过限制({settings.IMAGE_MAX_PIXELS})") from e
+    width, height = image.size
+    check_image_size(image.size)
+    if image.format == "JPEG":
+        image.draft("L", (sample_size, sample_size))
+    image = image.convert("L")
+    image.thumbnail((sample_size, sample_size), Image.Resampling.BILINEAR, reducing_gap=2.0)
+
+    gray = np.asarray(image)
+    pixels = gray.astype(np.float32)
+    # 4邻域拉普拉斯算子：用错位切片整体计算，不逐像素循环
+    laplacian = (pixels[:-2, 1:-1] + pixels[2:, 1:-1] + pixels[1:-1, :-2] + pixels[1:-1, 2:]
+                 - 4 * pixels[1:-1, 1:-1])
+    histogram = np.bincount(gray.ravel(), minlength=256)
+    clipped = histogram[:CLIP_LOW + 1].sum() + histogram[CLIP_HIGH:].sum()
+    return ImageQuality(
+        width=width,
+        height=height,
+        sharpness=float(laplacian.var()) if laplacian.size else 0.0,
+        brightness=float(np.dot(histogram, np.arange(256)) / gray.size),
+        clipped=float(clipped / gray.size),
+    )
+
+def load_image(data: Union[bytes, bytearray], size: tuple = TARGET_SIZE) -> "Image.Image":
+    """
+    解码并缩放图片（同步函数，应在线程池中调用）
+    JPEG通过draft()在DCT阶段直接按比例降采样解码，缩放时先用reduce()整数倍缩小再LANCZOS
+    """
+    from PIL import Image
+    image = Image.open(io.BytesIO(data))
+    if image.format == "JPEG":
+        image.draft("RGB", size)
+
+    # 转换为RGB格式（draft之后图片已很小，转换代价低，且LANCZOS不支持调色板模式）
+    image = decode_rgb(image)
+
+    return resize_image(image, size)
+
+def load_image_fit(data: Union[bytes, bytearray], max_side: int) -> "Image.Image":
+    """
+    解码图片并等比缩小到最长边不超过max_side（同步函数，应在线程池中调用）
+    """
+    from PIL import Image
+    image = Image.open(io.BytesIO(data))
+    if image.format == "JPEG":
+        image.draft("RGB", (max_side, max_side))
+    image = decode_rgb(image)
+    started = time.perf_counter()
+    image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS, reducing_gap=3.0)
+    RESIZE_STAGE.observe(time.perf_counter() - started)
+    return image
+
+def decode_rgb(image: "Image.Image") -> "Image.Image":
+    """
+    解码像素数据并转换为RGB格式
+    """
+    started = time.perf_counter()
+    image.load()
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    DECODE_STAGE.observe(time.perf_counter() - started)
+    return image
+
+@ENCODE_STAGE.time()
+def encode_image(image: "Image.Image", image_format: str = "JPEG", quality: int = 85,
+                 target_bytes: int = 0) -> bytes:
+    """
+    压缩编码图片：JPEG使用渐进式编码，WEBP使用有损编码；
+    指定target_bytes时逐步降低质量直到不超过目标大小（最低降到50）
+    """
+    image_format = image_format.upper()
+    while True:
+        buffered = io.BytesIO()
+        if image_format == "WEBP":
+            image.save(buffered, format="WEBP", quality=quality, method=4)
+        else:
+            image.save(buffered, format="JPEG", quality=quality, optimize=True, progressive=True)
+        if not target_bytes or buffered.tell() <= target_bytes or quality <= 50:
+            return buffered.getvalue()
+        quality = max(50, quality - 10)
+
+def warm():
+    """
+    导入PIL及常用图片格式插件（同步函数，应在线程池中调用）
+    """
+    from PIL import Image
+    Image.preinit()
+
+def start_warm():
+    """
+    在图片处理线程池中预先导入PIL，不阻塞启动，首个图片请求不再承担导入耗时
+    """
+    _executor.submit(warm)
+
+async def run_in_image_pool(func, *args):
+    """
+    在图片处理线程池中执行同步函数
+    """
+    return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+@RESIZE_STAGE.time()
+def resize_image(image: "Image.Image", size: tuple) -> "Image.Image":
     """
     调整图像尺寸
     """
-    return image.resize(size, Image.Resampling.LANCZOS)
+    from PIL import Image
+    return image.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
@@ -0,0 +1,48 @@
+"""
+JSON序列化
+安装了orjson时使用orjson，否则回退到标准库json；dumps直接生成UTF-8编码的bytes（紧凑格式、不转义非ASCII字符），
+上游请求体序列化一次后签名与发送共用同一份bytes，loads直接解析bytes而不先解码为字符串（解析失败时抛出的异常均为ValueError的子类）
+"""
+import json
+from typing import Any
+
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson为可选依赖，未安装时使用标准库
+    orjson = None
+
+
+if orjson is not None:
+    def dumps(obj: Any) -> bytes:
+        """
+        序列化为UTF-8编码的JSON
+        """
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+
+    loads = orjson.loads
+else:
+    def dumps(obj: Any) -> bytes:
+        """
+        序列化为UTF-8编码的JSON
+        """
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    loads = json.loads
+
+
+def dumps_str(obj: Any) -> str:
+    """
+    序列化为JSON字符串（用于SSE、WebSocket文本帧等需要str的场合）
+    """
+    return dumps(obj).decode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    使用上述序列化的JSON响应，作为API路由的默认响应类
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
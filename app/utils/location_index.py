@@ -0,0 +1,235 @@
+"""
+地点增强信息索引模块
+从磁盘上的JSON/YAML目录加载景点描述，预先构建精确、归一化、别名、前缀和模糊匹配索引，
+目录文件变化时在后台线程重建索引并原子替换，查询不被阻塞
+"""
+import asyncio
+import bisect
+import json
+import logging
+import math
+import os
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+ENHANCEMENT_FIELDS = ("atmosphere", "composition", "lighting")
+
+# 前缀匹配要求的最短归一化长度，避免单字误匹配
+MIN_PREFIX_LENGTH = 2
+
+# 单次模糊匹配最多精确比较的候选数，保证常见二元组较多时查询耗时仍然有界
+FUZZY_MAX_CANDIDATES = 5000
+
+logger = logging.getLogger(__name__)
+
+_STRIP_PATTERN = re.compile(r"[\W_]+")
+
+
+def normalize_location(name: str) -> str:
+    """
+    归一化地点名称：全角转半角、忽略大小写、去除空白和标点
+    """
+    return _STRIP_PATTERN.sub("", unicodedata.normalize("NFKC", name).casefold())
+
+
+def _bigrams(text: str) -> frozenset:
+    if len(text) < 2:
+        return frozenset((text,))
+    return frozenset(text[i:i + 2] for i in range(len(text) - 1))
+
+
+def _parse_entries(data) -> List[dict]:
+    """
+    解析目录内容，支持 {地点: 描述} 字典或 [{"name": 地点, "aliases": [...], ...}] 列表两种格式
+    """
+    if isinstance(data, Mapping):
+        data = [{"name": name, **value} for name, value in data.items()]
+    if not isinstance(data, list):
+        raise ValueError("地点目录格式不正确，应为字典或列表")
+    return data
+
+
+def load_catalog(path: str) -> List[dict]:
+    """
+    从JSON或YAML文件读取地点目录
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            # PyYAML为可选依赖，仅加载YAML目录时才导入
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("加载YAML地点目录需要安装PyYAML")
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    return _parse_entries(data or [])
+
+
+class LocationIndex:
+    """
+    不可变的地点索引，构建完成后只读，可在线程间安全共享
+    参数:
+        entries: 地点条目，每项包含name、可选aliases及atmosphere/composition/lighting
+        fuzzy_threshold: 模糊匹配的最低Dice相似度
+        cache_size: 查询结果LRU缓存容量
+    """
+
+    def __init__(self, entries: Iterable[dict], fuzzy_threshold: float = 0.6, cache_size: int = 4096):
+        self.fuzzy_threshold = fuzzy_threshold
+        self._exact: Dict[str, Mapping[str, str]] = {}
+        self._normalized: Dict[str, Mapping[str, str]] = {}
+
+        aliases: List[Tuple[str, Mapping[str, str]]] = []
+        for entry in entries:
+            enhancement = {field: entry[field] for field in ENHANCEMENT_FIELDS}
+            name = entry["name"]
+            self._exact[name] = enhancement
+            self._normalized[normalize_location(name)] = enhancement
+            aliases.extend((alias, enhancement) for alias in entry.get("aliases") or ())
+        # 后出现的同名条目覆盖先前的条目，正式名称优先于别名
+        for alias, enhancement in aliases:
+            self._exact.setdefault(alias, enhancement)
+            self._normalized.setdefault(normalize_location(alias), enhancement)
+        self._normalized.pop("", None)
+
+        # 前缀匹配用的有序键表，模糊匹配用的二元组倒排索引
+        self._sorted_keys = sorted(self._normalized)
+        self._max_key_length = max(map(len, self._sorted_keys), default=0)
+        self._key_grams = [_bigrams(key) for key in self._sorted_keys]
+        postings: Dict[str, List[int]] = {}
+        for key_id, grams in enumerate(self._key_grams):
+            for gram in grams:
+                postings.setdefault(gram, []).append(key_id)
+        self._postings = postings
+
+        self.lookup = lru_cache(maxsize=cache_size)(self._lookup)
+
+    def __len__(self) -> int:
+        return len(self._exact)
+
+    def _lookup(self, location: str) -> Optional[Mapping[str, str]]:
+        """
+        依次尝试精确、归一化/别名、最长前缀、补全前缀和模糊匹配
+        """
+        enhancement = self._exact.get(location)
+        if enhancement is not None:
+            return enhancement
+
+        query = normalize_location(location)
+        if not query:
+            return None
+        enhancement = self._normalized.get(query)
+        if enhancement is not None:
+            return enhancement
+
+        # 目录中的地点是查询的前缀，如“巴黎埃菲尔铁塔夜景”
+        for length in range(min(len(query) - 1, self._max_key_length), MIN_PREFIX_LENGTH - 1, -1):
+            enhancement = self._normalized.get(query[:length])
+            if enhancement is not None:
+                return enhancement
+
+        # 查询是目录中地点的前缀，如“马尔代夫”
+        if len(query) >= MIN_PREFIX_LENGTH:
+            position = bisect.bisect_left(self._sorted_keys, query)
+            if position < len(self._sorted_keys) and self._sorted_keys[position].startswith(query):
+                return self._normalized[self._sorted_keys[position]]
+
+        return self._fuzzy(query)
+
+    def _fuzzy(self, query: str) -> Optional[Mapping[str, str]]:
+        """
+        二元组Dice相似度匹配
+        相似度达到阈值t的候选至少共享 ceil(t*|Q|/(2-t)) 个二元组，
+        因此只需从最稀有的若干个二元组的倒排表中取候选，再逐个精确计算相似度；
+        候选数超过FUZZY_MAX_CANDIDATES时不再纳入更常见的二元组
+        """
+        query_grams = _bigrams(query)
+        threshold = self.fuzzy_threshold
+        required = max(1, math.ceil(threshold * len(query_grams) / (2.0 - threshold) - 1e-9))
+        postings = sorted((self._postings.get(gram, ()) for gram in query_grams), key=len)
+        candidates = set()
+        for posting in postings[:len(query_grams) - required + 1]:
+            if candidates and len(candidates) + len(posting) > FUZZY_MAX_CANDIDATES:
+                break
+            candidates.update(posting)
+
+        best_score, best_id = 0.0, None
+        for key_id in candidates:
+            key_grams = self._key_grams[key_id]
+            score = 2.0 * len(query_grams & key_grams) / (len(query_grams) + len(key_grams))
+            if score > best_score:
+                best_score, best_id = score, key_id
+        if best_id is None or best_score < threshold:
+            return None
+        return self._normalized[self._sorted_keys[best_id]]
+
+
+class LocationCatalog:
+    """
+    地点目录：持有当前索引，并在后台检测目录文件变化后重建
+    参数:
+        builtin: 内置地点描述，目录文件中的同名条目会覆盖它们
+        path: 目录文件路径，为空时只使用内置地点
+        reload_interval: 检查文件变化的间隔（秒）
+        fuzzy_threshold: 模糊匹配的最低相似度
+    """
+
+    def __init__(self, builtin: Mapping[str, Mapping[str, str]], path: str = "",
+                 reload_interval: float = 5.0, fuzzy_threshold: float = 0.6):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.fuzzy_threshold = fuzzy_threshold
+        self._builtin = [{"name": name, **value} for name, value in builtin.items()]
+        self._mtime: Optional[float] = None
+        self._watcher: Optional[asyncio.Task] = None
+        self.version = 0
+        self.index = LocationIndex(self._builtin, fuzzy_threshold)
+
+    def lookup(self, location: str) -> Optional[Mapping[str, str]]:
+        return self.index.lookup(location)
+
+    def reload(self) -> bool:
+        """
+        文件有变化时重建索引并替换，返回是否发生了替换
+        """
+        if not self.path:
+            return False
+        mtime = os.stat(self.path).st_mtime
+        if mtime == self._mtime:
+            return False
+        index = LocationIndex(self._builtin + load_catalog(self.path), self.fuzzy_threshold)
+        # 单次引用赋值，正在进行的查询继续使用旧索引
+        self.index = index
+        self._mtime = mtime
+        self.version += 1
+        return True
+
+    async def start(self):
+        """
+        加载目录并启动后台检测（应用启动时调用）
+        """
+        if not self.path or self._watcher is not None:
+            return
+        await asyncio.to_thread(self.reload)
+        self._watcher = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                await asyncio.to_thread(self.reload)
+            except Exception as e:
+                # 目录文件写到一半或格式错误时保留旧索引，下次再试
+                logger.warning("Location catalog reload failed", extra={"error": str(e)})
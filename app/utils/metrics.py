@@ -0,0 +1,344 @@
+"""
+Prometheus格式的指标采集
+Counter/Gauge/Histogram按标签值缓存子指标，热路径上只做属性自增和一次二分查找，不加锁也不分配新对象；
+在线程池中更新时极少数情况下可能丢失一次计数，对统计用途可以接受。
+GET /metrics 按Prometheus文本格式（0.0.4）输出，指标按进程统计，多worker部署时每个进程各自计数
+"""
+import functools
+import inspect
+import logging
+import math
+import time
+from bisect import bisect_left
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.core.logging_config import dropped_logs
+
+# 请求与上游调用耗时的默认分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# SSE等流式响应的连接时长分桶（秒）
+STREAM_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+# 签名、图片处理等进程内阶段的分桶（秒）
+STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+logger = logging.getLogger(__name__)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+
+class Timer:
+    """
+    计时器：可作为上下文管理器，也可作为同步或异步函数的装饰器
+    作为装饰器时开始时间保存在调用栈的局部变量中，每次调用不分配额外对象
+    """
+    __slots__ = ("_histogram", "_started")
+
+    def __init__(self, histogram: "HistogramChild"):
+        self._histogram = histogram
+        self._started = 0.0
+
+    def __enter__(self) -> "Timer":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._histogram.observe(time.perf_counter() - self._started)
+
+    def __call__(self, func: Callable) -> Callable:
+        histogram = self._histogram
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - started)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started)
+        return wrapper
+
+
+class HistogramChild:
+    __slots__ = ("_bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self._bounds = bounds
+        # 最后一个桶对应+Inf，输出时再累加为累计计数
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self._bounds, value)] += 1
+        self.sum += value
+
+    def time(self) -> Timer:
+        return Timer(self)
+
+
+class Metric:
+    """
+    指标基类
+    参数:
+        name: 指标名称
+        documentation: 指标说明
+        labelnames: 标签名称
+        registry: 所属注册表，默认为全局注册表
+    """
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional["Registry"] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[tuple, object] = {}
+        if not self.labelnames:
+            # 无标签的指标在采集时也输出初始值
+            self.labels()
+        (registry or REGISTRY).register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """
+        获取指定标签值对应的子指标，首次使用时创建并缓存
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name}需要{len(self.labelnames)}个标签值")
+            child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """
+        返回 (名称后缀, 标签字符串, 值) 列表
+        """
+        raise NotImplementedError
+
+    def _label_string(self, values: tuple, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def _new_child(self) -> CounterChild:
+        return CounterChild()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def samples(self):
+        return [("_total", self._label_string(values), child.value) for values, child in list(self._children.items())]
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def _new_child(self) -> GaugeChild:
+        return GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def samples(self):
+        return [("", self._label_string(values), child.value) for values, child in list(self._children.items())]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional["Registry"] = None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self) -> HistogramChild:
+        return HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self) -> Timer:
+        return self.labels().time()
+
+    def samples(self):
+        samples = []
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), list(child.counts)):
+                cumulative += count
+                samples.append(("_bucket", self._label_string(values, f'le="{_format_value(bound)}"'), cumulative))
+            samples.append(("_sum", self._label_string(values), child.sum))
+            samples.append(("_count", self._label_string(values), cumulative))
+        return samples
+
+
+class Registry:
+    """
+    指标注册表
+    采集前先执行注册的采集回调（用于更新需要异步读取的指标，如任务状态存储中的待处理任务数）
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], Awaitable[None]]] = []
+
+    def register(self, metric: Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"指标{metric.name}已注册")
+        self._metrics[metric.name] = metric
+
+    def add_collector(self, collector: Callable[[], Awaitable[None]]):
+        self._collectors.append(collector)
+
+    async def collect(self) -> str:
+        """
+        执行采集回调并以Prometheus文本格式输出全部指标
+        """
+        for collector in self._collectors:
+            try:
+                await collector()
+            except Exception as e:
+                logger.warning("Metrics collector failed", extra={"error": str(e)})
+        return self.render()
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "wanderai_http_request_duration_seconds", "HTTP请求处理耗时（不含流式响应）", ("method", "route"))
+HTTP_STREAM_SECONDS = Histogram(
+    "wanderai_http_stream_duration_seconds", "SSE流式响应的连接时长", ("method", "route"), buckets=STREAM_BUCKETS)
+HTTP_REQUESTS = Counter(
+    "wanderai_http_requests", "HTTP请求数", ("method", "route", "status"))
+UPSTREAM_REQUEST_SECONDS = Histogram(
+    "wanderai_upstream_request_duration_seconds", "火山引擎请求耗时（成功的单次请求）", ("action",))
+UPSTREAM_ERRORS = Counter(
+    "wanderai_upstream_errors", "火山引擎请求错误数（按错误类型）", ("action", "error"))
+STAGE_SECONDS = Histogram(
+    "wanderai_stage_duration_seconds", "进程内处理阶段耗时（签名、prompt构造、图片解码/缩放/编码）",
+    ("stage",), buckets=STAGE_BUCKETS)
+SERVICE_SECONDS = Histogram(
+    "wanderai_service_duration_seconds", "服务层操作耗时", ("operation",))
+TASKS_PENDING = Gauge(
+    "wanderai_tasks_pending", "任务状态存储中未进入终态的任务数")
+TASKS_TRACKED = Gauge(
+    "wanderai_tasks_tracked", "本进程跟踪的任务数")
+RESULT_CACHE_LOOKUPS = Counter(
+    "wanderai_phash_cache_lookups", "相似输入结果缓存查询数（hit/miss/unavailable）", ("result",))
+INPUT_QUALITY_CHECKS = Counter(
+    "wanderai_input_quality_checks", "提交前用户照片质量检查数（passed/flagged/rejected/unavailable）", ("result",))
+SUBMISSION_QUEUE_DEPTH = Gauge(
+    "wanderai_submission_queue_depth", "提交队列中尚未提交上游的任务数")
+SUBMISSION_QUEUE_JOBS = Counter(
+    "wanderai_submission_queue_jobs", "提交队列的提交结果数（submitted/deferred/retried/failed）", ("result",))
+LOGS_DROPPED = Counter(
+    "wanderai_log_records_dropped", "日志队列已满而丢弃的日志数")
+
+
+async def _collect_logging():
+    # 日志处理器只记录累计丢弃数，按新增部分累加
+    child = LOGS_DROPPED.labels()
+    child.inc(dropped_logs() - child.value)
+
+
+REGISTRY.add_collector(_collect_logging)
+
+
+class MetricsMiddleware:
+    """
+    记录各路由的请求耗时和状态码（纯ASGI中间件，路由按模板路径统计，如 /api/task-status/{task_id}）
+    SSE响应的时长是客户端保持连接的时间，单独记录，不计入请求耗时；WebSocket连接不统计
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+        streaming = False
+
+        async def send_wrapper(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                streaming = any(name.lower() == b"content-type" and value.startswith(b"text/event-stream")
+                                for name, value in message.get("headers", ()))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # 路由匹配后FastAPI在scope中记录route，静态文件等挂载点只记录root_path
+            route = scope.get("route")
+            path = route.path if route is not None else (scope.get("root_path") or "unmatched")
+            method = scope["method"]
+            histogram = HTTP_STREAM_SECONDS if streaming else HTTP_REQUEST_SECONDS
+            histogram.labels(method, path).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(method, path, status).inc()
@@ -0,0 +1,122 @@
+"""
+感知哈希与汉明距离索引
+average hash / difference hash 把图片缩小为8x8（dHash为9x8）灰度图后用NumPy整体比较生成64位哈希，
+重新编码、缩放、CDN重新签名后的同一张图片哈希只相差几位；
+MultiIndexHashTable按鸽巢原理把哈希切成 max_distance+1 段分别建立精确索引，
+汉明距离不超过max_distance的哈希至少有一段完全相同，查询只需检查这些桶中的候选，不必遍历全部条目
+"""
+import io
+from typing import TYPE_CHECKING, Dict, Hashable, Iterator, List, Tuple, Union
+
+from app.utils.image_utils import check_image_size
+from app.utils.metrics import STAGE_SECONDS
+
+# NumPy和PIL在首次计算哈希时才导入
+if TYPE_CHECKING:
+    from PIL import Image
+
+HASH_SIZE = 8
+HASH_BITS = HASH_SIZE * HASH_SIZE
+
+HASH_STAGE = STAGE_SECONDS.labels("image_hash")
+
+
+def _pack(bits) -> int:
+    import numpy as np
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def average_hash(image: "Image.Image") -> int:
+    """
+    平均哈希：8x8灰度图中每个像素是否高于平均亮度
+    """
+    import numpy as np
+    from PIL import Image
+    pixels = np.asarray(image.convert("L").resize((HASH_SIZE, HASH_SIZE), Image.Resampling.BOX), dtype=np.float32)
+    return _pack(pixels > pixels.mean())
+
+
+def difference_hash(image: "Image.Image") -> int:
+    """
+    差值哈希：9x8灰度图中每个像素是否比右侧相邻像素暗（对整体亮度、对比度变化不敏感）
+    """
+    import numpy as np
+    from PIL import Image
+    pixels = np.asarray(image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BOX),
+                        dtype=np.int16)
+    return _pack(pixels[:, 1:] > pixels[:, :-1])
+
+
+HASH_FUNCTIONS = {
+    "ahash": average_hash,
+    "dhash": difference_hash,
+}
+
+
+@HASH_STAGE.time()
+def image_hash(data: Union[bytes, bytearray], algorithm: str = "dhash") -> int:
+    """
+    解码图片并计算感知哈希（同步函数，应在线程池中调用）
+    JPEG通过draft()按比例降采样解码，只解出计算哈希所需的小图
+    """
+    from PIL import Image
+    image = Image.open(io.BytesIO(data))
+    check_image_size(image.size)
+    if image.format == "JPEG":
+        image.draft("L", (HASH_SIZE * 8, HASH_SIZE * 8))
+    return HASH_FUNCTIONS[algorithm](image)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class MultiIndexHashTable:
+    """
+    64位哈希的多索引哈希表（multi-index hashing）
+    条目按分区（如生成参数）隔离，每个条目在每一段的索引中各登记一次
+    参数:
+        max_distance: 查询时允许的最大汉明距离，决定分段数
+    """
+
+    def __init__(self, max_distance: int):
+        segments = min(max_distance + 1, HASH_BITS)
+        # 各段长度相差不超过1位：(偏移, 掩码)
+        self._segments: List[Tuple[int, int]] = []
+        offset = 0
+        for index in range(segments):
+            width = HASH_BITS // segments + (index < HASH_BITS % segments)
+            self._segments.append((offset, (1 << width) - 1))
+            offset += width
+        self._buckets: Dict[tuple, List[Hashable]] = {}
+
+    def _keys(self, partition: Hashable, hash_value: int) -> Iterator[tuple]:
+        for index, (offset, mask) in enumerate(self._segments):
+            yield partition, index, (hash_value >> offset) & mask
+
+    def add(self, item: Hashable, partition: Hashable, hash_value: int):
+        for key in self._keys(partition, hash_value):
+            self._buckets.setdefault(key, []).append(item)
+
+    def remove(self, item: Hashable, partition: Hashable, hash_value: int):
+        for key in self._keys(partition, hash_value):
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                continue
+            try:
+                bucket.remove(item)
+            except ValueError:
+                continue
+            if not bucket:
+                del self._buckets[key]
+
+    def candidates(self, partition: Hashable, hash_value: int) -> set:
+        """
+        返回至少有一段与hash_value完全相同的条目（包含全部距离不超过max_distance的条目，需再逐个核对距离）
+        """
+        found = set()
+        for key in self._keys(partition, hash_value):
+            bucket = self._buckets.get(key)
+            if bucket:
+                found.update(bucket)
+        return found
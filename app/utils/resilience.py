@@ -0,0 +1,146 @@
+"""
+上游调用容错工具
+熔断器在上游连续失败时快速失败，冷却后放行少量探测请求；
+延迟统计用于确定对冲请求的发出时机；重试等待使用带抖动的指数退避
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from app.utils.admission import OverloadedError
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(OverloadedError):
+    """
+    上游不健康，熔断器处于打开状态
+    """
+    status_code = 503
+
+
+class CircuitBreaker:
+    """
+    熔断器
+    参数:
+        name: 名称（通常为Action名称）
+        failure_threshold: 连续失败多少次后打开
+        recovery_timeout: 打开后多少秒进入半开状态
+        half_open_max_calls: 半开状态下同时放行的探测请求数
+    """
+
+    def __init__(self, name: str, failure_threshold: int, recovery_timeout: float,
+                 half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.half_open_calls = 0
+
+    def before_call(self):
+        """
+        请求前检查，熔断期间抛出CircuitOpenError
+        """
+        if self.failure_threshold <= 0 or self.state == CLOSED:
+            return
+        if self.state == OPEN:
+            remaining = self.opened_at + self.recovery_timeout - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpenError("火山引擎服务暂时不可用，请稍后重试", max(1, int(remaining + 0.999)))
+            self.state = HALF_OPEN
+            self.half_open_calls = 0
+        if self.half_open_calls >= self.half_open_max_calls:
+            raise CircuitOpenError("火山引擎服务暂时不可用，请稍后重试", 1)
+        self.half_open_calls += 1
+
+    def release(self):
+        """
+        请求未产生结果（被取消或被准入控制拒绝）时归还半开状态的探测名额
+        """
+        if self.state == HALF_OPEN and self.half_open_calls > 0:
+            self.half_open_calls -= 1
+
+    def record_success(self):
+        self.failures = 0
+        if self.state != CLOSED:
+            self.state = CLOSED
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or (self.failure_threshold > 0 and self.failures >= self.failure_threshold):
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.failures}
+
+
+class LatencyTracker:
+    """
+    记录最近若干次请求的耗时，用于计算分位数
+    参数:
+        window: 保留的样本数
+    """
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, percent: float, min_samples: int = 20) -> Optional[float]:
+        """
+        返回最近样本的分位数，样本不足时返回None
+        """
+        if len(self._samples) < min_samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * percent / 100))
+        return ordered[index]
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    带完全抖动的指数退避等待时间
+    参数:
+        attempt: 已重试次数（从0开始）
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+async def hedged(call: Callable[[], Awaitable[T]], delay: Optional[float]) -> T:
+    """
+    发出请求，超过delay秒仍未返回时再发出一个相同的请求，返回先成功的结果并取消另一个
+    参数:
+        call: 发出一次请求的协程函数
+        delay: 对冲等待时间，为None时不对冲
+    """
+    tasks = [asyncio.ensure_future(call())]
+    try:
+        if delay is not None:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                tasks.append(asyncio.ensure_future(call()))
+
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
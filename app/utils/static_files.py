@@ -0,0 +1,135 @@
+"""
+静态文件服务工具
+以内容哈希命名的文件内容不会变化，直接用哈希作为强ETag并允许长期缓存；
+支持单区间Range请求与条件GET
+"""
+import os
+import re
+from typing import Callable, Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from app.core.config import settings
+
+STATIC_URL_PREFIX = "/static"
+
+# 内容哈希文件名，如 3f2a...9c.jpg 或 3f2a...9c_thumb.webp
+CONTENT_HASH_PATTERN = re.compile(r"^([0-9a-f]{32,64}(?:_[a-z0-9]+)?)\.[a-z0-9]+$")
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def static_url(path: str) -> str:
+    """
+    将STATIC_FOLDER下的文件路径转换为静态文件URL路径
+    """
+    relative = os.path.relpath(path, settings.STATIC_FOLDER).replace(os.sep, "/")
+    return f"{STATIC_URL_PREFIX}/{relative}"
+
+
+def parse_range(header: str, file_size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单区间Range请求头，返回闭区间(start, end)；格式不支持时返回None，区间无法满足时抛出ValueError
+    """
+    match = RANGE_PATTERN.match(header.strip())
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # 后缀区间，如 bytes=-500
+        length = int(end)
+        if length == 0:
+            raise ValueError("unsatisfiable range")
+        return max(0, file_size - length), file_size - 1
+    start = int(start)
+    end = min(int(end), file_size - 1) if end else file_size - 1
+    if start > end or start >= file_size:
+        raise ValueError("unsatisfiable range")
+    return start, end
+
+
+class FileRangeResponse(Response):
+    """
+    分块发送文件指定区间的206响应
+    """
+    chunk_size = 64 * 1024
+
+    def __init__(self, path: str, start: int, end: int, file_size: int, headers: dict, method: str):
+        super().__init__(status_code=206, headers=headers)
+        self.path = path
+        self.start = start
+        self.end = end
+        self.send_header_only = method.upper() == "HEAD"
+        self.headers["content-range"] = f"bytes {start}-{end}/{file_size}"
+        self.headers["content-length"] = str(end - start + 1)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if self.send_header_only:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        remaining = self.end - self.start + 1
+        async with await anyio.open_file(self.path, mode="rb") as f:
+            await f.seek(self.start)
+            while remaining > 0:
+                chunk = await f.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    静态文件服务：内容哈希文件返回强ETag与immutable缓存头，支持Range请求
+    参数:
+        on_access: 文件被访问时的回调，参数为文件路径（用于结果缓存的LRU统计）
+    """
+
+    def __init__(self, *args, on_access: Optional[Callable[[str], None]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_access = on_access
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200) -> Response:
+        if self.on_access is not None:
+            self.on_access(str(full_path))
+
+        headers = {"accept-ranges": "bytes"}
+        match = CONTENT_HASH_PATTERN.match(os.path.basename(full_path))
+        if match is not None:
+            headers["etag"] = f'"{match.group(1)}"'
+            headers["cache-control"] = f"public, max-age={settings.STATIC_CACHE_MAX_AGE}, immutable"
+
+        method = scope["method"]
+        request_headers = Headers(scope=scope)
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result,
+                                method=method, headers=headers)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+
+        range_header = request_headers.get("range")
+        if range_header is None or status_code != 200:
+            return response
+        # If-Range与当前ETag不一致时说明客户端缓存的是旧内容，返回完整文件
+        if_range = request_headers.get("if-range")
+        if if_range is not None and if_range != response.headers.get("etag"):
+            return response
+
+        file_size = stat_result.st_size
+        try:
+            byte_range = parse_range(range_header, file_size)
+        except ValueError:
+            return Response(status_code=416, headers={"content-range": f"bytes */{file_size}"})
+        if byte_range is None:
+            return response
+
+        range_headers = {key: value for key, value in response.headers.items()
+                         if key not in ("content-length", "content-range")}
+        return FileRangeResponse(str(full_path), byte_range[0], byte_range[1], file_size, range_headers, method)
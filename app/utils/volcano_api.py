@@ -1,94 +1,35 @@
-import json
-import sys
-import os
-import base64
-import datetime
-import hashlib
-import hmac
-import requests
-from typing import Optional
-from PIL import Image
-import io
-from app.core.config import settings
+"""
+火山引擎API调用
+提交生成任务（CVSync2AsyncSubmitTask）和查询任务结果（CVSync2AsyncGetResult）共用签名客户端、凭证池和JSON序列化；
+模块只依赖请求路径用到的组件，不导入图片处理相关的库
+"""
+import logging
+import time
+from app.core.logging_config import redact_urls, sample_payload, task_id_var
+from app.utils.admission import PRIORITY_POLL, OverloadedError
+from app.utils.credential_pool import Credential, credential_pool
+from app.utils.json_codec import dumps, dumps_str, loads
+from app.utils.metrics import STAGE_SECONDS
+from app.utils.prompt_builder import build_travel_photo_prompt
+from app.utils.volcano_client import formatQuery, service, signV4Request
 
-method = 'POST'
-host = 'visual.volcengineapi.com'
-endpoint = 'https://visual.volcengineapi.com'
-service = 'cv'
+SUBMIT_ACTION = 'CVSync2AsyncSubmitTask'
+QUERY_RESULT_ACTION = 'CVSync2AsyncGetResult'
+PROMPT_STAGE = STAGE_SECONDS.labels("prompt_build")
 
+logger = logging.getLogger(__name__)
 
-def sign(key, msg):
-    return hmac.new(key, msg.encode('utf-8'), hashlib.sha256).digest()
-
-
-def getSignatureKey(key, dateStamp, regionName, serviceName):
-    kDate = sign(key.encode('utf-8'), dateStamp)
-    kRegion = sign(kDate, regionName)
-    kService = sign(kRegion, serviceName)
-    kSigning = sign(kService, 'request')
-    return kSigning
-
-
-def formatQuery(parameters):
-    request_parameters_init = ''
-    for key in sorted(parameters):
-        request_parameters_init += key + '=' + parameters[key] + '&'
-    request_parameters = request_parameters_init[:-1]
-    return request_parameters
-
-
-def signV4Request(access_key, secret_key, service, req_query, req_body):
-    if access_key is None or secret_key is None:
-        print('No access key is available.')
-        sys.exit()
-    
-    t = datetime.datetime.utcnow()
-    current_date = t.strftime('%Y%m%dT%H%M%SZ')
-    datestamp = t.strftime('%Y%m%d')  # Date w/o time, used in credential scope
-    
-    canonical_uri = '/'
-    canonical_querystring = req_query
-    signed_headers = 'content-type;host;x-content-sha256;x-date'
-    
-    payload_hash = hashlib.sha256(req_body.encode('utf-8')).hexdigest()
-    content_type = 'application/json'
-    
-    canonical_headers = 'content-type:' + content_type + '\n' + 'host:' + host + \
-        '\n' + 'x-content-sha256:' + payload_hash + \
-        '\n' + 'x-date:' + current_date + '\n'
-    
-    canonical_request = method + '\n' + canonical_uri + '\n' + canonical_querystring + \
-        '\n' + canonical_headers + '\n' + signed_headers + '\n' + payload_hash
-    
-    algorithm = 'HMAC-SHA256'
-    credential_scope = datestamp + '/' + settings.VOLCANO_REGION + '/' + service + '/' + 'request'
-    
-    string_to_sign = algorithm + '\n' + current_date + '\n' + credential_scope + '\n' + hashlib.sha256(
-        canonical_request.encode('utf-8')).hexdigest()
-    
-    signing_key = getSignatureKey(secret_key, datestamp, settings.VOLCANO_REGION, service)
-    signature = hmac.new(signing_key, (string_to_sign).encode(
-        'utf-8'), hashlib.sha256).hexdigest()
-    
-    authorization_header = algorithm + ' ' + 'Credential=' + access_key + '/' + \
-        credential_scope + ', ' + 'SignedHeaders=' + \
-        signed_headers + ', ' + 'Signature=' + signature
-    
-    headers = {
-        'X-Date': current_date,
-        'Authorization': authorization_header,
-        'X-Content-Sha256': payload_hash,
-        'Content-Type': content_type
-    }
-    
-    request_url = endpoint + '?' + canonical_querystring
-    
-    try:
-        r = requests.post(request_url, headers=headers, data=req_body)
-        return r
-    except Exception as err:
-        print(f'error occurred: {err}')
-        raise
+# 查询参数固定不变，模块加载时格式化一次
+SUBMIT_QUERY = formatQuery({
+    'Action': SUBMIT_ACTION,
+    'Version': '2022-08-31',
+})
+QUERY_RESULT_QUERY = formatQuery({
+    'Action': QUERY_RESULT_ACTION,
+    'Version': '2022-08-31',
+})
+# req_json同样固定不变
+QUERY_REQ_JSON = dumps_str({"return_url": True})
 
 
 async def call_volcano_image_api(
@@ -106,22 +47,10 @@ async def call_volcano_image_api(
         location: 旅游地点
     """
     try:
-        # 获取访问密钥和私密密钥
-        access_key = settings.VOLCANO_ACCESS_KEY
-        secret_key = settings.VOLCANO_SECRET_KEY
-        
-        if not access_key or not secret_key:
-            raise ValueError("VOLCANO_ACCESS_KEY或VOLCANO_SECRET_KEY未在配置文件中设置")
-        
-        # 构建请求参数
-        query_params = {
-            'Action': 'CVSync2AsyncSubmitTask',
-            'Version': '2022-08-31',
-        }
-        
         # 使用prompt构造工具生成优化的prompt
-        from app.utils.prompt_builder import build_travel_photo_prompt
+        started = time.perf_counter()
         enhanced_prompt = build_travel_photo_prompt(location, style, quality)
+        PROMPT_STAGE.observe(time.perf_counter() - started)
         
         body_params = {
             "req_key": "jimeng_t2i_v40",
@@ -133,30 +62,37 @@ async def call_volcano_image_api(
             "response_format": "url"
         }
         
-        formatted_query = formatQuery(query_params)
-        formatted_body = json.dumps(body_params)
+        # 序列化为bytes一次，签名计算哈希与发送共用同一份
+        formatted_body = dumps(body_params)
         
-        # 调用签名函数
-        response = signV4Request(access_key, secret_key, service, formatted_query, formatted_body)
+        async def submit(credential):
+            # 调用签名函数
+            return await signV4Request(credential.access_key, credential.secret_key, service, SUBMIT_QUERY,
+                                       formatted_body, action=SUBMIT_ACTION, region=credential.region)
         
-        # 打印响应状态码
-        print("Response Status Code:", response.status_code)
+        # 从凭证池选择访问密钥，被限流或被拒绝时自动换用其他密钥
+        credential, response = await credential_pool.submit(submit)
         
-        # 打印响应内容
-        print("Response Content:", response.text)
+        # 响应内容只按比例抽样记录
+        if sample_payload():
+            logger.info("Volcano submit response", extra={"status_code": response.status_code,
+                                                          "body": redact_urls(response.text)})
         
-        # 解析响应结果
-        result = response.json()
+        # 解析响应结果（直接解析响应bytes）
+        result = loads(response.content)
         
         # 提取生成的图片数据
         if "data" in result:
             data = result["data"]
-            print("Data section:", data)
             
             # 检查是否有task_id
             if "task_id" in data:
                 task_id = data["task_id"]
-                print("Task ID:", task_id)
+                # 之后本请求中的日志都带上任务ID
+                task_id_var.set(task_id)
+                logger.info("Volcano task submitted", extra={"region": credential.region})
+                # 记录任务所属的凭证，之后的状态查询发往同一访问密钥
+                credential_pool.pin(task_id, credential)
                 # 返回task_id，前端可以通过task_id查询任务状态
                 return task_id
             
@@ -164,16 +100,104 @@ async def call_volcano_image_api(
             # 可以在这里添加更多的解析逻辑
             
         raise ValueError("API返回结果格式不正确")
+    except OverloadedError:
+        # 配额已满，保留重试时间交给API层返回429
+        raise
     except Exception as e:
-        print("Error occurred:", str(e))
+        logger.warning("Volcano submit failed", extra={"error": redact_urls(str(e))})
         raise ValueError(f"调用火山引擎AI绘画API失败: {str(e)}")
 
 
-def image_to_base64(image: Image.Image) -> str:
+async def query_volcano_task_result(task_id: str):
     """
-    将PIL图像转换为base64编码字符串
+    查询火山引擎AI任务结果
+    参数:
+        task_id: 任务ID
+    """
+    try:
+        # 使用创建任务的访问密钥查询；未记录的任务（如服务重启前提交的）依次尝试各个密钥
+        candidates = credential_pool.candidates_for_task(task_id)
+        
+        if not candidates:
+            raise ValueError("VOLCANO_ACCESS_KEY或VOLCANO_SECRET_KEY未在配置文件中设置")
+        
+        body_params = {
+            "req_key": "jimeng_t2i_v40",
+            "task_id": task_id,
+            "req_json": QUERY_REQ_JSON
+        }
+        
+        # 序列化为bytes一次，各候选密钥的签名与发送共用同一份
+        formatted_body = dumps(body_params)
+        
+        async def query(credential: Credential):
+            return await _query_with_credential(credential, task_id, formatted_body)
+        
+        for index, credential in enumerate(candidates):
+            is_last = index == len(candidates) - 1
+            if len(candidates) == 1:
+                result = await credential_pool.call(credential, query)
+            else:
+                # 逐个尝试时其他密钥查不到任务是正常现象，不计入密钥的健康状态
+                try:
+                    result = await query(credential)
+                except OverloadedError:
+                    raise
+                except Exception:
+                    if is_last:
+                        raise
+                    continue
+                if isinstance(result, dict) and result["status"] == "not_found" and not is_last:
+                    continue
+            credential_pool.pin(task_id, credential)
+            return result
+        
+    except OverloadedError:
+        raise
+    except Exception as e:
+        logger.warning("Volcano task query failed", extra={"error": redact_urls(str(e))})
+        raise ValueError(f"查询火山引擎AI任务结果失败: {str(e)}")
+
+
+async def _query_with_credential(credential: Credential, task_id: str, formatted_body: bytes):
     """
-    buffered = io.BytesIO()
-    image.save(buffered, format="JPEG")
-    img_str = base64.b64encode(buffered.getvalue()).decode()
-    return img_str
+    使用指定凭证查询一次任务结果
+    """
+    # 调用签名函数
+    response = await signV4Request(credential.access_key, credential.secret_key, service, QUERY_RESULT_QUERY,
+                                   formatted_body, action=QUERY_RESULT_ACTION, priority=PRIORITY_POLL,
+                                   region=credential.region)
+    
+    # 响应内容只按比例抽样记录
+    if sample_payload():
+        logger.info("Volcano query response", extra={"status_code": response.status_code,
+                                                     "body": redact_urls(response.text)})
+    
+    # 解析响应结果（直接解析响应bytes）
+    result = loads(response.content)
+    
+    # 提取任务结果数据
+    if "data" in result:
+        data = result["data"]
+        
+        # 检查任务状态
+        if "status" in data:
+            status = data["status"]
+            logger.debug("Volcano task status", extra={"status": status})
+            
+            # 如果任务已完成，检查是否有图片URL
+            if status == "done" and "image_urls" in data and len(data["image_urls"]) > 0:
+                image_urls = data["image_urls"]
+                # 返回第一张生成的图片URL
+                return image_urls[0]
+            
+            # 返回任务状态供前端判断
+            return {"task_id": task_id, "status": status}
+        
+        # 如果没有status字段，但有image_urls字段
+        if "image_urls" in data and len(data["image_urls"]) > 0:
+            image_urls = data["image_urls"]
+            # 返回第一张生成的图片URL
+            return image_urls[0]
+        
+    raise ValueError("任务查询API返回结果格式不正确")
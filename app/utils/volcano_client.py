@@ -0,0 +1,275 @@
+"""
+火山引擎API异步客户端模块
+提供基于keep-alive连接池的异步HTTP客户端，签名由volcano_signer完成；
+每个Action有独立的超时、重试和对冲策略，熔断器和延迟统计按（访问密钥, 区域, Action）区分，
+单个凭证或区域故障时凭证池可以换用其他凭证
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.core.config import settings
+from app.utils.admission import admission
+from app.utils.credential_pool import CredentialRejectedError, UpstreamThrottledError, mask_access_key
+from app.utils.metrics import STAGE_SECONDS, UPSTREAM_ERRORS, UPSTREAM_REQUEST_SECONDS
+from app.utils.resilience import CircuitBreaker, CircuitOpenError, LatencyTracker, backoff_delay, hedged
+from app.utils.volcano_signer import VolcanoSigner, formatQuery, service
+
+# 可指向测试环境或本地模拟服务，签名的host与之保持一致
+endpoint = settings.VOLCANO_ENDPOINT.rstrip('/')
+host = urlsplit(endpoint).netloc
+
+SIGN_STAGE = STAGE_SECONDS.labels("sign")
+
+logger = logging.getLogger(__name__)
+
+# 请求尚未发出的错误，任何请求重试都是安全的
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# 幂等请求可重试的错误：网络错误、超时和5xx
+RETRYABLE_ERRORS = (httpx.TransportError, httpx.HTTPStatusError)
+
+
+@dataclass(frozen=True)
+class ActionPolicy:
+    """
+    单个Action的调用策略
+    参数:
+        connect_timeout: 建立连接超时（秒）
+        read_timeout: 读取超时（秒），同时作为单次请求的总时长上限
+        idempotent: 是否幂等；幂等请求失败可重试并在慢时发出对冲请求，非幂等请求只在连接未建立时重试
+    """
+    connect_timeout: float
+    read_timeout: float
+    idempotent: bool
+
+    @property
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+
+    @property
+    def deadline(self) -> float:
+        return self.connect_timeout + self.read_timeout
+
+
+ACTION_POLICIES = {
+    'CVSync2AsyncSubmitTask': ActionPolicy(
+        settings.VOLCANO_SUBMIT_CONNECT_TIMEOUT, settings.VOLCANO_SUBMIT_READ_TIMEOUT, idempotent=False),
+    'CVSync2AsyncGetResult': ActionPolicy(
+        settings.VOLCANO_QUERY_CONNECT_TIMEOUT, settings.VOLCANO_QUERY_READ_TIMEOUT, idempotent=True),
+}
+DEFAULT_POLICY = ActionPolicy(settings.VOLCANO_CONNECT_TIMEOUT, settings.VOLCANO_TIMEOUT, idempotent=False)
+
+
+class VolcanoClient:
+    """
+    火山引擎异步HTTP客户端
+    在应用启动时打开连接池，关闭时释放，所有请求复用同一组keep-alive连接
+    参数:
+        transport: 自定义的httpx传输层（测试中用于模拟上游），默认使用连接池
+    """
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._signers: Dict[Tuple[str, str, str, str], VolcanoSigner] = {}
+        self._breakers: Dict[Tuple[str, str, str], CircuitBreaker] = {}
+        self._latencies: Dict[Tuple[str, str, str], LatencyTracker] = {}
+
+    async def start(self):
+        """
+        创建连接池（应用启动时调用）
+        """
+        if self._client is not None:
+            return
+        limits = httpx.Limits(
+            max_connections=settings.VOLCANO_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.VOLCANO_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.VOLCANO_KEEPALIVE_EXPIRY,
+        )
+        timeout = httpx.Timeout(
+            settings.VOLCANO_TIMEOUT,
+            connect=settings.VOLCANO_CONNECT_TIMEOUT,
+        )
+        self._client = httpx.AsyncClient(limits=limits, timeout=timeout, transport=self._transport)
+
+    async def close(self):
+        """
+        关闭连接池（应用关闭时调用）
+        """
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def get_signer(self, access_key: str, secret_key: str, service: str = service,
+                   region: Optional[str] = None) -> VolcanoSigner:
+        """
+        获取（并缓存）指定凭证和区域对应的签名器
+        """
+        region = region or settings.VOLCANO_REGION
+        cache_key = (access_key, secret_key, region, service)
+        signer = self._signers.get(cache_key)
+        if signer is None:
+            signer = VolcanoSigner(access_key, secret_key, region, service, host)
+            self._signers[cache_key] = signer
+        return signer
+
+    def get_breaker(self, access_key: str, action: str, region: Optional[str] = None) -> CircuitBreaker:
+        """
+        获取（并创建）指定凭证、区域和Action的熔断器
+        """
+        key = (access_key, region or settings.VOLCANO_REGION, action)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(action, settings.VOLCANO_BREAKER_FAILURES, settings.VOLCANO_BREAKER_RECOVERY)
+            self._breakers[key] = breaker
+            self._latencies[key] = LatencyTracker()
+        return breaker
+
+    def health(self) -> List[dict]:
+        """
+        各凭证、区域和Action的熔断器状态与最近的延迟分位数
+        """
+        status = []
+        for key, breaker in self._breakers.items():
+            access_key, region, action = key
+            latency = self._latencies[key]
+            status.append({
+                "access_key": mask_access_key(access_key),
+                "region": region,
+                "action": action,
+                **breaker.snapshot(),
+                "p50_latency": latency.percentile(50, min_samples=1),
+                "p95_latency": latency.percentile(95, min_samples=1),
+            })
+        return status
+
+    async def post(self, access_key, secret_key, service, req_query,
+                   req_body: Union[bytes, str], action: Optional[str] = None,
+                   priority: Optional[int] = None, region: Optional[str] = None) -> httpx.Response:
+        """
+        发送签名后的POST请求
+        参数:
+            access_key: 访问密钥
+            secret_key: 私密密钥
+            service: 服务名称
+            req_query: 已格式化的查询字符串
+            req_body: 已序列化的JSON请求体（bytes或str）
+            action: Action名称，指定时经过该凭证和Action的熔断、准入控制和重试策略
+            priority: 准入优先级，默认取当前请求的优先级
+            region: 签名使用的区域，默认为VOLCANO_REGION
+        """
+        if access_key is None or secret_key is None:
+            raise ValueError('No access key is available.')
+
+        # 未经过应用生命周期启动时（如脚本直接调用）按需创建连接池
+        if self._client is None:
+            await self.start()
+
+        # 只编码一次，签名与发送共用同一份bytes
+        if isinstance(req_body, str):
+            req_body = req_body.encode('utf-8')
+        region = region or settings.VOLCANO_REGION
+        started = time.perf_counter()
+        headers = self.get_signer(access_key, secret_key, service, region).sign(req_query, req_body)
+        SIGN_STAGE.observe(time.perf_counter() - started)
+        request_url = endpoint + '?' + req_query
+
+        if action is None:
+            return await self._send(request_url, headers, req_body)
+
+        policy = ACTION_POLICIES.get(action, DEFAULT_POLICY)
+        breaker = self.get_breaker(access_key, action, region)
+        latency = self._latencies[(access_key, region, action)]
+        request_seconds = UPSTREAM_REQUEST_SECONDS.labels(action)
+
+        async def attempt() -> httpx.Response:
+            try:
+                breaker.before_call()
+            except CircuitOpenError as e:
+                UPSTREAM_ERRORS.labels(action, type(e).__name__).inc()
+                raise
+            try:
+                async with admission.acquire(access_key, action, priority):
+                    started = time.monotonic()
+                    try:
+                        response = await asyncio.wait_for(
+                            self._send(request_url, headers, req_body, policy.timeout), policy.deadline)
+                    except asyncio.TimeoutError:
+                        raise httpx.TimeoutException(f"请求超过{policy.deadline:g}秒未完成")
+                # 5xx视为上游故障，交由重试和熔断处理
+                if response.status_code >= 500:
+                    response.raise_for_status()
+            except RETRYABLE_ERRORS as e:
+                breaker.record_failure()
+                UPSTREAM_ERRORS.labels(action, type(e).__name__).inc()
+                raise
+            except Exception as e:
+                # 被限流不代表上游不健康
+                breaker.release()
+                UPSTREAM_ERRORS.labels(action, type(e).__name__).inc()
+                raise
+            except BaseException:
+                # 被取消（如对冲中落后的请求）不计为错误
+                breaker.release()
+                raise
+            elapsed = time.monotonic() - started
+            breaker.record_success()
+            latency.record(elapsed)
+            request_seconds.observe(elapsed)
+            return response
+
+        # 幂等请求在超过延迟分位数后发出对冲请求
+        hedge_delay = None
+        if policy.idempotent and settings.VOLCANO_HEDGE_PERCENTILE > 0:
+            observed = latency.percentile(settings.VOLCANO_HEDGE_PERCENTILE)
+            if observed is not None:
+                hedge_delay = max(observed, settings.VOLCANO_HEDGE_MIN_DELAY)
+
+        retry_on = RETRYABLE_ERRORS if policy.idempotent else CONNECT_ERRORS
+        retries = 0
+        while True:
+            try:
+                return await hedged(attempt, hedge_delay)
+            except retry_on:
+                if retries >= settings.VOLCANO_MAX_RETRIES:
+                    raise
+                await asyncio.sleep(backoff_delay(retries, settings.VOLCANO_RETRY_BASE_DELAY,
+                                                  settings.VOLCANO_RETRY_MAX_DELAY))
+                retries += 1
+
+    async def _send(self, request_url: str, headers: dict, req_body: bytes,
+                    timeout: Optional[httpx.Timeout] = None) -> httpx.Response:
+        try:
+            if timeout is None:
+                response = await self._client.post(request_url, headers=headers, content=req_body)
+            else:
+                response = await self._client.post(request_url, headers=headers, content=req_body, timeout=timeout)
+        except Exception as err:
+            logger.warning("Volcano request error", extra={"error": type(err).__name__, "detail": str(err)})
+            raise
+        # 上游限流时同样快速失败，由凭证池换用其他密钥或由API层转换为429
+        if response.status_code == 429:
+            retry_after = response.headers.get("Retry-After", "")
+            raise UpstreamThrottledError("火山引擎请求被限流，请稍后重试",
+                                         int(retry_after) if retry_after.isdigit() else 1)
+        if response.status_code in (401, 403):
+            raise CredentialRejectedError(f"火山引擎拒绝了访问密钥({response.status_code})")
+        return response
+
+
+volcano_client = VolcanoClient()
+
+
+async def signV4Request(access_key, secret_key, service, req_query, req_body,
+                        action: Optional[str] = None, priority: Optional[int] = None,
+                        region: Optional[str] = None) -> httpx.Response:
+    """
+    使用共享连接池发送V4签名请求
+    """
+    return await volcano_client.post(access_key, secret_key, service, req_query, req_body,
+                                     action, priority, region)
@@ -0,0 +1,104 @@
+"""
+火山引擎V4签名模块
+派生签名密钥按 (日期, 区域, 服务) 缓存，规范请求中的固定部分在构造签名器时预先拼接
+"""
+import datetime
+import hashlib
+import hmac
+from functools import lru_cache
+from typing import Optional, Union
+
+method = 'POST'
+host = 'visual.volcengineapi.com'
+service = 'cv'
+algorithm = 'HMAC-SHA256'
+content_type = 'application/json'
+signed_headers = 'content-type;host;x-content-sha256;x-date'
+
+
+def sign(key, msg):
+    return hmac.new(key, msg.encode('utf-8'), hashlib.sha256).digest()
+
+
+@lru_cache(maxsize=64)
+def getSignatureKey(key, dateStamp, regionName, serviceName):
+    # 派生密钥每个UTC日只变化一次，缓存后每次签名只需一次HMAC
+    kDate = sign(key.encode('utf-8'), dateStamp)
+    kRegion = sign(kDate, regionName)
+    kService = sign(kRegion, serviceName)
+    kSigning = sign(kService, 'request')
+    return kSigning
+
+
+def formatQuery(parameters):
+    return '&'.join(key + '=' + parameters[key] for key in sorted(parameters))
+
+
+class VolcanoSigner:
+    """
+    可复用的V4签名器
+    参数:
+        access_key: 访问密钥
+        secret_key: 私密密钥
+        region: 区域
+        service: 服务名称
+        host: 请求主机名
+    """
+
+    def __init__(self, access_key: str, secret_key: str, region: str,
+                 service: str = service, host: str = host):
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.service = service
+        self.host = host
+
+        # 预先拼接规范请求、凭证范围和Authorization头中不随请求变化的部分
+        self._canonical_headers_prefix = (
+            'content-type:' + content_type + '\n' + 'host:' + host + '\n' + 'x-content-sha256:'
+        )
+        self._canonical_request_suffix = '\n' + signed_headers + '\n'
+        self._scope_suffix = '/' + region + '/' + service + '/request'
+        self._authorization_prefix = algorithm + ' Credential=' + access_key + '/'
+        self._authorization_middle = ', SignedHeaders=' + signed_headers + ', Signature='
+
+    def sign(self, req_query: str, req_body: Union[bytes, str],
+             now: Optional[datetime.datetime] = None) -> dict:
+        """
+        计算签名并返回请求头
+        参数:
+            req_query: 已格式化的查询字符串
+            req_body: 请求体，推荐直接传入已编码的bytes以避免重复编码
+            now: 签名时间（UTC），默认为当前时间
+        """
+        if isinstance(req_body, str):
+            req_body = req_body.encode('utf-8')
+
+        t = now or datetime.datetime.utcnow()
+        current_date = t.strftime('%Y%m%dT%H%M%SZ')
+        datestamp = current_date[:8]  # Date w/o time, used in credential scope
+
+        payload_hash = hashlib.sha256(req_body).hexdigest()
+
+        canonical_request = ''.join((
+            method, '\n/\n', req_query, '\n',
+            self._canonical_headers_prefix, payload_hash, '\n',
+            'x-date:', current_date, '\n',
+            self._canonical_request_suffix, payload_hash,
+        ))
+
+        credential_scope = datestamp + self._scope_suffix
+        string_to_sign = ''.join((
+            algorithm, '\n', current_date, '\n', credential_scope, '\n',
+            hashlib.sha256(canonical_request.encode('utf-8')).hexdigest(),
+        ))
+
+        signing_key = getSignatureKey(self.secret_key, datestamp, self.region, self.service)
+        signature = hmac.new(signing_key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+
+        return {
+            'X-Date': current_date,
+            'Authorization': self._authorization_prefix + credential_scope + self._authorization_middle + signature,
+            'X-Content-Sha256': payload_hash,
+            'Content-Type': content_type
+        }
@@ -0,0 +1,102 @@
+"""
+火山引擎客户端连接池压测
+启动火山引擎模拟服务（benchmarks.volcano_stub，固定延迟），在同一个事件循环中以不同并发数查询任务结果：
+  blocking: 旧版的调用方式，协程中同步发送请求且每次新建连接，会阻塞事件循环，并发请求退化为串行
+  pooled:   query_volcano_task_result，经共享的keep-alive连接池异步发送
+输出每种方式在各并发数下的每秒请求数、p50/p99延迟，以及相对串行（并发数1）的加速比
+
+用法:
+    python -m benchmarks.bench_client_pool [每个并发级别的请求数] [并发数，逗号分隔]
+"""
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.bench_server import PROJECT_ROOT, STUB_PORT, stop, wait_ready
+
+STUB_LATENCY = 0.05
+ENDPOINT = f"http://127.0.0.1:{STUB_PORT}"
+
+
+def configure_env():
+    # 压测的是客户端本身，关闭准入限速、对冲和重试
+    os.environ.update(
+        VOLCANO_ENDPOINT=ENDPOINT,
+        VOLCANO_ACCESS_KEY="AKLTbenchmark",
+        VOLCANO_SECRET_KEY="benchmark",
+        VOLCANO_CREDENTIALS="",
+        VOLCANO_QUERY_QPS="0",
+        VOLCANO_MAX_CONCURRENCY="0",
+        VOLCANO_HEDGE_PERCENTILE="0",
+        VOLCANO_MAX_RETRIES="0",
+        LOG_LEVEL="WARNING",
+    )
+
+
+async def run_level(call, requests: int, concurrency: int):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index: int):
+        async with semaphore:
+            started = time.perf_counter()
+            await call(index)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(requests)))
+    return requests / (time.perf_counter() - started), sorted(latencies)
+
+
+async def bench(requests: int, levels):
+    import httpx
+
+    from app.utils.volcano_api import QUERY_RESULT_QUERY, query_volcano_task_result
+    from app.utils.volcano_client import volcano_client
+    from app.utils.volcano_signer import VolcanoSigner, service
+
+    signer = VolcanoSigner("AKLTbenchmark", "benchmark", "cn-north-1", service, f"127.0.0.1:{STUB_PORT}")
+
+    async def blocking(index: int):
+        body = f'{{"req_key":"jimeng_t2i_v40","task_id":"{index}"}}'.encode()
+        httpx.post(ENDPOINT + "?" + QUERY_RESULT_QUERY, headers=signer.sign(QUERY_RESULT_QUERY, body),
+                   content=body).raise_for_status()
+
+    async def pooled(index: int):
+        await query_volcano_task_result(str(index))
+
+    await volcano_client.start()
+    try:
+        for name, call in (("blocking", blocking), ("pooled", pooled)):
+            serial = None
+            for concurrency in levels:
+                rps, latencies = await run_level(call, requests, concurrency)
+                serial = serial or rps
+                p50 = latencies[len(latencies) // 2] * 1000
+                p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+                print(f"{name:<9} c={concurrency:<4} rps={rps:8.1f}  p50={p50:7.1f} ms  p99={p99:7.1f} ms  "
+                      f"speedup={rps / serial:5.1f}x")
+    finally:
+        await volcano_client.close()
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    levels = [int(level) for level in (sys.argv[2] if len(sys.argv) > 2 else "1,16,64").split(",")]
+    configure_env()
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.volcano_stub:app", "--port", str(STUB_PORT),
+         "--log-level", "warning", "--no-access-log"], cwd=PROJECT_ROOT,
+        env={**os.environ, "VOLCANO_STUB_LATENCY": str(STUB_LATENCY)})
+    print(f"requests={requests} stub_latency={STUB_LATENCY * 1000:.0f} ms")
+    try:
+        wait_ready(f"{ENDPOINT}/")
+        asyncio.run(bench(requests, levels))
+    finally:
+        stop(stub)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+端到端压测
+启动火山引擎模拟服务（benchmarks.volcano_stub）和本服务，在固定的并发级别下分别压测：
+  generate: POST /api/generate-travel-photo
+  status:   GET /api/task-status/{task_id}
+每个场景、每个并发级别输出吞吐量、p50/p95/p99延迟、按状态码统计的错误数，
+以及期间模拟服务收到的上游调用次数（含后台轮询），结果以JSON输出，便于不同版本之间对比
+
+用法:
+    python -m benchmarks.bench_e2e --concurrency 1,16,64 --duration 10 --output result.json
+    python -m benchmarks.bench_e2e --stub-latency-dist lognormal --stub-error-rate 0.01 --stub-task-seconds 3
+    python -m benchmarks.bench_e2e --compare baseline.json --output result.json
+    python -m benchmarks.bench_e2e --stub-latency 0.5 --server-env SUBMISSION_QUEUE_ENABLED=true
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from benchmarks.bench_server import (
+    PROJECT_ROOT,
+    SERVER_PORT,
+    STATUS_TASKS,
+    STUB_PORT,
+    create_tasks,
+    run_load,
+    server_env,
+    stop,
+    wait_ready,
+)
+
+SCENARIOS = ("generate", "status")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="端到端压测（使用火山引擎模拟服务）")
+    parser.add_argument("--concurrency", default="1,16,64", help="并发连接数，逗号分隔")
+    parser.add_argument("--duration", type=float, default=10, help="每个并发级别持续的秒数")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="压测场景，逗号分隔")
+    parser.add_argument("--workers", default="1", help="服务worker进程数")
+    parser.add_argument("--server-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="传给服务的额外环境变量，可重复，如 SUBMISSION_QUEUE_ENABLED=true")
+    parser.add_argument("--stub-latency", type=float, default=0.05, help="上游平均延迟（秒）")
+    parser.add_argument("--stub-latency-dist", default="constant",
+                        choices=("constant", "uniform", "exponential", "lognormal"), help="上游延迟分布")
+    parser.add_argument("--stub-error-rate", type=float, default=0, help="上游返回500的比例")
+    parser.add_argument("--stub-throttle-qps", type=float, default=0, help="上游每个Action的限流QPS，0为不限流")
+    parser.add_argument("--stub-task-seconds", type=float, default=0, help="上游任务从提交到完成的秒数")
+    parser.add_argument("--output", help="结果JSON的写入路径，默认输出到标准输出")
+    parser.add_argument("--compare", help="与之对比的历史结果JSON")
+    return parser.parse_args()
+
+
+def stub_env(args) -> dict:
+    env = dict(os.environ)
+    env.update(
+        VOLCANO_STUB_LATENCY=str(args.stub_latency),
+        VOLCANO_STUB_LATENCY_DIST=args.stub_latency_dist,
+        VOLCANO_STUB_ERROR_RATE=str(args.stub_error_rate),
+        VOLCANO_STUB_THROTTLE_QPS=str(args.stub_throttle_qps),
+        VOLCANO_STUB_TASK_SECONDS=str(args.stub_task_seconds),
+    )
+    return env
+
+
+def stub_stats() -> dict:
+    with urllib.request.urlopen(f"http://127.0.0.1:{STUB_PORT}/stats") as response:
+        return json.load(response)
+
+
+def upstream_delta(before: dict, after: dict) -> dict:
+    """
+    按Action汇总两次统计之间的上游调用次数、错误数和被限流次数
+    """
+    upstream = {}
+    for key, value in after.items():
+        delta = value - before.get(key, 0)
+        if delta:
+            action, kind = key.rsplit(".", 1)
+            upstream.setdefault(action, {"calls": 0, "errors": 0, "throttled": 0})[kind] = delta
+    return upstream
+
+
+def percentile(latencies: list, q: float) -> float:
+    if not latencies:
+        return 0.0
+    return round(latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000, 2)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run_level(scenario: str, connections: int, duration: float, task_ids: list) -> dict:
+    before = stub_stats()
+    latencies, errors = run_load(scenario, connections, duration, task_ids)
+    upstream = upstream_delta(before, stub_stats())
+    requests = len(latencies) + sum(errors.values())
+    upstream_calls = sum(action["calls"] for action in upstream.values())
+    return {
+        "scenario": scenario,
+        "concurrency": connections,
+        "duration": duration,
+        "requests": requests,
+        "throughput": round(len(latencies) / duration, 1),
+        "latency_ms": {
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "max": percentile(latencies, 1.0),
+        },
+        "errors": {str(status): count for status, count in sorted(errors.items())},
+        "upstream": upstream,
+        "upstream_calls_per_request": round(upstream_calls / requests, 3) if requests else 0,
+    }
+
+
+def print_summary(results: list, baseline: dict = None):
+    previous = {(item["scenario"], item["concurrency"]): item for item in (baseline or {}).get("results", [])}
+    for item in results:
+        latency = item["latency_ms"]
+        line = (f"{item['scenario']:<9} c={item['concurrency']:<4} rps={item['throughput']:8.1f}  "
+                f"p50={latency['p50']:7.1f}  p95={latency['p95']:7.1f}  p99={latency['p99']:7.1f} ms  "
+                f"upstream/req={item['upstream_calls_per_request']:.2f}  errors={item['errors']}")
+        old = previous.get((item["scenario"], item["concurrency"]))
+        if old:
+            ratio = item["throughput"] / old["throughput"] if old["throughput"] else float("inf")
+            line += f"  vs baseline: rps x{ratio:.2f}, p99 {latency['p99'] - old['latency_ms']['p99']:+.1f} ms"
+        print(line, file=sys.stderr)
+
+
+def main():
+    args = parse_args()
+    levels = [int(level) for level in args.concurrency.split(",")]
+    scenarios = [scenario for scenario in args.scenarios.split(",") if scenario]
+    extra_env = dict(item.split("=", 1) for item in args.server_env)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "workers": args.workers,
+            "server_env": args.server_env,
+            "stub": {
+                "latency": args.stub_latency,
+                "latency_dist": args.stub_latency_dist,
+                "error_rate": args.stub_error_rate,
+                "throttle_qps": args.stub_throttle_qps,
+                "task_seconds": args.stub_task_seconds,
+            },
+        },
+        "results": [],
+    }
+
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.volcano_stub:app", "--port", str(STUB_PORT),
+         "--log-level", "warning", "--no-access-log"], cwd=PROJECT_ROOT, env=stub_env(args))
+    try:
+        wait_ready(f"http://127.0.0.1:{STUB_PORT}/")
+        with tempfile.TemporaryDirectory() as tmp:
+            server = subprocess.Popen([sys.executable, os.path.join(PROJECT_ROOT, "main.py")], cwd=tmp,
+                                      env=server_env({"SERVER_WORKERS": args.workers, **extra_env}, tmp),
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                wait_ready(f"http://127.0.0.1:{SERVER_PORT}/")
+                task_ids = create_tasks(STATUS_TASKS)
+                for scenario in scenarios:
+                    for connections in levels:
+                        report["results"].append(run_level(scenario, connections, args.duration, task_ids))
+                        print_summary(report["results"][-1:], baseline)
+            finally:
+                stop(server)
+    finally:
+        stop(stub)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
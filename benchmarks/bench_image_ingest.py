@@ -0,0 +1,107 @@
+"""
+图片读取处理基准
+对比旧版process_images（整读入内存、全分辨率解码、在事件循环线程中缩放）与当前实现，
+在独立子进程中并发处理多对大尺寸JPEG，统计耗时、事件循环最大卡顿和峰值RSS增量
+
+用法:
+    python -m benchmarks.bench_image_ingest
+"""
+import asyncio
+import io
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from PIL import Image
+
+PHOTO_SIZE = (7296, 5472)  # 约40MP手机照片
+CONCURRENT_PAIRS = 4
+
+
+async def legacy_process_images(user_photo, scene_photo):
+    # 旧版实现
+    user_image = Image.open(io.BytesIO(await user_photo.read()))
+    scene_image = Image.open(io.BytesIO(await scene_photo.read()))
+    user_image = user_image.resize((512, 512), Image.Resampling.LANCZOS)
+    scene_image = scene_image.resize((512, 512), Image.Resampling.LANCZOS)
+    if user_image.mode != "RGB":
+        user_image = user_image.convert("RGB")
+    if scene_image.mode != "RGB":
+        scene_image = scene_image.convert("RGB")
+    return user_image, scene_image
+
+
+def make_photo(path: str):
+    gradient = Image.linear_gradient("L").resize(PHOTO_SIZE)
+    noise = Image.effect_noise(PHOTO_SIZE, 10)
+    Image.merge("RGB", (gradient, noise, gradient.transpose(Image.Transpose.ROTATE_180))).save(path, quality=85)
+
+
+def run_variant(name: str, path: str, queue):
+    from fastapi import UploadFile
+    from app.utils.image_utils import process_images
+
+    process = legacy_process_images if name == "legacy" else process_images
+    with open(path, "rb") as f:
+        data = f.read()
+
+    async def main():
+        lag = 0.0
+
+        async def ticker():
+            nonlocal lag
+            while True:
+                start = time.perf_counter()
+                await asyncio.sleep(0.005)
+                lag = max(lag, time.perf_counter() - start - 0.005)
+
+        ticking = asyncio.create_task(ticker())
+        await asyncio.sleep(0.02)
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            process(UploadFile(io.BytesIO(data)), UploadFile(io.BytesIO(data)))
+            for _ in range(CONCURRENT_PAIRS)
+        ))
+        elapsed = time.perf_counter() - start
+        ticking.cancel()
+        return elapsed, lag
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        elapsed, lag = asyncio.run(main())
+    except Exception as e:
+        queue.put(e)
+        return
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    queue.put((elapsed, lag, peak))
+
+
+def main():
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "photo.jpg")
+        # 在子进程中生成测试图片：Linux的ru_maxrss会从父进程继承，父进程需保持较小的内存占用
+        maker = ctx.Process(target=make_photo, args=(path,))
+        maker.start()
+        maker.join()
+        print(f"input: {PHOTO_SIZE[0]}x{PHOTO_SIZE[1]} JPEG, {os.path.getsize(path) / 1e6:.1f} MB, "
+              f"{CONCURRENT_PAIRS} concurrent pairs")
+        for name in ("legacy", "streaming"):
+            queue = ctx.Queue()
+            worker = ctx.Process(target=run_variant, args=(name, path, queue))
+            worker.start()
+            result = queue.get()
+            worker.join()
+            if isinstance(result, Exception):
+                print(f"{name:<10} failed: {result}")
+                continue
+            elapsed, lag, peak = result
+            # Linux上ru_maxrss单位为KB
+            print(f"{name:<10} total={elapsed * 1000:8.1f} ms  max_loop_lag={lag * 1000:8.1f} ms  "
+                  f"peak_rss_delta={peak / 1024:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+启动导入耗时检查
+以 python -X importtime 在新进程中多次导入main，取中位数，输出总耗时、本项目模块的导入耗时和最慢的第三方模块；
+满足以下任一条件时以非零状态退出，可作为CI中的启动耗时预算检查：
+  导入main的总耗时超过预算（毫秒，默认600，可通过参数或IMPORT_BUDGET_MS设置）
+  启动时导入了应按需导入的模块（PIL、NumPy、yaml等，见DEFERRED_MODULES）
+
+用法:
+    python -m benchmarks.bench_import [预算毫秒] [运行次数]
+"""
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 启动路径上不应导入的模块：只有图片处理、YAML地点目录等用到时才导入
+DEFERRED_MODULES = ("PIL", "numpy", "yaml", "requests")
+
+
+def import_profile() -> dict:
+    """
+    在新进程中导入main，返回 {模块名: (自身耗时, 累计耗时)}（微秒）
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            cwd=PROJECT_ROOT, capture_output=True, text=True, check=True)
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        profile[name.strip()] = (int(self_us), int(cumulative_us))
+    return profile
+
+
+def main():
+    budget_ms = float(sys.argv[1]) if len(sys.argv) > 1 else float(os.getenv("IMPORT_BUDGET_MS", "600"))
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    profiles = [import_profile() for _ in range(runs)]
+    totals = [profile["main"][1] / 1000 for profile in profiles]
+    median_ms = statistics.median(totals)
+
+    # 各模块取多次运行的中位数
+    self_times, cumulative_times = defaultdict(list), defaultdict(list)
+    for profile in profiles:
+        for name, (self_us, cumulative_us) in profile.items():
+            self_times[name].append(self_us / 1000)
+            cumulative_times[name].append(cumulative_us / 1000)
+    project = sorted((name for name in self_times if name == "main" or name.startswith("app.")),
+                     key=lambda name: -statistics.median(self_times[name]))
+    third_party = sorted((name for name in self_times if name not in project and "." not in name),
+                         key=lambda name: -statistics.median(cumulative_times[name]))
+
+    print(f"import main: median={median_ms:.1f} ms  runs={[round(total, 1) for total in totals]}  "
+          f"budget={budget_ms:g} ms")
+    print(f"project modules (self): {sum(statistics.median(self_times[name]) for name in project):.1f} ms")
+    for name in project[:8]:
+        print(f"  {name:<36} self={statistics.median(self_times[name]):6.1f} ms  "
+              f"cumulative={statistics.median(cumulative_times[name]):6.1f} ms")
+    print("slowest top-level packages (cumulative):")
+    for name in third_party[:8]:
+        print(f"  {name:<36} {statistics.median(cumulative_times[name]):6.1f} ms")
+
+    failures = []
+    if median_ms > budget_ms:
+        failures.append(f"import main took {median_ms:.1f} ms, budget is {budget_ms:g} ms")
+    eager = sorted({name.split(".")[0] for profile in profiles for name in profile} & set(DEFERRED_MODULES))
+    if eager:
+        failures.append(f"deferred modules imported at startup: {', '.join(eager)}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
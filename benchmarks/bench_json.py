@@ -0,0 +1,104 @@
+"""
+JSON序列化微基准
+按一次任务提交加一次状态查询统计每个请求的编解码耗时：
+  上游请求体序列化为bytes（提交、查询各一次）、上游响应解析（提交、查询各一次）、API响应信封渲染（提交、查询各一次）
+对比原先的实现（json.dumps后encode、httpx.Response.json()、Starlette默认JSONResponse）
+与app.utils.json_codec（安装了orjson时为orjson，另外单独测量标准库回退实现）
+
+用法:
+    python -m benchmarks.bench_json [每项重复次数]
+"""
+import json
+import sys
+import timeit
+
+import httpx
+from starlette.responses import JSONResponse
+
+from app.utils import json_codec
+from app.utils.prompt_builder import build_travel_photo_prompt
+
+PROMPT = build_travel_photo_prompt("东京樱花", "natural", "high")
+TASK_ID = "7392616336519610409"
+IMAGE_URL = (f"https://p9-aiop-sign.byteimg.com/tos-cn-i-vuqhorh59i/{TASK_ID}~tplv.jpeg"
+             f"?rk3s=7f9e702d&x-expires=1710842446&x-signature=kT2k8qxzpP9nCmXE3Xz1Qw%3D")
+
+SUBMIT_BODY = {
+    "req_key": "jimeng_t2i_v40",
+    "prompt": PROMPT,
+    "image_urls": ["http://example.com/user/1.jpg", "http://example.com/scene/1.jpg"],
+    "req_json": {"return_url": True},
+    "response_format": "url",
+}
+QUERY_BODY = {"req_key": "jimeng_t2i_v40", "task_id": TASK_ID, "req_json": '{"return_url": true}'}
+SUBMIT_RESPONSE = json.dumps({"code": 10000, "data": {"task_id": TASK_ID}, "message": "Success",
+                              "request_id": "20240319175404", "status": 10000, "time_elapsed": "104.8ms"}).encode()
+QUERY_RESPONSE = json.dumps({"code": 10000, "data": {"status": "done", "image_urls": [IMAGE_URL],
+                                                     "binary_data_base64": []}, "message": "Success"}).encode()
+SUBMIT_ENVELOPE = {"success": True, "result": TASK_ID, "message": "任务已提交，请通过task_id查询结果"}
+QUERY_ENVELOPE = {"success": True, "result": {"task_id": TASK_ID, "status": "done",
+                                               "image_url": "/static/results/" + TASK_ID + ".jpg"},
+                  "message": "查询成功"}
+
+
+def stdlib_dumps(obj) -> bytes:
+    # 与json_codec未安装orjson时的回退实现相同
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class StdlibJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return stdlib_dumps(content)
+
+
+def responses():
+    return (httpx.Response(200, content=SUBMIT_RESPONSE, headers={"Content-Type": "application/json"}),
+            httpx.Response(200, content=QUERY_RESPONSE, headers={"Content-Type": "application/json"}))
+
+
+def request_before(submit_response, query_response):
+    json.dumps(SUBMIT_BODY).encode("utf-8")
+    json.dumps(QUERY_BODY).encode("utf-8")
+    submit_response.json()
+    query_response.json()
+    JSONResponse(SUBMIT_ENVELOPE)
+    JSONResponse(QUERY_ENVELOPE)
+
+
+def request_codec(dumps, loads, response_class):
+    def run(submit_response, query_response):
+        dumps(SUBMIT_BODY)
+        dumps(QUERY_BODY)
+        loads(submit_response.content)
+        loads(query_response.content)
+        response_class(SUBMIT_ENVELOPE)
+        response_class(QUERY_ENVELOPE)
+    return run
+
+
+def measure(func, number: int) -> float:
+    def loop():
+        # httpx.Response会缓存解码后的文本，每次使用新的响应对象
+        func(*responses())
+    overhead = timeit.timeit(responses, number=number)
+    return (timeit.timeit(loop, number=number) - overhead) / number
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    cases = [
+        ("before (json + response.json + JSONResponse)", request_before),
+        ("stdlib codec", request_codec(stdlib_dumps, json.loads, StdlibJSONResponse)),
+        (f"json_codec ({'orjson' if json_codec.orjson else 'stdlib'})",
+         request_codec(json_codec.dumps, json_codec.loads, json_codec.FastJSONResponse)),
+    ]
+    print(f"per request: 2 body encodes + 2 response decodes + 2 envelope renders, number={number}")
+    baseline = None
+    for name, func in cases:
+        seconds = measure(func, number)
+        baseline = baseline or seconds
+        print(f"{name:<46} {seconds * 1e6:7.2f} us  ({baseline / seconds:4.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
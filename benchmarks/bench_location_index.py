@@ -0,0 +1,64 @@
+"""
+地点索引扩展性基准
+分别以1k/10k/100k条合成景点目录构建LocationIndex，统计构建耗时和各类匹配的单次查询耗时
+（查询结果缓存被绕过，测量的是索引本身的开销）
+
+用法:
+    python -m benchmarks.bench_location_index
+"""
+import random
+import time
+
+from app.utils.location_index import LocationIndex
+
+# 用常用汉字随机组合出景点名，近似真实目录中名称的二元组分布
+CHARS = ("东西南北中上下天山水湖海江河云月日星花木林石金玉龙凤清明长安平宁华光"
+         "春秋夏冬红白青黄紫翠灵秀古新大小高远双九万千仙佛寿福桃柳松竹梅兰")
+KINDS = ["公园", "博物馆", "古镇", "海滩", "寺", "塔", "广场", "大桥", "湖", "山", "瀑布", "故居"]
+
+
+def make_entries(size: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    entries = []
+    for i in range(size):
+        name = "".join(rng.choices(CHARS, k=rng.randint(2, 4))) + rng.choice(KINDS)
+        entries.append({
+            "name": name,
+            "aliases": [f"Spot {i}"],
+            "atmosphere": f"{name}的氛围",
+            "composition": f"{name}作为背景",
+            "lighting": "自然光线",
+        })
+    return entries
+
+
+def measure(lookup, queries) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        lookup(query)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def main(sizes=(1000, 10000, 100000), samples: int = 1000):
+    rng = random.Random(7)
+    for size in sizes:
+        entries = make_entries(size)
+        start = time.perf_counter()
+        index = LocationIndex(entries)
+        build_time = time.perf_counter() - start
+
+        picked = [rng.choice(entries)["name"] for _ in range(samples)]
+        queries = {
+            "exact": picked,
+            "normalized": [f" {name} " for name in picked],
+            "alias": [f"spot{rng.randrange(size)}" for _ in range(samples)],
+            "prefix": [name + "夜景" for name in picked],
+            "fuzzy": [name[:-1] + "景区" for name in picked],
+        }
+        timings = {kind: measure(index._lookup, batch) for kind, batch in queries.items()}
+        print(f"size={size:<7} build={build_time * 1000:8.1f} ms  " +
+              "  ".join(f"{kind}={per_call * 1e6:8.2f} us" for kind, per_call in timings.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+日志开销微基准
+以一次任务提交加一次状态查询为一个请求，对比调用线程中的日志耗时：
+  print:        原先每个请求的9次print（状态码、完整响应内容、data字段、任务ID、图片URL）
+  queue:        结构化日志经队列交给后台线程写出，分别按LOG_PAYLOAD_SAMPLE_RATE=0和1记录
+输出目标分别为文件和慢速输出（每次写入阻塞100微秒，模拟终端或被限速的日志采集管道）
+
+用法:
+    python -m benchmarks.bench_logging [请求数]
+"""
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from app.core import logging_config
+from app.core.config import settings
+from app.core.logging_config import redact_urls, sample_payload, task_id_var
+
+SLOW_WRITE_SECONDS = 0.0001
+
+volcano_logger = logging.getLogger("app.utils.volcano_api")
+registry_logger = logging.getLogger("app.services.task_registry")
+
+
+class SlowSink(io.TextIOBase):
+    """
+    每次写入都阻塞一段时间的输出
+    """
+
+    def write(self, text: str) -> int:
+        time.sleep(SLOW_WRITE_SECONDS)
+        return len(text)
+
+
+def fake_responses(index: int):
+    task_id = f"7392616336519610409-{index}"
+    submit = json.dumps({"code": 10000, "data": {"task_id": task_id}, "message": "Success",
+                         "request_id": f"2024{index:012d}", "status": 10000, "time_elapsed": "104.8ms"})
+    image_urls = [f"https://p9-aiop-sign.byteimg.com/tos-cn-i-vuqhorh59i/{task_id}~tplv.jpeg"
+                  f"?rk3s=7f9e702d&x-expires=1710842446&x-signature=kT2k8qxzpP9nCmXE3Xz1Qw%3D"]
+    query = json.dumps({"code": 10000, "data": {"status": "done", "image_urls": image_urls,
+                                                "binary_data_base64": []}, "message": "Success"})
+    return task_id, submit, query, image_urls
+
+
+def request_print(index: int):
+    task_id, submit, query, image_urls = fake_responses(index)
+    print("Response Status Code:", 200)
+    print("Response Content:", submit)
+    print("Data section:", json.loads(submit)["data"])
+    print("Task ID:", task_id)
+    print("Query Response Status Code:", 200)
+    print("Query Response Content:", query)
+    print("Query Data section:", json.loads(query)["data"])
+    print("Task status:", "done")
+    print("Image URLs:", image_urls)
+
+
+def request_logging(index: int):
+    task_id, submit, query, image_urls = fake_responses(index)
+    if sample_payload():
+        volcano_logger.info("Volcano submit response", extra={"status_code": 200, "body": redact_urls(submit)})
+    token = task_id_var.set(task_id)
+    try:
+        volcano_logger.info("Volcano task submitted", extra={"region": "cn-north-1"})
+        if sample_payload():
+            volcano_logger.info("Volcano query response", extra={"status_code": 200, "body": redact_urls(query)})
+        volcano_logger.debug("Volcano task status", extra={"status": "done"})
+        registry_logger.info("Task finished", extra={"status": "done", "image_count": len(image_urls)})
+    finally:
+        task_id_var.reset(token)
+
+
+def measure(func, count: int):
+    durations = []
+    for index in range(count):
+        started = time.perf_counter()
+        func(index)
+        durations.append(time.perf_counter() - started)
+    durations.sort()
+    return sum(durations) / count, durations[int(count * 0.99)]
+
+
+def run_print(sink, count: int):
+    stdout = sys.stdout
+    sys.stdout = sink
+    try:
+        return measure(request_print, count)
+    finally:
+        sys.stdout = stdout
+
+
+def run_queue(sink, count: int, sample_rate: float):
+    stdout = sys.stdout
+    settings.LOG_PAYLOAD_SAMPLE_RATE = sample_rate
+    # setup_logging在调用时绑定sys.stdout作为后台线程的输出
+    sys.stdout = sink
+    try:
+        logging_config.setup_logging()
+    finally:
+        sys.stdout = stdout
+    try:
+        return measure(request_logging, count)
+    finally:
+        # 计时只统计调用线程，这里等待后台线程写完再进行下一项
+        logging_config.stop_logging()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    settings.LOG_LEVEL = "INFO"
+    settings.LOG_QUEUE_SIZE = max(settings.LOG_QUEUE_SIZE, count * 4)
+    with tempfile.TemporaryDirectory() as tmp:
+        sinks = {
+            "file": lambda: open(os.path.join(tmp, "out.log"), "w", encoding="utf-8"),
+            "slow": SlowSink,
+        }
+        results = []
+        for sink_name, make_sink in sinks.items():
+            cases = [("print", lambda sink: run_print(sink, count)),
+                     ("queue sample=0", lambda sink: run_queue(sink, count, 0)),
+                     ("queue sample=1", lambda sink: run_queue(sink, count, 1))]
+            for case_name, run in cases:
+                sink = make_sink()
+                try:
+                    results.append((sink_name, case_name) + run(sink))
+                finally:
+                    sink.close()
+    print(f"requests={count} (1 submit + 1 status query each)")
+    for sink_name, case_name, mean, p99 in results:
+        print(f"{sink_name:<5} {case_name:<15} mean={mean * 1e6:8.1f} us  p99={p99 * 1e6:8.1f} us")
+    print(f"dropped={logging_config.dropped_logs()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+相似输入结果缓存微基准
+  hash:   下载后的一张1024x768 JPEG解码并计算dHash/aHash的耗时
+  lookup: 缓存中有N个条目（全部属于同一组生成参数，最坏情况）时单次查询的耗时，
+          对比多索引哈希表与逐条比较汉明距离的线性扫描；一半查询是已有条目翻转若干位后的近似重复，一半是随机哈希
+
+用法:
+    python -m benchmarks.bench_phash_cache [最大条目数]
+"""
+import io
+import random
+import sys
+import time
+import timeit
+
+from PIL import Image
+
+from app.services.result_cache import Fingerprint, ResultCache
+from app.utils.perceptual_hash import hamming_distance, image_hash
+
+PARAMS = ("东京樱花", "natural", "high")
+MAX_DISTANCE = 3
+QUERIES = 2000
+
+
+def sample_jpeg() -> bytes:
+    buffered = io.BytesIO()
+    Image.effect_noise((1024, 768), 40).convert("RGB").save(buffered, "JPEG", quality=90)
+    return buffered.getvalue()
+
+
+def flip_bits(value: int, count: int) -> int:
+    for bit in random.sample(range(64), count):
+        value ^= 1 << bit
+    return value
+
+
+def linear_lookup(entries: list, fingerprint: Fingerprint):
+    best, best_distance = None, None
+    for index, (user_hash, scene_hash) in enumerate(entries):
+        user_distance = hamming_distance(user_hash, fingerprint.user_hash)
+        scene_distance = hamming_distance(scene_hash, fingerprint.scene_hash)
+        if user_distance <= MAX_DISTANCE and scene_distance <= MAX_DISTANCE:
+            if best_distance is None or user_distance + scene_distance < best_distance:
+                best, best_distance = index, user_distance + scene_distance
+    return best
+
+
+def bench_hash():
+    data = sample_jpeg()
+    for algorithm in ("dhash", "ahash"):
+        image_hash(data, algorithm)
+        seconds = timeit.timeit(lambda: image_hash(data, algorithm), number=200) / 200
+        print(f"hash   {algorithm}  {len(data) // 1024} KB JPEG  {seconds * 1000:6.2f} ms")
+
+
+def bench_lookup(max_entries: int):
+    random.seed(1)
+    cache = ResultCache(max_entries, ttl=3600, max_distance=MAX_DISTANCE)
+    entries = []
+    sizes = [size for size in (10_000, 100_000, 1_000_000) if size <= max_entries]
+    for size in sizes:
+        while len(entries) < size:
+            user_hash, scene_hash = random.getrandbits(64), random.getrandbits(64)
+            cache.add(Fingerprint(user_hash, scene_hash, PARAMS), f"task-{len(entries)}")
+            entries.append((user_hash, scene_hash))
+
+        queries = []
+        for index in range(QUERIES):
+            if index % 2 == 0:
+                user_hash, scene_hash = random.choice(entries)
+                queries.append(Fingerprint(flip_bits(user_hash, random.randint(0, MAX_DISTANCE)),
+                                           flip_bits(scene_hash, random.randint(0, MAX_DISTANCE)), PARAMS))
+            else:
+                queries.append(Fingerprint(random.getrandbits(64), random.getrandbits(64), PARAMS))
+
+        started = time.perf_counter()
+        hits = sum(cache.lookup(query) is not None for query in queries)
+        indexed = (time.perf_counter() - started) / len(queries)
+
+        linear_queries = queries[:max(20, QUERIES * 10_000 // size)]
+        started = time.perf_counter()
+        for query in linear_queries:
+            linear_lookup(entries, query)
+        linear = (time.perf_counter() - started) / len(linear_queries)
+        print(f"lookup entries={size:>9,}  multi-index={indexed * 1e6:8.1f} us  linear={linear * 1e6:10.1f} us  "
+              f"hits={hits}/{len(queries)}")
+
+
+def main():
+    max_entries = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    bench_hash()
+    bench_lookup(max_entries)
+
+
+if __name__ == "__main__":
+    main()
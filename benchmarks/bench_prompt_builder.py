@@ -0,0 +1,39 @@
+"""
+Prompt构造微基准
+对比LRU缓存命中、未命中（直接调用被缓存的原函数）两种情况下的单次构造耗时
+
+用法:
+    python -m benchmarks.bench_prompt_builder
+"""
+import itertools
+import timeit
+
+from app.utils import prompt_builder
+
+LOCATIONS = list(prompt_builder.LOCATION_ENHANCEMENTS) + ["北京故宫", "西湖"]
+COMBINATIONS = list(itertools.product(LOCATIONS, prompt_builder.STYLE_DESCRIPTIONS,
+                                      prompt_builder.QUALITY_DESCRIPTIONS))
+
+
+def run(build, number: int) -> float:
+    def loop():
+        for location, style, quality in COMBINATIONS:
+            build(location, style, quality)
+    return timeit.timeit(loop, number=number) / (number * len(COMBINATIONS))
+
+
+def main(number: int = 2000):
+    prompt_builder.warm(LOCATIONS)
+    results = {
+        "travel_uncached": run(prompt_builder.build_travel_photo_prompt.__wrapped__, number),
+        "travel_cached": run(prompt_builder.build_travel_photo_prompt, number),
+        "advanced_uncached": run(
+            lambda *args: prompt_builder._build_advanced_prompt.__wrapped__(*args, "auto", "auto", 0), number),
+        "advanced_cached": run(prompt_builder.build_advanced_prompt, number),
+    }
+    for name, per_call in results.items():
+        print(f"{name:<20}{per_call * 1e6:8.3f} us/op")
+
+
+if __name__ == "__main__":
+    main()
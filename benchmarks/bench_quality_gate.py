@@ -0,0 +1,73 @@
+"""
+输入质量检查微基准
+对不同尺寸和格式的用户照片测量质量检查（measure_quality + 阈值判断）的耗时，
+并与在全分辨率灰度图上计算同样指标、以及现有的解码缩放到512x512（load_image）对比；
+质量检查在下载完成后执行，相对上游提交（通常数百毫秒）和下载照片的耗时应可以忽略
+
+用法:
+    python -m benchmarks.bench_quality_gate [每种图片的重复次数]
+"""
+import io
+import random
+import sys
+import timeit
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from app.services.quality_gate import QUALITY_TIERS, evaluate, load_thresholds
+from app.utils.image_utils import TARGET_SIZE, load_image, measure_quality
+
+SAMPLES = (
+    ("jpeg 4000x3000", (4000, 3000), "JPEG"),
+    ("jpeg 1600x1200", (1600, 1200), "JPEG"),
+    ("png  1600x1200", (1600, 1200), "PNG"),
+)
+
+
+def sample_image(size, image_format: str) -> bytes:
+    random.seed(1)
+    image = Image.new("RGB", size, (120, 140, 160))
+    draw = ImageDraw.Draw(image)
+    for _ in range(300):
+        x, y = random.randrange(size[0]), random.randrange(size[1])
+        draw.ellipse([x, y, x + random.randrange(20, 400), y + random.randrange(20, 400)],
+                     fill=tuple(random.randrange(256) for _ in range(3)))
+    buffered = io.BytesIO()
+    image.save(buffered, image_format, quality=90)
+    return buffered.getvalue()
+
+
+def full_resolution_quality(data: bytes):
+    """
+    对照：不降采样，在原图灰度全分辨率上计算拉普拉斯方差和亮度直方图
+    """
+    gray = np.asarray(Image.open(io.BytesIO(data)).convert("L"))
+    pixels = gray.astype(np.float32)
+    laplacian = pixels[:-2, 1:-1] + pixels[2:, 1:-1] + pixels[1:-1, :-2] + pixels[1:-1, 2:] - 4 * pixels[1:-1, 1:-1]
+    return float(laplacian.var()), np.bincount(gray.ravel(), minlength=256)
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    thresholds = load_thresholds()
+    for name, size, image_format in SAMPLES:
+        data = sample_image(size, image_format)
+        measure_quality(data)
+
+        def gate():
+            measured = measure_quality(data)
+            return [evaluate(measured, thresholds[tier]) for tier in QUALITY_TIERS]
+
+        slow_number = max(1, number // 4)
+        results = {
+            "gate": timeit.timeit(gate, number=number) / number,
+            "full-res": timeit.timeit(lambda: full_resolution_quality(data), number=slow_number) / slow_number,
+            "load_image": timeit.timeit(lambda: load_image(data, TARGET_SIZE), number=number) / number,
+        }
+        print(f"{name}  {len(data) // 1024:>6} KB  " +
+              "  ".join(f"{key}={seconds * 1000:7.2f} ms" for key, seconds in results.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+场景库微基准
+生成N张1920x1280的场景JPEG并构建场景库，对比每加载一张场景（得到512x512 RGB像素）的耗时：
+  decode: 读取JPEG文件后解码并缩放（原先每个请求都要做的工作，不含下载）
+  mmap:   从内存映射的场景库读取像素并复制一份（首次访问为缺页，刚构建的文件通常已在页缓存中，只是内存复制）
+以及由像素计算场景dHash与解码JPEG后计算dHash的耗时
+
+用法:
+    python -m benchmarks.bench_scene_library [场景数]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from app.services.scene_library import SceneLibrary, build_library
+from app.utils.image_utils import TARGET_SIZE, load_image
+from app.utils.perceptual_hash import difference_hash, image_hash
+
+
+def write_scenes(directory: str, count: int) -> str:
+    catalog = []
+    for index in range(count):
+        path = os.path.join(directory, f"scene-{index}.jpg")
+        Image.effect_noise((1920, 1280), 30 + index % 40).convert("RGB").save(path, "JPEG", quality=90)
+        catalog.append({"scene_id": f"scene-{index}", "location": f"地点{index % 50}",
+                        "url": f"https://cdn.example.com/scene-{index}.jpg", "path": f"scene-{index}.jpg"})
+    catalog_path = os.path.join(directory, "catalog.json")
+    with open(catalog_path, "w", encoding="utf-8") as f:
+        json.dump(catalog, f, ensure_ascii=False)
+    return catalog_path
+
+
+def per_scene(func, items) -> float:
+    started = time.perf_counter()
+    for item in items:
+        func(item)
+    return (time.perf_counter() - started) / len(items)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    with tempfile.TemporaryDirectory() as tmp:
+        catalog_path = write_scenes(tmp, count)
+        index_path = os.path.join(tmp, "library", "scenes.json")
+        started = time.perf_counter()
+        build_library(catalog_path, index_path, os.cpu_count() or 1)
+        print(f"build  {count} scenes  {time.perf_counter() - started:6.2f} s  "
+              f"({count * 512 * 512 * 3 / 1024 / 1024:.0f} MB array)")
+
+        library = SceneLibrary(index_path)
+        library.open()
+        scene_ids = [f"scene-{index}" for index in range(count)]
+        files = {}
+        for scene_id in scene_ids:
+            with open(os.path.join(tmp, f"{scene_id}.jpg"), "rb") as f:
+                files[scene_id] = f.read()
+
+        decode = per_scene(lambda scene_id: np.asarray(load_image(files[scene_id], TARGET_SIZE)), scene_ids)
+        mmap_first = per_scene(lambda scene_id: np.array(library.pixels(scene_id)), scene_ids)
+        mmap = per_scene(lambda scene_id: np.array(library.pixels(scene_id)), scene_ids)
+        print(f"load   decode={decode * 1000:7.2f} ms  mmap first={mmap_first * 1000:6.3f} ms  "
+              f"mmap={mmap * 1000:6.3f} ms  ({decode / mmap:.0f}x)")
+
+        decode_hash = per_scene(lambda scene_id: image_hash(files[scene_id]), scene_ids)
+        mmap_hash = per_scene(lambda scene_id: difference_hash(library.image(scene_id)), scene_ids)
+        print(f"dhash  decode={decode_hash * 1000:7.2f} ms  mmap={mmap_hash * 1000:6.3f} ms")
+        library.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+服务器压测
+启动火山引擎模拟服务（benchmarks.volcano_stub），按不同的服务器配置（worker数、事件循环、HTTP解析器）
+分别以python main.py启动服务，用keep-alive长连接并发压测两个场景：
+  generate: POST /api/generate-travel-photo，每个请求的图片URL不同（不命中提交去重缓存）
+  status:   GET /api/task-status/{task_id}，查询已完成的任务
+输出各配置每个场景的每秒请求数和p50/p99延迟
+
+用法:
+    python -m benchmarks.bench_server [持续秒数] [并发连接数]
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUB_PORT = 18080
+SERVER_PORT = 18000
+LOAD_PROCESSES = 2
+STATUS_TASKS = 50
+
+CONFIGS = [
+    {"SERVER_WORKERS": "1", "SERVER_LOOP": "asyncio", "SERVER_HTTP": "h11"},
+    {"SERVER_WORKERS": "1", "SERVER_LOOP": "uvloop", "SERVER_HTTP": "httptools"},
+]
+if (os.cpu_count() or 1) > 1:
+    CONFIGS.append({"SERVER_WORKERS": str(os.cpu_count()), "SERVER_LOOP": "uvloop", "SERVER_HTTP": "httptools"})
+
+
+def server_env(config: dict, tmp: str) -> dict:
+    env = dict(os.environ)
+    env.update(
+        VOLCANO_ENDPOINT=f"http://127.0.0.1:{STUB_PORT}",
+        VOLCANO_ACCESS_KEY="AKLTbenchmark",
+        VOLCANO_SECRET_KEY="benchmark",
+        VOLCANO_CREDENTIALS="",
+        # 压测的是本服务本身，关闭上游限速和结果镜像
+        VOLCANO_SUBMIT_QPS="0",
+        VOLCANO_QUERY_QPS="0",
+        VOLCANO_MAX_CONCURRENCY="0",
+        RESULT_MIRROR_ENABLED="False",
+        TASK_STORE_BACKEND="sqlite",
+        TASK_STORE_PATH=os.path.join(tmp, "tasks.db"),
+        SUBMISSION_CACHE_PATH=os.path.join(tmp, "submission_cache.db"),
+        SUBMISSION_QUEUE_PATH=os.path.join(tmp, "submission_queue.db"),
+        STATIC_FOLDER=os.path.join(tmp, "static"),
+        UPLOAD_FOLDER=os.path.join(tmp, "static", "uploads"),
+        RESULT_FOLDER=os.path.join(tmp, "static", "results"),
+        SERVER_HOST="127.0.0.1",
+        SERVER_PORT=str(SERVER_PORT),
+        DEBUG="False",
+    )
+    env.update(config)
+    return env
+
+
+def wait_ready(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return
+        except urllib.error.HTTPError:
+            # 已能响应请求（模拟服务对GET返回405）
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def stop(process: subprocess.Popen):
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+async def request(reader, writer, raw: bytes) -> int:
+    writer.write(raw)
+    await writer.drain()
+    header = await reader.readuntil(b"\r\n\r\n")
+    status = int(header.split(b" ", 2)[1])
+    length = 0
+    for line in header.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    await reader.readexactly(length)
+    return status
+
+
+def build_request(scenario: str, index: int, task_ids: list) -> bytes:
+    if scenario == "status":
+        target = f"/api/task-status/{task_ids[index % len(task_ids)]}"
+        return f"GET {target} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n".encode()
+    body = json.dumps({
+        "user_image_url": f"http://example.com/user/{os.getpid()}-{index}.jpg",
+        "scene_image_url": "http://example.com/scene/1.jpg",
+        "location": "东京樱花",
+    }).encode()
+    return (f"POST /api/generate-travel-photo HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n").encode() + body
+
+
+async def load(scenario: str, connections: int, duration: float, task_ids: list):
+    latencies, errors = [], Counter()
+    counter = iter(range(10 ** 9))
+    deadline = time.monotonic() + duration
+
+    async def connection():
+        reader, writer = await asyncio.open_connection("127.0.0.1", SERVER_PORT)
+        try:
+            while time.monotonic() < deadline:
+                raw = build_request(scenario, next(counter), task_ids)
+                started = time.perf_counter()
+                status = await request(reader, writer, raw)
+                if status == 200:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors[status] += 1
+        finally:
+            writer.close()
+
+    await asyncio.gather(*(connection() for _ in range(connections)))
+    return latencies, errors
+
+
+def load_process(scenario: str, connections: int, duration: float, task_ids: list, queue):
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+    queue.put(asyncio.run(load(scenario, connections, duration, task_ids)))
+
+
+def run_load(scenario: str, connections: int, duration: float, task_ids: list):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    # 连接数按进程均分，总数与指定的并发数一致
+    count = min(LOAD_PROCESSES, connections)
+    processes = [ctx.Process(target=load_process,
+                             args=(scenario, connections // count + (index < connections % count), duration,
+                                   task_ids, queue))
+                 for index in range(count)]
+    for process in processes:
+        process.start()
+    results = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+    latencies = sorted(latency for result in results for latency in result[0])
+    errors = sum((result[1] for result in results), Counter())
+    return latencies, errors
+
+
+def create_tasks(count: int) -> list:
+    # 模拟服务配置了错误率或限流时部分提交会失败，跳过失败的请求
+    task_ids = []
+    for index in range(count * 5):
+        if len(task_ids) >= count:
+            break
+        body = json.dumps({
+            "user_image_url": f"http://example.com/seed/{index}.jpg",
+            "scene_image_url": "http://example.com/scene/1.jpg",
+            "location": "东京樱花",
+        }).encode()
+        req = urllib.request.Request(f"http://127.0.0.1:{SERVER_PORT}/api/generate-travel-photo", body,
+                                     {"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req) as response:
+                task_ids.append(json.load(response)["result"])
+        except urllib.error.HTTPError:
+            continue
+    if not task_ids:
+        raise RuntimeError("无法创建用于查询的任务")
+    return task_ids
+
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    connections = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.volcano_stub:app", "--port", str(STUB_PORT),
+         "--log-level", "warning", "--no-access-log"], cwd=PROJECT_ROOT)
+    print(f"duration={duration}s connections={connections} cpus={os.cpu_count()}")
+    try:
+        wait_ready(f"http://127.0.0.1:{STUB_PORT}/")
+        for config in CONFIGS:
+            with tempfile.TemporaryDirectory() as tmp:
+                server = subprocess.Popen([sys.executable, os.path.join(PROJECT_ROOT, "main.py")],
+                                          cwd=tmp, env=server_env(config, tmp),
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                try:
+                    wait_ready(f"http://127.0.0.1:{SERVER_PORT}/")
+                    task_ids = create_tasks(STATUS_TASKS)
+                    label = f"workers={config['SERVER_WORKERS']} {config['SERVER_LOOP']}/{config['SERVER_HTTP']}"
+                    for scenario in ("generate", "status"):
+                        latencies, errors = run_load(scenario, connections, duration, task_ids)
+                        count = len(latencies)
+                        p50 = latencies[count // 2] * 1000 if count else 0
+                        p99 = latencies[min(count - 1, int(count * 0.99))] * 1000 if count else 0
+                        print(f"{label:<32} {scenario:<9} rps={count / duration:8.1f}  "
+                              f"p50={p50:7.1f} ms  p99={p99:7.1f} ms  errors={dict(errors)}")
+                finally:
+                    stop(server)
+    finally:
+        stop(stub)
+
+
+if __name__ == "__main__":
+    main()
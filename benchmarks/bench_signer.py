@@ -0,0 +1,64 @@
+"""
+V4签名微基准
+对比旧版逐次重建HMAC链的签名实现与VolcanoSigner的单次签名耗时
+
+用法:
+    python -m benchmarks.bench_signer
+"""
+import datetime
+import hashlib
+import hmac
+import json
+import timeit
+
+from app.utils.volcano_signer import VolcanoSigner, formatQuery, host
+
+ACCESS_KEY = 'AKLTbenchmarkaccesskey'
+SECRET_KEY = 'benchmarksecretkey=='
+REGION = 'cn-north-1'
+QUERY = formatQuery({'Action': 'CVSync2AsyncGetResult', 'Version': '2022-08-31'})
+BODY = json.dumps({
+    "req_key": "jimeng_t2i_v40",
+    "task_id": "7392616336519610409",
+    "req_json": json.dumps({"return_url": True})
+})
+
+
+def legacy_sign(access_key, secret_key, req_query, req_body):
+    # 旧版signV4Request中的签名部分（不含HTTP请求）
+    def _sign(key, msg):
+        return hmac.new(key, msg.encode('utf-8'), hashlib.sha256).digest()
+
+    t = datetime.datetime.utcnow()
+    current_date = t.strftime('%Y%m%dT%H%M%SZ')
+    datestamp = t.strftime('%Y%m%d')
+    signed_headers = 'content-type;host;x-content-sha256;x-date'
+    payload_hash = hashlib.sha256(req_body.encode('utf-8')).hexdigest()
+    canonical_headers = 'content-type:application/json\n' + 'host:' + host + \
+        '\n' + 'x-content-sha256:' + payload_hash + '\n' + 'x-date:' + current_date + '\n'
+    canonical_request = 'POST\n/\n' + req_query + '\n' + canonical_headers + '\n' + \
+        signed_headers + '\n' + payload_hash
+    credential_scope = datestamp + '/' + REGION + '/cv/request'
+    string_to_sign = 'HMAC-SHA256\n' + current_date + '\n' + credential_scope + '\n' + \
+        hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()
+    k = _sign(_sign(_sign(_sign(secret_key.encode('utf-8'), datestamp), REGION), 'cv'), 'request')
+    signature = hmac.new(k, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+    return 'HMAC-SHA256 Credential=' + access_key + '/' + credential_scope + \
+        ', SignedHeaders=' + signed_headers + ', Signature=' + signature
+
+
+def main(number: int = 50000):
+    signer = VolcanoSigner(ACCESS_KEY, SECRET_KEY, REGION)
+    body_bytes = BODY.encode('utf-8')
+
+    results = {
+        "legacy": timeit.timeit(lambda: legacy_sign(ACCESS_KEY, SECRET_KEY, QUERY, BODY), number=number),
+        "signer_str": timeit.timeit(lambda: signer.sign(QUERY, BODY), number=number),
+        "signer_bytes": timeit.timeit(lambda: signer.sign(QUERY, body_bytes), number=number),
+    }
+    for name, total in results.items():
+        print(f"{name:<14}{total / number * 1e6:8.2f} us/op")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+多进程任务轮询基准
+模拟多个worker进程同时跟踪同一批生成任务，对比：
+  per-process: 每个进程各自在内存中登记全部任务（没有共享状态时的情形），各自轮询
+  sqlite:      所有进程共享SqliteTaskStore，到期任务由各进程原子认领
+统计上游查询总数、各进程分担的查询数和全部任务完成的耗时
+
+用法:
+    python -m benchmarks.bench_task_store
+"""
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+from collections import Counter
+
+TASKS = 1000
+TASK_DURATION = 3.0      # 任务提交后多久完成（秒）
+QUERY_LATENCY = 0.02     # 模拟的上游查询耗时（秒）
+WORKER_COUNTS = (1, 2, 4)
+
+os.environ.setdefault("TASK_POLL_MIN_INTERVAL", "0.25")
+os.environ.setdefault("TASK_POLL_MAX_INTERVAL", "0.5")
+os.environ.setdefault("TASK_POLL_CONCURRENCY", "200")
+os.environ.setdefault("TASK_POLL_BATCH_SIZE", "200")
+os.environ.setdefault("TASK_STORE_SYNC_INTERVAL", "0.1")
+
+
+def task_ids(started_at: float):
+    return [f"task-{index}-{started_at}" for index in range(TASKS)]
+
+
+def run_worker(mode: str, path: str, started_at: float, queue):
+    from app.services.task_registry import TaskRegistry
+    from app.services.task_store import MemoryTaskStore, SqliteTaskStore
+
+    calls = Counter()
+
+    async def query(task_id: str):
+        calls[task_id] += 1
+        await asyncio.sleep(QUERY_LATENCY)
+        if time.time() >= float(task_id.rsplit("-", 1)[1]) + TASK_DURATION:
+            return f"http://example.com/{task_id}.jpg"
+        return {"task_id": task_id, "status": "generating"}
+
+    async def main():
+        store = SqliteTaskStore(path) if mode == "sqlite" else MemoryTaskStore()
+        registry = TaskRegistry(query, store)
+        if mode == "per-process":
+            for task_id in task_ids(started_at):
+                await registry.register(task_id)
+        await registry.start()
+        while await store.next_due() is not None:
+            await asyncio.sleep(0.05)
+        await registry.stop()
+        store.close()
+
+    try:
+        asyncio.run(main())
+    except Exception as e:
+        queue.put(e)
+        return
+    queue.put((sum(calls.values()), len(calls), time.time() - started_at))
+
+
+def run(mode: str, workers: int):
+    from app.services.task_store import SqliteTaskStore, TaskRecord
+
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tasks.db")
+        started_at = time.time()
+        if mode == "sqlite":
+            # 由提交请求所在的进程登记任务，这里预先批量写入
+            store = SqliteTaskStore(path)
+            asyncio.run(store.add(TaskRecord(task_id, "in_queue", next_poll_at=started_at, updated_at=started_at)
+                                  for task_id in task_ids(started_at)))
+            store.close()
+        queue = ctx.Queue()
+        processes = [ctx.Process(target=run_worker, args=(mode, path, started_at, queue)) for _ in range(workers)]
+        for process in processes:
+            process.start()
+        results = [queue.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors:
+        print(f"{mode:<12} workers={workers}  failed: {errors[0]}")
+        return
+    total = sum(result[0] for result in results)
+    split = "/".join(str(result[0]) for result in results)
+    elapsed = max(result[2] for result in results)
+    print(f"{mode:<12} workers={workers}  upstream_queries={total:6d}  per_worker={split:<24} "
+          f"queries_per_task={total / TASKS:5.2f}  finished_in={elapsed:5.2f}s")
+
+
+def main():
+    print(f"{TASKS} tasks, each done after {TASK_DURATION}s, query latency {QUERY_LATENCY * 1000:.0f} ms")
+    for mode in ("per-process", "sqlite"):
+        for workers in WORKER_COUNTS:
+            run(mode, workers)
+
+
+if __name__ == "__main__":
+    main()
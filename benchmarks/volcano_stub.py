@@ -0,0 +1,132 @@
+"""
+火山引擎模拟服务
+实现CVSync2AsyncSubmitTask和CVSync2AsyncGetResult两个Action，不校验签名；
+把VOLCANO_ENDPOINT指向它即可在没有真实密钥、不消耗配额的情况下压测服务。
+通过环境变量配置：
+  VOLCANO_STUB_LATENCY:       平均延迟（秒），默认0.05
+  VOLCANO_STUB_LATENCY_DIST:  延迟分布：constant、uniform（0~2倍平均值）、exponential、lognormal，默认constant
+  VOLCANO_STUB_LATENCY_SIGMA: lognormal分布的sigma，默认0.5
+  VOLCANO_STUB_ERROR_RATE:    返回500的请求比例（0~1），默认0
+  VOLCANO_STUB_THROTTLE_QPS:  每个Action每秒允许的请求数，超出时返回429，默认0（不限流）
+  VOLCANO_STUB_TASK_SECONDS:  任务提交后到完成的时间（秒），此前查询返回generating，默认0
+GET /stats 返回各Action的调用次数、错误数和被限流次数
+
+用法:
+    python -m uvicorn benchmarks.volcano_stub:app --port 18080
+"""
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import time
+from collections import Counter
+
+from starlette.applications import Starlette
+from starlette.requests import ClientDisconnect, Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+SUBMIT_ACTION = "CVSync2AsyncSubmitTask"
+QUERY_RESULT_ACTION = "CVSync2AsyncGetResult"
+
+LATENCY = float(os.getenv("VOLCANO_STUB_LATENCY", "0.05"))
+LATENCY_DIST = os.getenv("VOLCANO_STUB_LATENCY_DIST", "constant")
+LATENCY_SIGMA = float(os.getenv("VOLCANO_STUB_LATENCY_SIGMA", "0.5"))
+ERROR_RATE = float(os.getenv("VOLCANO_STUB_ERROR_RATE", "0"))
+THROTTLE_QPS = float(os.getenv("VOLCANO_STUB_THROTTLE_QPS", "0"))
+TASK_SECONDS = float(os.getenv("VOLCANO_STUB_TASK_SECONDS", "0"))
+IMAGE_BASE_URL = os.getenv("VOLCANO_STUB_IMAGE_BASE_URL", "http://127.0.0.1:18080/images")
+
+_task_ids = itertools.count(1)
+stats = Counter()
+
+
+class TokenBucket:
+    """
+    每秒补充rate个令牌、容量为rate的令牌桶
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+_buckets = {action: TokenBucket(THROTTLE_QPS) for action in (SUBMIT_ACTION, QUERY_RESULT_ACTION)}
+
+
+def sample_latency() -> float:
+    """
+    按配置的分布生成一次延迟（平均值为LATENCY）
+    """
+    if LATENCY <= 0:
+        return 0.0
+    if LATENCY_DIST == "uniform":
+        return random.uniform(0, 2 * LATENCY)
+    if LATENCY_DIST == "exponential":
+        return random.expovariate(1 / LATENCY)
+    if LATENCY_DIST == "lognormal":
+        # 调整mu使分布的平均值等于LATENCY
+        return random.lognormvariate(math.log(LATENCY) - LATENCY_SIGMA ** 2 / 2, LATENCY_SIGMA)
+    return LATENCY
+
+
+def _json(payload: dict, status_code: int = 200, headers: dict = None) -> Response:
+    return Response(json.dumps(payload), status_code=status_code, headers=headers, media_type="application/json")
+
+
+def task_status(task_id: str) -> str:
+    """
+    任务ID中带有提交时间（毫秒），据此判断任务是否已完成；无法解析的任务ID视为已完成
+    """
+    try:
+        submitted = int(task_id.rsplit("-", 1)[1]) / 1000
+    except (IndexError, ValueError):
+        return "done"
+    return "done" if time.time() - submitted >= TASK_SECONDS else "generating"
+
+
+async def handle(request: Request) -> Response:
+    action = request.query_params.get("Action")
+    try:
+        body = json.loads(await request.body() or b"{}")
+    except ClientDisconnect:
+        # 调用方取消了请求（如对冲请求中较慢的一个）
+        return Response(status_code=499)
+    stats[f"{action}.calls"] += 1
+    if THROTTLE_QPS > 0 and action in _buckets and not _buckets[action].take():
+        stats[f"{action}.throttled"] += 1
+        return _json({"code": 50429, "message": "Request Has Reached API Limit"}, 429, {"Retry-After": "1"})
+    latency = sample_latency()
+    if latency > 0:
+        await asyncio.sleep(latency)
+    if ERROR_RATE > 0 and random.random() < ERROR_RATE:
+        stats[f"{action}.errors"] += 1
+        return _json({"code": 50500, "message": "Internal Error"}, 500)
+    if action == SUBMIT_ACTION:
+        task_id = f"stub-{os.getpid()}-{next(_task_ids)}-{int(time.time() * 1000)}"
+        return _json({"code": 10000, "data": {"task_id": task_id}})
+    if action == QUERY_RESULT_ACTION:
+        task_id = body.get("task_id", "")
+        if task_status(task_id) != "done":
+            return _json({"code": 10000, "data": {"status": "generating"}})
+        return _json({"code": 10000, "data": {"status": "done", "image_urls": [f"{IMAGE_BASE_URL}/{task_id}.jpg"]}})
+    return _json({"code": 50400, "message": f"unknown action: {action}"})
+
+
+async def get_stats(request: Request) -> Response:
+    return _json(dict(stats))
+
+
+app = Starlette(routes=[Route("/", handle, methods=["POST"]), Route("/stats", get_stats, methods=["GET"])])
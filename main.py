@@ -1,15 +1,78 @@
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from app.api.routes import router as api_router
+from app.core.config import settings
+from app.core.logging_config import RequestContextMiddleware, setup_logging
+from app.services.image_service import quality_gate, result_cache, submission_queue
+from app.services.result_mirror import result_mirror
+from app.services.scene_library import scene_library
+from app.services.task_registry import task_registry
+from app.utils import image_utils, metrics, prompt_builder
+from app.utils.json_codec import FastJSONResponse
+from app.utils.static_files import STATIC_URL_PREFIX, CachedStaticFiles
+from app.utils.volcano_client import volcano_client
 
-app = FastAPI(title="WanderAI Backend", description="AI旅游打卡照片生成服务后端")
+# 日志经队列由后台线程写出，需在创建应用前配置
+setup_logging()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 启动时加载地点目录并预热prompt缓存，打开火山引擎连接池、结果镜像和任务轮询器，关闭时释放；
+    # PIL在图片线程池中后台导入，不推迟开始接收请求；场景库以只读方式内存映射，各worker共享页缓存
+    await prompt_builder.location_catalog.start()
+    scene_library.open()
+    prompt_builder.warm()
+    image_utils.start_warm()
+    await volcano_client.start()
+    await result_mirror.start()
+    if result_cache is not None:
+        await result_cache.start()
+    if quality_gate is not None:
+        await quality_gate.start()
+    await task_registry.start()
+    if submission_queue is not None:
+        await submission_queue.start()
+    yield
+    if submission_queue is not None:
+        await submission_queue.stop()
+    await task_registry.stop()
+    if quality_gate is not None:
+        await quality_gate.close()
+    if result_cache is not None:
+        await result_cache.close()
+    await result_mirror.close()
+    await volcano_client.close()
+    scene_library.close()
+    await prompt_builder.location_catalog.stop()
+
+app = FastAPI(title="WanderAI Backend", description="AI旅游打卡照片生成服务后端", lifespan=lifespan,
+              default_response_class=FastJSONResponse)
 
 # 注册API路由
 app.include_router(api_router, prefix="/api")
 
+# 确保静态文件目录存在，并挂载静态文件服务（上传和结果目录位于STATIC_FOLDER下）
+for folder in (settings.STATIC_FOLDER, settings.UPLOAD_FOLDER, settings.RESULT_FOLDER):
+    os.makedirs(folder, exist_ok=True)
+app.mount(STATIC_URL_PREFIX, CachedStaticFiles(directory=settings.STATIC_FOLDER, on_access=result_mirror.touch), name="static")
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to WanderAI Backend API"}
 
+# 请求耗时等指标，以Prometheus文本格式从/metrics输出
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics_endpoint():
+        return PlainTextResponse(await metrics.REGISTRY.collect(), media_type=metrics.CONTENT_TYPE)
+
+# 请求ID写入日志上下文并在响应头中返回（最外层中间件）
+app.add_middleware(RequestContextMiddleware)
+
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="localhost", port=8000)
+    from app.core.server import run
+    run()
@@ -1,10 +1,5 @@
-import uvicorn
-import os
+from app.core.server import run
 
 if __name__ == "__main__":
-    # 确保静态文件目录存在
-    os.makedirs("static/uploads", exist_ok=True)
-    os.makedirs("static/results", exist_ok=True)
-    
-    # 启动服务器
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
+    # 与python main.py相同，服务器参数（worker数、监听地址等）由配置决定，DEBUG时自动重载
+    run()
@@ -0,0 +1,13 @@
+"""
+测试环境配置
+配置在导入app时读取，测试使用固定的假凭证，不访问真实的火山引擎
+"""
+import os
+
+os.environ.update(
+    VOLCANO_ACCESS_KEY="AKLTtestaccesskey",
+    VOLCANO_SECRET_KEY="testsecretkey==",
+    VOLCANO_CREDENTIALS="",
+    VOLCANO_REGION="cn-north-1",
+    LOG_LEVEL="WARNING",
+)
@@ -0,0 +1,198 @@
+"""
+准入控制的配额模拟测试
+模拟的火山引擎按访问密钥执行QPS和并发配额，超出时返回429；
+准入控制在配额上限处排队而不是让上游限流，多个worker进程按worker数均分配额后合计不超过配额
+"""
+import asyncio
+import time
+from collections import Counter
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.utils.admission import (
+    PRIORITY_FREE,
+    PRIORITY_PAID,
+    PRIORITY_POLL,
+    OverloadedError,
+    create_admission_controller,
+    overcommitted_limits,
+)
+
+SUBMIT_ACTION = "CVSync2AsyncSubmitTask"
+QUERY_ACTION = "CVSync2AsyncGetResult"
+ACCESS_KEY = "AKLTtestaccesskey"
+QPS = 40
+BURST = 2
+CONCURRENCY = 4
+LATENCY = 0.01
+
+
+class QuotaStub:
+    """
+    按访问密钥执行配额的模拟上游：令牌桶限速、并发上限，超出时返回429
+    令牌桶在准入控制放行请求的时刻扣减（见watch），放行后到请求到达之间的调度延迟只体现在总耗时中，
+    不会被当作超出配额；超出速率配额的放行使随后到达的一个请求返回429
+    """
+
+    def __init__(self, qps: float, burst: float, concurrency: int):
+        self.qps = qps
+        self.burst = burst
+        self.concurrency = concurrency
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.in_flight = 0
+        self.over_quota = 0
+        self.responses = Counter()
+
+    def watch(self, controller):
+        """
+        在准入控制器每次放行请求时按放行时刻（令牌桶的补充时间）扣减上游的令牌
+        """
+        try_take = controller._try_take
+
+        def take(state, action):
+            if not try_take(state, action):
+                return False
+            bucket = controller._bucket(state, action)
+            now = bucket.updated_at if bucket is not None else time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.qps)
+            self.updated = now
+            if self.tokens < 1:
+                self.over_quota += 1
+            else:
+                self.tokens -= 1
+            return True
+
+        controller._try_take = take
+        return controller
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        if self.over_quota > 0 or self.in_flight >= self.concurrency:
+            self.over_quota = max(0, self.over_quota - 1)
+            self.responses[429] += 1
+            return httpx.Response(429, headers={"Retry-After": "1"})
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(LATENCY)
+        finally:
+            self.in_flight -= 1
+        self.responses[200] += 1
+        return httpx.Response(200, json={"code": 10000})
+
+
+@pytest.fixture
+def quota(monkeypatch):
+    monkeypatch.setattr(settings, "VOLCANO_SUBMIT_QPS", QPS)
+    monkeypatch.setattr(settings, "VOLCANO_SUBMIT_BURST", BURST)
+    monkeypatch.setattr(settings, "VOLCANO_QUERY_QPS", QPS)
+    monkeypatch.setattr(settings, "VOLCANO_QUERY_BURST", BURST)
+    monkeypatch.setattr(settings, "VOLCANO_MAX_CONCURRENCY", CONCURRENCY)
+    monkeypatch.setattr(settings, "ADMISSION_QUEUE_SIZE", 1000)
+    monkeypatch.setattr(settings, "ADMISSION_MAX_WAIT", 30)
+
+
+async def submit_through(controller, client: httpx.AsyncClient, priority: int = PRIORITY_FREE) -> int:
+    async with controller.acquire(ACCESS_KEY, SUBMIT_ACTION, priority):
+        response = await client.post("https://visual.volcengineapi.com/", content=b"{}")
+    return response.status_code
+
+
+async def simulate(workers: int, requests_per_worker: int, divide: bool):
+    """
+    模拟workers个worker进程（各自一个准入控制器）同时提交，返回上游的响应统计和总耗时
+    """
+    stub = QuotaStub(QPS, BURST, CONCURRENCY)
+    controllers = [stub.watch(create_admission_controller(workers if divide else 1)) for _ in range(workers)]
+    async with httpx.AsyncClient(transport=httpx.MockTransport(stub.handle)) as client:
+        started = time.monotonic()
+        await asyncio.gather(*(submit_through(controller, client)
+                               for controller in controllers for _ in range(requests_per_worker)))
+        elapsed = time.monotonic() - started
+    return stub.responses, elapsed
+
+
+def test_single_worker_stays_at_quota(quota):
+    responses, elapsed = asyncio.run(simulate(1, 60, divide=True))
+    assert responses == {200: 60}
+    # 吞吐量保持在配额上限：除突发容量外每个请求间隔1/QPS秒
+    expected = (60 - BURST) / QPS
+    assert expected * 0.9 <= elapsed <= expected * 1.3
+
+
+def test_workers_share_quota(quota):
+    responses, elapsed = asyncio.run(simulate(2, 30, divide=True))
+    assert responses == {200: 60}
+    expected = (60 - BURST) / QPS
+    assert expected * 0.9 <= elapsed <= expected * 1.3
+
+
+def test_undivided_workers_exceed_quota(quota):
+    # 对照：每个worker都按完整配额放行时，合计速率是配额的两倍，上游开始限流
+    responses, _ = asyncio.run(simulate(2, 30, divide=False))
+    assert responses[429] > 0
+
+
+def test_worker_share_of_limits(quota):
+    controller = create_admission_controller(4)
+    assert controller.limits[SUBMIT_ACTION] == (QPS / 4, BURST / 4)
+    assert controller.max_concurrency == CONCURRENCY // 4
+
+
+def test_overcommitted_limits(quota):
+    assert overcommitted_limits(BURST) == []
+    assert overcommitted_limits(CONCURRENCY) == ["VOLCANO_SUBMIT_BURST", "VOLCANO_QUERY_BURST"]
+    assert overcommitted_limits(CONCURRENCY + 1) == ["VOLCANO_SUBMIT_BURST", "VOLCANO_QUERY_BURST",
+                                                     "VOLCANO_MAX_CONCURRENCY"]
+
+
+def test_full_queue_rejects_fast(quota, monkeypatch):
+    monkeypatch.setattr(settings, "VOLCANO_SUBMIT_QPS", 5)
+    monkeypatch.setattr(settings, "ADMISSION_QUEUE_SIZE", 5)
+
+    async def run():
+        stub = QuotaStub(5, BURST, CONCURRENCY)
+        controller = stub.watch(create_admission_controller(1))
+        async with httpx.AsyncClient(transport=httpx.MockTransport(stub.handle)) as client:
+            async def timed():
+                started = time.monotonic()
+                try:
+                    return await submit_through(controller, client), time.monotonic() - started
+                except OverloadedError as e:
+                    return e, time.monotonic() - started
+            return await asyncio.gather(*(timed() for _ in range(30))), stub.responses
+
+    results, responses = asyncio.run(run())
+    rejected = [(error, elapsed) for error, elapsed in results if isinstance(error, OverloadedError)]
+    # 突发容量内的请求立即放行，5个排队，其余立即拒绝并给出重试时间
+    assert len(rejected) == 30 - BURST - 5
+    assert all(error.retry_after >= 1 and elapsed < 0.1 for error, elapsed in rejected)
+    assert responses == {200: BURST + 5}
+
+
+def test_priority_order(quota, monkeypatch):
+    monkeypatch.setattr(settings, "VOLCANO_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(settings, "VOLCANO_QUERY_QPS", 0)
+    monkeypatch.setattr(settings, "VOLCANO_SUBMIT_QPS", 0)
+
+    async def run():
+        controller = create_admission_controller(1)
+        order = []
+
+        async def call(name: str, action: str, priority: int):
+            async with controller.acquire(ACCESS_KEY, action, priority):
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        first = asyncio.create_task(call("first", SUBMIT_ACTION, PRIORITY_FREE))
+        await asyncio.sleep(0)
+        waiting = [asyncio.create_task(call(name, action, priority)) for name, action, priority in (
+            ("free", SUBMIT_ACTION, PRIORITY_FREE),
+            ("paid", SUBMIT_ACTION, PRIORITY_PAID),
+            ("poll", QUERY_ACTION, PRIORITY_POLL),
+        )]
+        await asyncio.gather(first, *waiting)
+        return order
+
+    assert asyncio.run(run()) == ["first", "poll", "paid", "free"]
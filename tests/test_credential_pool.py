@@ -0,0 +1,135 @@
+"""
+凭证池测试
+权重必须是大于0的有限数；提交按权重归一化后的在途请求数分配；
+被限流、被拒绝或连续出错的凭证暂时剔除，冷却后重新参与分配
+"""
+import asyncio
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import parse_credentials
+from app.utils import credential_pool as credential_pool_module
+from app.utils.credential_pool import CredentialPool, CredentialRejectedError, UpstreamThrottledError
+
+SECRET_KEY = "testsecretkey=="
+
+
+class Clock:
+    """
+    可手动推进的时钟，只替换凭证池模块使用的time.monotonic，不影响事件循环
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(credential_pool_module, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def make_pool(*weights: float, max_failures: int = 3) -> CredentialPool:
+    return CredentialPool([(f"AK{index}", SECRET_KEY, "cn-north-1", weight) for index, weight in enumerate(weights)],
+                          max_failures=max_failures, eject_seconds=30, max_pins=10)
+
+
+def test_parse_credentials():
+    assert parse_credentials("AKLTone:s1, AKLTtwo:s2:cn-beijing:3, :missing, AKLTthree:s3::0.5", "cn-north-1") == [
+        ("AKLTone", "s1", "cn-north-1", 1.0),
+        ("AKLTtwo", "s2", "cn-beijing", 3.0),
+        ("AKLTthree", "s3", "cn-north-1", 0.5),
+    ]
+
+
+@pytest.mark.parametrize("weight", ["0", "-1", "nan", "inf", "heavy"])
+def test_parse_rejects_invalid_weight(weight):
+    with pytest.raises(ValueError) as exc:
+        parse_credentials(f"AKLTone:s1,AKLTtwo:s2:cn-north-1:{weight}", "cn-north-1")
+    message = str(exc.value)
+    assert "第2组" in message and "AKLT***" in message and weight in message
+    assert "s2" not in message
+
+
+def test_weighted_selection():
+    pool = make_pool(1, 3)
+    chosen = Counter()
+    # 请求一直在途：按权重归一化后的在途请求数保持均衡，分配比例等于权重之比
+    for _ in range(40):
+        credential = pool.choose()
+        credential.outstanding += 1
+        chosen[credential.access_key] += 1
+    assert chosen == {"AK0": 10, "AK1": 30}
+
+
+def test_selection_follows_outstanding_requests():
+    pool = make_pool(1, 1)
+    busy, idle = pool.credentials
+    busy.outstanding = 2
+    assert {pool.choose().access_key for _ in range(20)} == {idle.access_key}
+    assert pool.choose(exclude=(idle,)) is busy
+
+
+def test_ejection_and_readmission(clock):
+    pool = make_pool(1, 1, max_failures=2)
+    first, second = pool.credentials
+
+    async def fail(credential):
+        raise RuntimeError("upstream error")
+
+    async def main():
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await pool.call(first, fail)
+
+    asyncio.run(main())
+    # 连续失败达到上限后剔除，冷却期间不参与分配
+    assert not first.available
+    assert {pool.choose().access_key for _ in range(20)} == {second.access_key}
+    assert pool.snapshot()[0]["ejected_for"] == 30
+
+    clock.now += 30
+    assert first.available
+    assert {pool.choose().access_key for _ in range(50)} == {first.access_key, second.access_key}
+
+
+@pytest.mark.parametrize("error, ejected_for", [
+    (UpstreamThrottledError("限流", retry_after=60), 60),
+    (UpstreamThrottledError("限流", retry_after=1), 30),
+    (CredentialRejectedError("密钥无效"), 30),
+])
+def test_rejected_credential_ejected(clock, error, ejected_for):
+    pool = make_pool(1, 1)
+    calls = Counter()
+
+    async def submit(credential):
+        calls[credential.access_key] += 1
+        if credential is pool.credentials[0]:
+            raise error
+        return "task"
+
+    async def main():
+        pool.credentials[1].outstanding = 5
+        # 第一次选中的凭证被拒绝后换用另一个凭证，请求没有失败
+        return await pool.submit(submit)
+
+    credential, result = asyncio.run(main())
+    assert (credential.access_key, result) == ("AK1", "task")
+    assert calls == {"AK0": 1, "AK1": 1}
+    assert pool.snapshot()[0]["ejected_for"] == ejected_for
+
+
+def test_all_ejected_raises_overloaded(clock):
+    pool = make_pool(1, 1)
+    for credential in pool.credentials:
+        pool.eject(credential)
+    clock.now += 10
+    with pytest.raises(credential_pool_module.OverloadedError) as exc:
+        pool.choose()
+    assert exc.value.retry_after == 20
@@ -0,0 +1,140 @@
+"""
+用户图片URL下载测试
+只允许http/https，拒绝解析到非公网地址的URL，重定向的每一跳都重新检查；
+请求直接连接检查过的地址，DNS重绑定无法让请求落到内网地址
+"""
+import asyncio
+import socket
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.utils.image_utils import UnsafeImageURLError, download_image
+
+PUBLIC = "http://93.184.216.34"
+IMAGE = b"\xff\xd8image"
+
+
+def fetch(url: str, redirects: dict = None, sent: list = None):
+    """
+    通过模拟传输层下载url，redirects为 {路径: 重定向目标}，返回 (结果或异常, 访问过的URL)
+    sent不为None时追加实际发出的请求
+    """
+    requested = []
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        requested.append(str(request.url))
+        if sent is not None:
+            sent.append(request)
+        target = (redirects or {}).get(request.url.path)
+        if target is not None:
+            return httpx.Response(302, headers={"Location": target})
+        return httpx.Response(200, content=IMAGE)
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handle)) as client:
+            try:
+                return await download_image(client, url)
+            except Exception as e:
+                return e
+
+    return asyncio.run(main()), requested
+
+
+@pytest.mark.parametrize("url", [
+    "file:///etc/passwd",
+    "ftp://93.184.216.34/a.jpg",
+    "http://127.0.0.1/a.jpg",
+    "http://localhost:8000/a.jpg",
+    "http://10.0.0.5/a.jpg",
+    "http://192.168.1.1/a.jpg",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://100.64.0.1/a.jpg",
+    "http://0.0.0.0/a.jpg",
+    "http://224.0.0.1/a.jpg",
+    "http://[::1]/a.jpg",
+    "http://[fe80::1]/a.jpg",
+    "http://[::ffff:127.0.0.1]/a.jpg",
+])
+def test_rejects_unsafe_urls(url):
+    result, requested = fetch(url)
+    assert isinstance(result, UnsafeImageURLError)
+    assert requested == []
+
+
+def test_downloads_public_url():
+    result, requested = fetch(PUBLIC + "/a.jpg")
+    assert result == IMAGE
+    assert requested == [PUBLIC + "/a.jpg"]
+
+
+def test_follows_safe_redirects():
+    result, requested = fetch(PUBLIC + "/a.jpg", {"/a.jpg": "/b.jpg", "/b.jpg": "http://93.184.216.35/c.jpg"})
+    assert result == IMAGE
+    assert requested == [PUBLIC + "/a.jpg", PUBLIC + "/b.jpg", "http://93.184.216.35/c.jpg"]
+
+
+def test_rechecks_each_redirect():
+    result, requested = fetch(PUBLIC + "/a.jpg", {"/a.jpg": "http://169.254.169.254/latest/meta-data/"})
+    assert isinstance(result, UnsafeImageURLError)
+    assert requested == [PUBLIC + "/a.jpg"]
+
+
+def test_limits_redirects(monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_FETCH_MAX_REDIRECTS", 2)
+    result, requested = fetch(PUBLIC + "/a.jpg", {"/a.jpg": "/a.jpg"})
+    assert isinstance(result, ValueError) and not isinstance(result, UnsafeImageURLError)
+    assert len(requested) == 3
+
+
+def test_allow_private_for_local_testing(monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_FETCH_ALLOW_PRIVATE", True)
+    result, _ = fetch("http://127.0.0.1:8080/a.jpg")
+    assert result == IMAGE
+    result, _ = fetch("file:///etc/passwd")
+    assert isinstance(result, UnsafeImageURLError)
+
+
+@pytest.fixture
+def rebinding_dns(monkeypatch):
+    """
+    模拟DNS重绑定：第一次解析返回公网地址，之后每次都返回回环地址
+    """
+    answers = iter(["93.184.216.34"])
+    lookups = []
+
+    def getaddrinfo(host, port, *args, **kwargs):
+        lookups.append(host)
+        address = next(answers, "127.0.0.1")
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, port))]
+
+    monkeypatch.setattr(socket, "getaddrinfo", getaddrinfo)
+    return lookups
+
+
+def test_connects_to_checked_address(rebinding_dns):
+    sent = []
+    result, requested = fetch("http://images.example.com:8080/a.jpg?size=1", sent=sent)
+    assert result == IMAGE
+    # 只解析一次，请求发往检查过的地址而不是再次解析出的回环地址
+    assert rebinding_dns == ["images.example.com"]
+    assert requested == ["http://93.184.216.34:8080/a.jpg?size=1"]
+    assert sent[0].headers["host"] == "images.example.com:8080"
+
+
+def test_https_keeps_hostname_for_tls(rebinding_dns):
+    sent = []
+    result, requested = fetch("https://images.example.com/a.jpg", sent=sent)
+    assert result == IMAGE
+    assert requested == ["https://93.184.216.34/a.jpg"]
+    assert sent[0].headers["host"] == "images.example.com"
+    assert sent[0].extensions["sni_hostname"] == "images.example.com"
+
+
+def test_rebinding_redirect_rejected(rebinding_dns):
+    # 相对重定向按原主机名解析并重新检查，第二次解析到回环地址时拒绝
+    result, requested = fetch("http://images.example.com/a.jpg", {"/a.jpg": "/b.jpg"})
+    assert isinstance(result, UnsafeImageURLError)
+    assert requested == [PUBLIC + "/a.jpg"]
+    assert rebinding_dns == ["images.example.com", "images.example.com"]
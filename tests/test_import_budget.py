@@ -0,0 +1,39 @@
+"""
+启动导入预算测试
+在新进程中导入main：耗时不超过预算（IMPORT_BUDGET_MS，默认600毫秒），且不导入应按需导入的模块（见benchmarks.bench_import）
+"""
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks.bench_import import DEFERRED_MODULES, PROJECT_ROOT
+
+RUNS = 5
+
+PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import main
+elapsed = (time.perf_counter() - started) * 1000
+deferred = {DEFERRED_MODULES!r}
+print(json.dumps({{"ms": elapsed, "eager": sorted({{name.split(".")[0] for name in sys.modules}} & set(deferred))}}))
+"""
+
+
+def probe() -> dict:
+    result = subprocess.run([sys.executable, "-c", PROBE], cwd=PROJECT_ROOT, capture_output=True, text=True,
+                            check=True)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def test_import_main_within_budget():
+    budget_ms = float(os.getenv("IMPORT_BUDGET_MS", "600"))
+    assert {"PIL", "numpy"} <= set(DEFERRED_MODULES)
+    # 先导入一次预热页缓存和字节码，再取最快的一次，排除测试机负载造成的偶发抖动
+    probe()
+    results = [probe() for _ in range(RUNS)]
+    fastest = min(result["ms"] for result in results)
+    assert fastest <= budget_ms, f"import main took {fastest:.1f} ms, budget is {budget_ms:g} ms"
+    for result in results:
+        assert result["eager"] == [], f"deferred modules imported at startup: {result['eager']}"
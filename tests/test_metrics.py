@@ -0,0 +1,53 @@
+"""
+指标测试
+丢弃日志数按计数器输出；SSE响应的连接时长单独记录，不计入HTTP请求耗时
+"""
+import asyncio
+
+from app.utils import metrics
+
+
+def test_dropped_logs_is_counter(monkeypatch):
+    dropped = [3]
+    monkeypatch.setattr(metrics, "dropped_logs", lambda: dropped[0])
+    child = metrics.LOGS_DROPPED.labels()
+    monkeypatch.setattr(child, "value", 0)
+    asyncio.run(metrics.REGISTRY.collect())
+    dropped[0] = 5
+    text = asyncio.run(metrics.REGISTRY.collect())
+    assert "# TYPE wanderai_log_records_dropped counter" in text
+    assert "wanderai_log_records_dropped_total 5" in text.splitlines()
+
+
+def run_request(content_type: bytes, path: str):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", content_type)]})
+        await send({"type": "http.response.body", "body": b"data: {}\n\n"})
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    middleware = metrics.MetricsMiddleware(app)
+    asyncio.run(middleware({"type": "http", "method": "GET", "root_path": path}, receive, send))
+
+
+def counts(histogram, path: str) -> int:
+    return sum(histogram.labels("GET", path).counts)
+
+
+def test_event_stream_excluded_from_request_duration():
+    path = "/test-events"
+    run_request(b"text/event-stream; charset=utf-8", path)
+    assert counts(metrics.HTTP_REQUEST_SECONDS, path) == 0
+    assert counts(metrics.HTTP_STREAM_SECONDS, path) == 1
+    assert metrics.HTTP_REQUESTS.labels("GET", path, 200).value == 1
+
+
+def test_regular_response_recorded_as_request_duration():
+    path = "/test-json"
+    run_request(b"application/json", path)
+    assert counts(metrics.HTTP_REQUEST_SECONDS, path) == 1
+    assert counts(metrics.HTTP_STREAM_SECONDS, path) == 0
@@ -0,0 +1,133 @@
+"""
+Prompt构造测试
+legacy_*为预编译和缓存之前的构造函数（每次调用重建描述表），缓存命中、未命中和预热后的结果都必须与之完全一致
+"""
+import itertools
+
+import pytest
+
+from app.utils import prompt_builder
+
+LOCATIONS = ["巴黎埃菲尔铁塔", "东京樱花", "纽约时代广场", "马尔代夫海滩", "北京故宫", "", "a{b}c", " 空格 "]
+STYLES = ["natural", "artistic", "vintage", "modern", "cinematic", "unknown"]
+QUALITIES = ["high", "ultra", "professional", "unknown"]
+TIMES = ["morning", "afternoon", "evening", "night", "auto", "unknown"]
+WEATHERS = ["sunny", "cloudy", "sunset", "auto", "unknown"]
+
+
+def legacy_travel_prompt(location: str, style: str = "natural", quality: str = "high") -> str:
+    style_descriptions = {
+        "natural": "保持自然真实的效果，就像真实拍摄的旅游照片",
+        "artistic": "增加艺术感和美感，色彩更加鲜艳生动",
+        "vintage": "添加复古滤镜效果，温暖的色调和怀旧感",
+        "modern": "现代时尚风格，清晰锐利，色彩饱和度高",
+        "cinematic": "电影级别的光影效果，戏剧性的构图和色调"
+    }
+    quality_descriptions = {
+        "high": "高质量",
+        "ultra": "超高清4K质量，细节丰富",
+        "professional": "专业摄影级别，完美的光线和构图"
+    }
+    technical_requirements = [
+        "人物与背景光线、色调保持一致",
+        "人物大小比例符合透视关系",
+        "边缘融合自然，无明显合成痕迹",
+        "保持人物原有的姿态和表情",
+        "整体画面和谐统一"
+    ]
+    style_desc = style_descriptions.get(style, style_descriptions["natural"])
+    quality_desc = quality_descriptions.get(quality, quality_descriptions["high"])
+    base_prompt = f"请将第一张人物照片中的人物自然地合成到第二张{location}风景照片中"
+    return f"""
+{base_prompt}，要求：
+{chr(10).join([f"{i+1}. {req}" for i, req in enumerate(technical_requirements)])}
+6. {style_desc}
+生成{quality_desc}的旅游打卡照片效果。
+    """.strip()
+
+
+def legacy_location_info(location: str) -> dict:
+    location_enhancements = {
+        "巴黎埃菲尔铁塔": {"atmosphere": "浪漫的巴黎氛围，金色的夕阳光线",
+                      "composition": "埃菲尔铁塔作为背景，人物位于前景",
+                      "lighting": "温暖的黄昏光线，营造浪漫氛围"},
+        "东京樱花": {"atmosphere": "春日樱花盛开的浪漫场景",
+                 "composition": "樱花树下的人物特写，粉色花瓣飘落",
+                 "lighting": "柔和的自然光，突出樱花的粉嫩色彩"},
+        "纽约时代广场": {"atmosphere": "繁华都市的现代感和活力",
+                   "composition": "霓虹灯和广告牌作为背景，人物居中",
+                   "lighting": "城市夜景的霓虹灯光效果"},
+        "马尔代夫海滩": {"atmosphere": "热带海岛的度假氛围",
+                   "composition": "蓝天白云和碧海为背景",
+                   "lighting": "明亮的阳光，清澈的海水反光"},
+    }
+    default_enhancement = {"atmosphere": "优美的旅游景点氛围",
+                           "composition": "景点作为背景，人物自然融入",
+                           "lighting": "适合的自然光线，突出景点特色"}
+    return location_enhancements.get(location, default_enhancement)
+
+
+def legacy_advanced_prompt(location: str, style: str = "natural", quality: str = "high",
+                           time_of_day: str = "auto", weather: str = "auto") -> str:
+    time_descriptions = {"morning": "清晨的柔和光线", "afternoon": "午后明亮的阳光",
+                         "evening": "黄昏的温暖光线", "night": "夜晚的灯光效果"}
+    weather_descriptions = {"sunny": "晴朗的天气，阳光充足", "cloudy": "多云的天空，柔和的散射光",
+                            "sunset": "日落时分，金色的光线"}
+    location_info = legacy_location_info(location)
+    additional_desc = []
+    if time_of_day != "auto" and time_of_day in time_descriptions:
+        additional_desc.append(time_descriptions[time_of_day])
+    if weather != "auto" and weather in weather_descriptions:
+        additional_desc.append(weather_descriptions[weather])
+    additional_desc.append(location_info["atmosphere"])
+    additional_desc.append(location_info["lighting"])
+    return f"{legacy_travel_prompt(location, style, quality)}\n\n特殊要求：{', '.join(additional_desc)}"
+
+
+@pytest.fixture(autouse=True)
+def cold_cache():
+    prompt_builder.build_travel_photo_prompt.cache_clear()
+    prompt_builder._build_advanced_prompt.cache_clear()
+    yield
+
+
+def test_travel_prompt_matches_legacy():
+    for location, style, quality in itertools.product(LOCATIONS, STYLES, QUALITIES):
+        expected = legacy_travel_prompt(location, style, quality)
+        assert prompt_builder.build_travel_photo_prompt.__wrapped__(location, style, quality) == expected
+        # 第一次调用未命中缓存，第二次命中
+        assert prompt_builder.build_travel_photo_prompt(location, style, quality) == expected
+        assert prompt_builder.build_travel_photo_prompt(location, style, quality) == expected
+
+
+def test_warmed_prompts_match_legacy():
+    prompt_builder.warm(LOCATIONS)
+    warmed = prompt_builder.build_travel_photo_prompt.cache_info().currsize
+    assert warmed == len(LOCATIONS) * len(prompt_builder.STYLE_DESCRIPTIONS) * len(prompt_builder.QUALITY_DESCRIPTIONS)
+
+    for location, style, quality in itertools.product(LOCATIONS, prompt_builder.STYLE_DESCRIPTIONS,
+                                                      prompt_builder.QUALITY_DESCRIPTIONS):
+        assert prompt_builder.build_travel_photo_prompt(location, style, quality) == \
+            legacy_travel_prompt(location, style, quality)
+    info = prompt_builder.build_travel_photo_prompt.cache_info()
+    assert (info.currsize, info.hits) == (warmed, warmed)
+
+
+def test_default_warm_matches_legacy():
+    prompt_builder.warm()
+    for location, style, quality in itertools.product(prompt_builder.LOCATION_ENHANCEMENTS, STYLES, QUALITIES):
+        assert prompt_builder.build_travel_photo_prompt(location, style, quality) == \
+            legacy_travel_prompt(location, style, quality)
+
+
+def test_advanced_prompt_matches_legacy():
+    for location, style, quality, time_of_day, weather in itertools.product(
+            LOCATIONS, STYLES, QUALITIES, TIMES, WEATHERS):
+        expected = legacy_advanced_prompt(location, style, quality, time_of_day, weather)
+        assert prompt_builder.build_advanced_prompt(location, style, quality, time_of_day, weather) == expected
+        assert prompt_builder.build_advanced_prompt(location, style, quality, time_of_day, weather) == expected
+
+
+def test_location_info_matches_legacy():
+    for location in LOCATIONS:
+        assert prompt_builder.build_location_specific_prompt(location) == legacy_location_info(location)
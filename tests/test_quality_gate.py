@@ -0,0 +1,80 @@
+"""
+输入质量检查测试
+照片无法下载、URL不允许下载或照片无法解码时不拦截，其他异常不应被当作"unavailable"吞掉
+"""
+import asyncio
+import io
+
+import httpx
+import pytest
+from PIL import Image
+
+from app.services import quality_gate as quality_gate_module
+from app.services.quality_gate import InputQualityError, QualityGate, load_thresholds
+from app.utils.metrics import INPUT_QUALITY_CHECKS
+
+PUBLIC = "http://93.184.216.34"
+
+
+def flat_jpeg(size=(1200, 1200)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (128, 128, 128)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def check(url: str, routes: dict):
+    """
+    用模拟传输层下载照片并检查，routes为 {路径: (状态码, 内容)}，返回 (异常或None, 访问过的路径)
+    """
+    requested = []
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        requested.append(request.url.path)
+        status, content = routes.get(request.url.path, (404, b""))
+        return httpx.Response(status, content=content)
+
+    async def main():
+        gate = QualityGate(load_thresholds(), reject=True)
+        gate._client = httpx.AsyncClient(transport=httpx.MockTransport(handle))
+        try:
+            await gate.check(url, "high")
+        except Exception as e:
+            return e
+        finally:
+            await gate.close()
+
+    return asyncio.run(main()), requested
+
+
+def unavailable() -> float:
+    return INPUT_QUALITY_CHECKS.labels("unavailable").value
+
+
+@pytest.mark.parametrize("url, routes", [
+    (PUBLIC + "/missing.jpg", {}),
+    (PUBLIC + "/broken.jpg", {"/broken.jpg": (200, b"not an image")}),
+    ("http://169.254.169.254/latest/meta-data/", {}),
+])
+def test_unavailable_photo_passes(url, routes):
+    before = unavailable()
+    error, _ = check(url, routes)
+    assert error is None
+    assert unavailable() == before + 1
+
+
+def test_blurry_photo_rejected():
+    error, requested = check(PUBLIC + "/flat.jpg", {"/flat.jpg": (200, flat_jpeg())})
+    assert isinstance(error, InputQualityError)
+    assert "sharpness" in [reason["check"] for reason in error.reasons]
+    assert requested == ["/flat.jpg"]
+
+
+def test_unexpected_errors_propagate(monkeypatch):
+    def broken(data):
+        raise RuntimeError("bug")
+
+    monkeypatch.setattr(quality_gate_module, "measure_quality", broken)
+    before = unavailable()
+    error, _ = check(PUBLIC + "/flat.jpg", {"/flat.jpg": (200, flat_jpeg())})
+    assert isinstance(error, RuntimeError)
+    assert unavailable() == before
@@ -0,0 +1,279 @@
+"""
+火山引擎调用容错的故障注入测试
+通过httpx.MockTransport模拟上游返回5xx、超时和慢响应，检查重试次数、对冲请求、单次请求时限和熔断器状态变化，
+以及某个访问密钥熔断时凭证池换用其他密钥
+"""
+import asyncio
+import time
+from collections import Counter
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.utils import volcano_client as volcano_client_module
+from app.utils.admission import create_admission_controller
+from app.utils.credential_pool import CredentialPool
+from app.utils.resilience import CLOSED, HALF_OPEN, OPEN, CircuitOpenError
+from app.utils.volcano_client import ActionPolicy, VolcanoClient
+
+ACCESS_KEY = "AKLTtestaccesskey"
+SECRET_KEY = "testsecretkey=="
+SUBMIT_ACTION = "CVSync2AsyncSubmitTask"
+QUERY_ACTION = "CVSync2AsyncGetResult"
+
+
+class FaultInjector:
+    """
+    按调用顺序返回预设故障的模拟上游，faults中的每一项对应一次调用：
+    状态码、异常实例或 ("slow", 秒数)，用完后返回200
+    """
+
+    def __init__(self, *faults):
+        self.faults = list(faults)
+        self.calls = 0
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        index = self.calls
+        self.calls += 1
+        fault = self.faults[index] if index < len(self.faults) else 200
+        if isinstance(fault, Exception):
+            raise fault
+        if isinstance(fault, tuple):
+            await asyncio.sleep(fault[1])
+            fault = 200
+        return httpx.Response(fault, json={"code": 10000, "data": {"call": index}})
+
+
+@pytest.fixture(autouse=True)
+def resilience_settings(monkeypatch):
+    monkeypatch.setattr(settings, "VOLCANO_MAX_RETRIES", 2)
+    monkeypatch.setattr(settings, "VOLCANO_RETRY_BASE_DELAY", 0.001)
+    monkeypatch.setattr(settings, "VOLCANO_RETRY_MAX_DELAY", 0.005)
+    monkeypatch.setattr(settings, "VOLCANO_BREAKER_FAILURES", 3)
+    monkeypatch.setattr(settings, "VOLCANO_BREAKER_RECOVERY", 0.2)
+    monkeypatch.setattr(settings, "VOLCANO_HEDGE_PERCENTILE", 0)
+    # 不限速，只测容错逻辑
+    monkeypatch.setattr(settings, "VOLCANO_SUBMIT_QPS", 0)
+    monkeypatch.setattr(settings, "VOLCANO_QUERY_QPS", 0)
+    monkeypatch.setattr(settings, "VOLCANO_MAX_CONCURRENCY", 0)
+    monkeypatch.setattr(volcano_client_module, "admission", create_admission_controller(1))
+
+
+def run(injector: FaultInjector, *actions: str):
+    """
+    依次发出请求，返回每次的响应或异常
+    """
+    async def main():
+        client = VolcanoClient(transport=httpx.MockTransport(injector.handle))
+        results = []
+        try:
+            for action in actions:
+                try:
+                    results.append(await client.post(ACCESS_KEY, SECRET_KEY, "cv", "Action=" + action, b"{}",
+                                                     action=action))
+                except Exception as e:
+                    results.append(e)
+        finally:
+            await client.close()
+        return client, results
+
+    return asyncio.run(main())
+
+
+def test_query_retries_5xx_then_succeeds():
+    injector = FaultInjector(500, 503)
+    client, [response] = run(injector, QUERY_ACTION)
+    assert response.status_code == 200
+    assert injector.calls == 3
+    assert client.get_breaker(ACCESS_KEY, QUERY_ACTION).state == CLOSED
+
+
+def test_query_retries_timeouts_up_to_limit():
+    injector = FaultInjector(*[httpx.ReadTimeout("read timeout")] * 5)
+    client, [error] = run(injector, QUERY_ACTION)
+    assert isinstance(error, httpx.ReadTimeout)
+    assert injector.calls == 1 + settings.VOLCANO_MAX_RETRIES
+
+
+def test_submit_is_not_retried_after_request_sent():
+    # 提交不幂等：5xx和读超时都不重试，避免重复创建任务
+    injector = FaultInjector(500)
+    _, [error] = run(injector, SUBMIT_ACTION)
+    assert isinstance(error, httpx.HTTPStatusError)
+    assert injector.calls == 1
+
+    injector = FaultInjector(httpx.ReadTimeout("read timeout"))
+    _, [error] = run(injector, SUBMIT_ACTION)
+    assert isinstance(error, httpx.ReadTimeout)
+    assert injector.calls == 1
+
+
+def test_submit_retries_connect_errors():
+    injector = FaultInjector(httpx.ConnectError("refused"), httpx.ConnectError("refused"))
+    _, [response] = run(injector, SUBMIT_ACTION)
+    assert response.status_code == 200
+    assert injector.calls == 3
+
+
+def test_breaker_opens_and_fails_fast():
+    injector = FaultInjector(500, 500, 500)
+    client, [first, second] = run(injector, QUERY_ACTION, QUERY_ACTION)
+    # 第三次失败（最后一次重试）打开熔断器，之后的请求不再访问上游
+    assert isinstance(first, httpx.HTTPStatusError)
+    assert isinstance(second, CircuitOpenError)
+    assert injector.calls == settings.VOLCANO_BREAKER_FAILURES
+    breaker = client.get_breaker(ACCESS_KEY, QUERY_ACTION)
+    assert breaker.state == OPEN
+    assert second.retry_after >= 1
+
+
+def test_breaker_half_open_probe_closes_on_success():
+    async def main():
+        injector = FaultInjector(500, 500, 500, ("slow", 0.05))
+        client = VolcanoClient(transport=httpx.MockTransport(injector.handle))
+        breaker = client.get_breaker(ACCESS_KEY, QUERY_ACTION)
+
+        async def query():
+            return await client.post(ACCESS_KEY, SECRET_KEY, "cv", "Action=" + QUERY_ACTION, b"{}",
+                                     action=QUERY_ACTION)
+
+        with pytest.raises(httpx.HTTPStatusError):
+            await query()
+        assert breaker.state == OPEN
+        await asyncio.sleep(settings.VOLCANO_BREAKER_RECOVERY)
+
+        # 冷却后只放行一个探测请求，探测期间的其他请求仍被拒绝
+        probe = asyncio.create_task(query())
+        await asyncio.sleep(0.01)
+        assert breaker.state == HALF_OPEN
+        with pytest.raises(CircuitOpenError):
+            await query()
+        assert (await probe).status_code == 200
+        assert breaker.state == CLOSED
+        assert injector.calls == 4
+        await client.close()
+
+    asyncio.run(main())
+
+
+def test_breaker_half_open_probe_failure_reopens():
+    async def main():
+        injector = FaultInjector(500, 500, 500, 500)
+        client = VolcanoClient(transport=httpx.MockTransport(injector.handle))
+        breaker = client.get_breaker(ACCESS_KEY, SUBMIT_ACTION)
+        for _ in range(3):
+            with pytest.raises(httpx.HTTPStatusError):
+                await client.post(ACCESS_KEY, SECRET_KEY, "cv", "Action=" + SUBMIT_ACTION, b"{}",
+                                  action=SUBMIT_ACTION)
+        assert breaker.state == OPEN
+        await asyncio.sleep(settings.VOLCANO_BREAKER_RECOVERY)
+        with pytest.raises(httpx.HTTPStatusError):
+            await client.post(ACCESS_KEY, SECRET_KEY, "cv", "Action=" + SUBMIT_ACTION, b"{}", action=SUBMIT_ACTION)
+        assert breaker.state == OPEN
+        assert injector.calls == 4
+        await client.close()
+
+    asyncio.run(main())
+
+
+def test_slow_query_is_hedged(monkeypatch):
+    monkeypatch.setattr(settings, "VOLCANO_HEDGE_PERCENTILE", 95)
+    monkeypatch.setattr(settings, "VOLCANO_HEDGE_MIN_DELAY", 0.02)
+
+    async def main():
+        # 前20次请求快速返回，建立延迟分布；第21次很慢，超过p95后发出的对冲请求先返回
+        injector = FaultInjector(*[("slow", 0.005)] * 20, ("slow", 1.0))
+        client = VolcanoClient(transport=httpx.MockTransport(injector.handle))
+        for _ in range(20):
+            await client.post(ACCESS_KEY, SECRET_KEY, "cv", "Action=" + QUERY_ACTION, b"{}", action=QUERY_ACTION)
+        started = time.monotonic()
+        response = await client.post(ACCESS_KEY, SECRET_KEY, "cv", "Action=" + QUERY_ACTION, b"{}",
+                                     action=QUERY_ACTION)
+        elapsed = time.monotonic() - started
+        await client.close()
+        return injector, response, elapsed
+
+    injector, response, elapsed = asyncio.run(main())
+    assert injector.calls == 22
+    assert response.json()["data"]["call"] == 21
+    assert elapsed < 0.5
+
+
+def test_submit_is_not_hedged(monkeypatch):
+    monkeypatch.setattr(settings, "VOLCANO_HEDGE_PERCENTILE", 95)
+    monkeypatch.setattr(settings, "VOLCANO_HEDGE_MIN_DELAY", 0.02)
+    injector = FaultInjector(*[("slow", 0.005)] * 20, ("slow", 0.2))
+    _, results = run(injector, *[SUBMIT_ACTION] * 21)
+    assert all(result.status_code == 200 for result in results)
+    assert injector.calls == 21
+
+
+def test_deadline_bounds_slow_responses(monkeypatch):
+    monkeypatch.setitem(volcano_client_module.ACTION_POLICIES, QUERY_ACTION,
+                        ActionPolicy(connect_timeout=0.05, read_timeout=0.1, idempotent=True))
+    injector = FaultInjector(*[("slow", 5)] * 5)
+    started = time.monotonic()
+    _, [error] = run(injector, QUERY_ACTION)
+    elapsed = time.monotonic() - started
+    assert isinstance(error, httpx.TimeoutException)
+    assert injector.calls == 1 + settings.VOLCANO_MAX_RETRIES
+    # 每次尝试不超过connect_timeout + read_timeout，加上退避等待
+    assert elapsed < (1 + settings.VOLCANO_MAX_RETRIES) * 0.15 + 0.2
+
+
+def test_pool_routes_around_open_breaker():
+    async def main():
+        calls = Counter()
+
+        async def handle(request: httpx.Request) -> httpx.Response:
+            access_key = "BADKEY" if "Credential=BADKEY/" in request.headers["Authorization"] else "GOODKEY"
+            calls[access_key] += 1
+            return httpx.Response(500 if access_key == "BADKEY" else 200, json={"code": 10000})
+
+        client = VolcanoClient(transport=httpx.MockTransport(handle))
+        pool = CredentialPool([("BADKEY", SECRET_KEY, "cn-north-1", 1.0), ("GOODKEY", SECRET_KEY, "cn-north-1", 1.0)],
+                              max_failures=0, eject_seconds=30, max_pins=10)
+
+        async def submit(credential):
+            return await client.post(credential.access_key, credential.secret_key, "cv", "Action=" + SUBMIT_ACTION,
+                                     b"{}", action=SUBMIT_ACTION, region=credential.region)
+
+        bad = pool.credentials[0]
+        for _ in range(settings.VOLCANO_BREAKER_FAILURES):
+            with pytest.raises(httpx.HTTPStatusError):
+                await pool.call(bad, submit)
+        # 熔断器只属于出错的访问密钥，提交全部换用正常的密钥
+        results = [await pool.submit(submit) for _ in range(10)]
+        health = {(item["access_key"], item["action"]): item["state"] for item in client.health()}
+        await client.close()
+        return calls, results, health
+
+    calls, results, health = asyncio.run(main())
+    assert calls == {"BADKEY": settings.VOLCANO_BREAKER_FAILURES, "GOODKEY": 10}
+    assert all(credential.access_key == "GOODKEY" and response.status_code == 200
+               for credential, response in results)
+    assert health == {("BADK***", SUBMIT_ACTION): OPEN, ("GOOD***", SUBMIT_ACTION): CLOSED}
+
+
+def test_pool_raises_when_all_breakers_open():
+    async def main():
+        client = VolcanoClient(transport=httpx.MockTransport(FaultInjector(*[500] * 10).handle))
+        pool = CredentialPool([("AKLTone", SECRET_KEY, "cn-north-1", 1.0), ("AKLTtwo", SECRET_KEY, "cn-beijing", 1.0)],
+                              max_failures=0, eject_seconds=30, max_pins=10)
+
+        async def submit(credential):
+            return await client.post(credential.access_key, credential.secret_key, "cv", "Action=" + SUBMIT_ACTION,
+                                     b"{}", action=SUBMIT_ACTION, region=credential.region)
+
+        for credential in pool.credentials:
+            for _ in range(settings.VOLCANO_BREAKER_FAILURES):
+                with pytest.raises(httpx.HTTPStatusError):
+                    await pool.call(credential, submit)
+        with pytest.raises(CircuitOpenError):
+            await pool.submit(submit)
+        states = {(item["region"], item["state"]) for item in client.health()}
+        await client.close()
+        return states
+
+    assert asyncio.run(main()) == {("cn-north-1", OPEN), ("cn-beijing", OPEN)}
@@ -0,0 +1,94 @@
+"""
+结果镜像淘汰测试
+按目录扫描计算总大小，其他worker下载的文件和重启前的文件都计入上限；访问过的文件最后淘汰，淘汰时清除任务记录的本地地址
+"""
+import asyncio
+import os
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.services import result_mirror as result_mirror_module
+from app.services.result_mirror import ResultMirror, result_key
+from app.services.task_registry import TaskRegistry
+from app.services.task_store import MemoryTaskStore, TaskRecord
+from app.utils.static_files import static_url
+
+SIZE = 1000
+
+
+@pytest.fixture
+def results(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "RESULT_FOLDER", str(tmp_path))
+    monkeypatch.setattr(settings, "STATIC_FOLDER", str(tmp_path.parent))
+    monkeypatch.setattr(settings, "RESULT_CACHE_MAX_BYTES", SIZE * 2)
+    registry = TaskRegistry(store=MemoryTaskStore())
+    monkeypatch.setattr(result_mirror_module, "task_registry", registry)
+    now = time.time()
+
+    async def create(task_id: str, age: float) -> str:
+        """
+        写入一个age秒前访问过的结果文件（模拟由其他worker或重启前下载），返回文件路径
+        """
+        path = os.path.join(settings.RESULT_FOLDER, result_key(task_id) + ".jpg")
+        with open(path, "wb") as f:
+            f.write(b"\0" * SIZE)
+        os.utime(path, (now - age, now - age))
+        await registry.store.add([TaskRecord(task_id, "done", result="https://cdn/x.jpg", local_url=static_url(path))])
+        return path
+
+    return create, registry
+
+
+def remaining() -> list:
+    return sorted(os.listdir(settings.RESULT_FOLDER))
+
+
+def test_evicts_oldest_files_from_all_workers(results):
+    create, registry = results
+
+    async def main():
+        for task_id, age in (("a", 300), ("b", 200), ("c", 100)):
+            await create(task_id, age)
+        await ResultMirror()._evict()
+        return await registry.store.get_many(["a", "b", "c"])
+
+    records = asyncio.run(main())
+    assert remaining() == sorted(result_key(task_id) + ".jpg" for task_id in ("b", "c"))
+    assert records["a"].local_url is None
+    assert records["b"].local_url is not None
+
+
+def test_accessed_files_evicted_last(results):
+    create, _ = results
+
+    async def main():
+        oldest = await create("a", 300)
+        await create("b", 200)
+        await create("c", 100)
+        mirror = ResultMirror()
+        mirror.touch(oldest)
+        # 访问时间在线程中更新
+        for _ in range(100):
+            if os.stat(oldest).st_atime > time.time() - 10:
+                break
+            await asyncio.sleep(0.01)
+        await mirror._evict()
+
+    asyncio.run(main())
+    assert remaining() == sorted(result_key(task_id) + ".jpg" for task_id in ("a", "c"))
+
+
+def test_keeps_newly_mirrored_result(results):
+    create, _ = results
+
+    async def main():
+        await create("a", 100)
+        await create("b", 200)
+        await create("c", 300)
+        # 刚镜像完成的结果即使访问时间较早也不淘汰
+        await ResultMirror()._evict(result_key("c"))
+
+    asyncio.run(main())
+    assert remaining() == sorted(result_key(task_id) + ".jpg" for task_id in ("a", "c"))
@@ -0,0 +1,56 @@
+"""
+服务器启动参数测试
+内存任务存储不在worker之间共享，多worker时必须拒绝启动；上游配额不足以均分给各worker时输出警告
+"""
+import logging
+
+import pytest
+import uvicorn
+
+from app.core import server
+from app.core.config import settings
+
+
+@pytest.fixture
+def started(monkeypatch):
+    calls = []
+    monkeypatch.setattr(uvicorn, "run", lambda app, **options: calls.append(options))
+    monkeypatch.setattr(settings, "DEBUG", False)
+    return calls
+
+
+def test_refuses_multiple_workers_with_memory_store(started, monkeypatch):
+    monkeypatch.setattr(settings, "SERVER_WORKERS", 4)
+    monkeypatch.setattr(settings, "TASK_STORE_BACKEND", "memory")
+    with pytest.raises(SystemExit) as exc:
+        server.run()
+    assert "TASK_STORE_BACKEND=sqlite" in str(exc.value)
+    assert started == []
+
+
+def test_multiple_workers_with_shared_store(started, monkeypatch):
+    monkeypatch.setattr(settings, "SERVER_WORKERS", 4)
+    monkeypatch.setattr(settings, "TASK_STORE_BACKEND", "sqlite")
+    server.run()
+    assert [options["workers"] for options in started] == [4]
+
+
+def test_single_worker_with_memory_store(started, monkeypatch):
+    monkeypatch.setattr(settings, "SERVER_WORKERS", 1)
+    monkeypatch.setattr(settings, "TASK_STORE_BACKEND", "memory")
+    server.run()
+    assert [options["workers"] for options in started] == [1]
+
+
+def test_warns_when_quota_cannot_be_split(started, monkeypatch, caplog):
+    monkeypatch.setattr(settings, "SERVER_WORKERS", 4)
+    monkeypatch.setattr(settings, "TASK_STORE_BACKEND", "sqlite")
+    monkeypatch.setattr(settings, "VOLCANO_SUBMIT_QPS", 2)
+    monkeypatch.setattr(settings, "VOLCANO_SUBMIT_BURST", 2)
+    monkeypatch.setattr(settings, "VOLCANO_QUERY_BURST", 10)
+    monkeypatch.setattr(settings, "VOLCANO_MAX_CONCURRENCY", 10)
+    with caplog.at_level(logging.WARNING, logger=server.logger.name):
+        server.run()
+    [record] = [record for record in caplog.records if record.name == server.logger.name]
+    assert record.limits == ["VOLCANO_SUBMIT_BURST"]
+    assert len(started) == 1
@@ -0,0 +1,109 @@
+"""
+静态文件服务测试
+内容哈希文件返回强ETag，支持单区间Range请求与If-None-Match条件请求；镜像结果文件原子替换
+"""
+import asyncio
+import io
+import os
+
+import httpx
+import pytest
+from PIL import Image
+
+from app.core.config import settings
+from app.services.result_mirror import make_thumbnail
+from app.utils.static_files import CachedStaticFiles, parse_range
+
+NAME = "0123456789abcdef0123456789abcdef.jpg"
+CONTENT = bytes(range(256)) * 4
+
+
+@pytest.fixture
+def get(tmp_path):
+    (tmp_path / NAME).write_bytes(CONTENT)
+    app = CachedStaticFiles(directory=str(tmp_path))
+
+    def request(path: str = "/" + NAME, **headers) -> httpx.Response:
+        async def main():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+                return await client.get(path, headers={key.replace("_", "-"): value
+                                                       for key, value in headers.items()})
+
+        return asyncio.run(main())
+
+    return request
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=1000-", (1000, 1023)),
+    ("bytes=-24", (1000, 1023)),
+    ("bytes=-5000", (0, 1023)),
+    ("bytes=1000-5000", (1000, 1023)),
+    ("bytes=0-1,5-6", None),
+    ("items=0-1", None),
+    ("bytes=-", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, len(CONTENT)) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1024-", "bytes=50-10", "bytes=-0"])
+def test_parse_unsatisfiable_range(header):
+    with pytest.raises(ValueError):
+        parse_range(header, len(CONTENT))
+
+
+def test_full_response_has_strong_etag(get):
+    response = get()
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["etag"] == '"0123456789abcdef0123456789abcdef"'
+    assert "immutable" in response.headers["cache-control"]
+    assert response.headers["accept-ranges"] == "bytes"
+
+
+def test_range_request(get):
+    response = get(range="bytes=100-199")
+    assert response.status_code == 206
+    assert response.content == CONTENT[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(CONTENT)}"
+    assert response.headers["content-length"] == "100"
+    assert response.headers["etag"] == '"0123456789abcdef0123456789abcdef"'
+
+
+def test_unsatisfiable_range(get):
+    response = get(range=f"bytes={len(CONTENT)}-")
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+def test_if_range_mismatch_returns_full_file(get):
+    response = get(range="bytes=0-9", if_range='"stale"')
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+def test_if_none_match(get):
+    etag = get().headers["etag"]
+    response = get(if_none_match=etag)
+    assert response.status_code == 304
+    assert response.content == b""
+    assert get(if_none_match='"other"').status_code == 200
+
+
+def test_thumbnail_replaced_atomically(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "RESULT_THUMBNAIL_SIZE", 32)
+    source = tmp_path / "result.jpg"
+    Image.new("RGB", (200, 100), (10, 20, 30)).save(source, "JPEG")
+    thumbnail = tmp_path / "result_thumb.jpg"
+    thumbnail.write_bytes(b"old")
+
+    # 替换前打开的读者仍读到完整的旧内容，之后打开的读者读到完整的新内容
+    with open(thumbnail, "rb") as reader:
+        make_thumbnail(str(source), str(thumbnail))
+        assert reader.read() == b"old"
+    with Image.open(io.BytesIO(thumbnail.read_bytes())) as image:
+        assert image.size == (32, 16)
+    assert sorted(os.listdir(tmp_path)) == ["result.jpg", "result_thumb.jpg"]
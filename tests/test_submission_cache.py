@@ -0,0 +1,117 @@
+"""
+提交去重缓存测试
+并发的相同提交合并为一次上游调用；两种后端都按TTL过期、按最近使用淘汰；sqlite后端重新打开后仍可去重
+"""
+import asyncio
+
+import pytest
+
+from app.services import submission_cache as submission_cache_module
+from app.services.submission_cache import MemorySubmissionBackend, SqliteSubmissionBackend, SubmissionCache
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_backend(request, tmp_path):
+    backends = []
+
+    def make(ttl: float = 60, max_entries: int = 100):
+        if request.param == "memory":
+            backend = MemorySubmissionBackend(ttl, max_entries)
+        else:
+            backend = SqliteSubmissionBackend(str(tmp_path / "submissions.db"), ttl, max_entries)
+        backends.append(backend)
+        return backend
+
+    yield make
+    for backend in backends:
+        backend.close()
+
+
+def test_concurrent_submits_share_one_call(make_backend):
+    calls = []
+
+    async def submit():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return f"task-{len(calls)}"
+
+    async def main():
+        cache = SubmissionCache(make_backend())
+        key = cache.make_key("u.jpg", "s.jpg", "西湖", "写实", "high")
+        merged = await asyncio.gather(*(cache.get_or_submit(key, submit) for _ in range(5)))
+        # 提交完成后命中缓存，不再调用上游
+        cached = await cache.get_or_submit(key, submit)
+        other = await cache.get_or_submit(cache.make_key("u.jpg", "s.jpg", "西湖", "写实", "low"), submit)
+        return merged, cached, other
+
+    merged, cached, other = asyncio.run(main())
+    assert merged == ["task-1"] * 5
+    assert cached == "task-1"
+    assert other == "task-2"
+    assert len(calls) == 2
+
+
+def test_entries_expire_after_ttl(make_backend, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(submission_cache_module.time, "time", lambda: now[0])
+
+    async def main():
+        backend = make_backend(ttl=10)
+        await backend.set("a", "task-a")
+        now[0] += 9
+        fresh = await backend.get("a")
+        now[0] += 2
+        return fresh, await backend.get("a")
+
+    assert asyncio.run(main()) == ("task-a", None)
+
+
+def test_evicts_least_recently_used(make_backend, monkeypatch):
+    monkeypatch.setattr(SqliteSubmissionBackend, "EVICT_EVERY", 1)
+    now = [1000.0]
+    monkeypatch.setattr(submission_cache_module.time, "time", lambda: now[0])
+
+    async def main():
+        backend = make_backend(max_entries=2)
+        for key in ("a", "b"):
+            await backend.set(key, f"task-{key}")
+            now[0] += 1
+        # 读取a后b成为最久未使用的条目
+        await backend.get("a")
+        now[0] += 1
+        await backend.set("c", "task-c")
+        return [await backend.get(key) for key in ("a", "b", "c")]
+
+    assert asyncio.run(main()) == ["task-a", None, "task-c"]
+
+
+def test_invalidate_forces_resubmit(make_backend):
+    calls = []
+
+    async def submit():
+        calls.append(1)
+        return f"task-{len(calls)}"
+
+    async def main():
+        cache = SubmissionCache(make_backend())
+        first = await cache.get_or_submit("k", submit)
+        await cache.invalidate("k")
+        return first, await cache.get_or_submit("k", submit)
+
+    assert asyncio.run(main()) == ("task-1", "task-2")
+
+
+def test_sqlite_persists_across_reopen(tmp_path):
+    path = str(tmp_path / "submissions.db")
+
+    async def main():
+        backend = SqliteSubmissionBackend(path, 60, 100)
+        await backend.set("a", "task-a")
+        backend.close()
+        reopened = SqliteSubmissionBackend(path, 60, 100)
+        try:
+            return await reopened.get("a")
+        finally:
+            reopened.close()
+
+    assert asyncio.run(main()) == "task-a"
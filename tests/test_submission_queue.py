@@ -0,0 +1,174 @@
+"""
+持久化提交队列测试
+提交耗时超过租约时续租且不重复认领；排队中的任务立即开始推送queued/submitting状态和心跳，
+提交成功后转为推送上游任务的状态，提交失败时推送failed；提交协程被唤醒的同时停止时能够退出
+"""
+import asyncio
+from collections import Counter
+
+import pytest
+
+from app.core.config import settings
+from app.services import image_service
+from app.services.submission_queue import SubmissionQueue
+
+
+class PermanentError(ValueError):
+    pass
+
+
+class Gate:
+    """
+    可控的提交函数：等到release()后返回（或抛出）结果，记录每个任务被提交的次数
+    """
+
+    def __init__(self, error: Exception = None):
+        self.error = error
+        self.released = asyncio.Event()
+        self.started = asyncio.Event()
+        self.calls = Counter()
+
+    async def submit(self, **params):
+        self.calls[params["name"]] += 1
+        self.started.set()
+        await self.released.wait()
+        if self.error is not None:
+            raise self.error
+        return f"task-{params['name']}"
+
+
+@pytest.fixture(autouse=True)
+def queue_settings(monkeypatch):
+    monkeypatch.setattr(settings, "SUBMISSION_QUEUE_WORKERS", 2)
+    monkeypatch.setattr(settings, "SUBMISSION_QUEUE_POLL_INTERVAL", 0.02)
+    monkeypatch.setattr(settings, "SUBMISSION_QUEUE_LEASE", 0.15)
+
+
+def test_inflight_job_not_reclaimed_after_lease(tmp_path):
+    async def main():
+        gate = Gate()
+        queue = SubmissionQueue(str(tmp_path / "queue.db"), gate.submit)
+        # 另一个进程共享同一个队列文件
+        other = SubmissionQueue(str(tmp_path / "queue.db"), gate.submit)
+        [job_id] = await queue.enqueue([{"name": "a"}])
+        await queue.start()
+        await gate.started.wait()
+        # 提交时间超过租约的数倍，本进程和其他进程都不会再次认领
+        await asyncio.sleep(settings.SUBMISSION_QUEUE_LEASE * 4)
+        assert await queue._claim(5) == []
+        assert await other._claim(5) == []
+        gate.released.set()
+        job = await queue.wait_finished(job_id, timeout=5)
+        await queue.stop()
+        queue.close()
+        other.close()
+        return gate.calls, job, queue._inflight
+
+    calls, job, inflight = asyncio.run(main())
+    assert calls == {"a": 1}
+    assert job.task_id == "task-a"
+    assert inflight == {}
+
+
+def test_expired_lease_reclaimed_by_other_process(tmp_path):
+    async def main():
+        gate = Gate()
+        queue = SubmissionQueue(str(tmp_path / "queue.db"), gate.submit)
+        other = SubmissionQueue(str(tmp_path / "queue.db"), gate.submit)
+        await queue.enqueue([{"name": "a"}])
+        # 认领后进程崩溃：不再续租，租约到期后由其他进程重新认领
+        [claimed] = await queue._claim(5)
+        assert await other._claim(5) == []
+        await asyncio.sleep(settings.SUBMISSION_QUEUE_LEASE * 1.5)
+        reclaimed = await other._claim(5)
+        queue.close()
+        other.close()
+        return claimed, reclaimed
+
+    claimed, reclaimed = asyncio.run(main())
+    assert [job.job_id for job in reclaimed] == [claimed.job_id]
+
+
+async def collect(events, count: int) -> list:
+    return [await asyncio.wait_for(events.__anext__(), timeout=5) for _ in range(count)]
+
+
+def test_queued_job_streams_immediately(tmp_path, monkeypatch):
+    class Registry:
+        async def resolve(self, task_id):
+            return task_id
+
+        async def watch(self, entry, heartbeat=None):
+            yield {"task_id": entry, "status": "done", "image_url": "https://cdn/1.jpg", "thumbnail_url": None}
+
+    async def main():
+        gate = Gate()
+        queue = SubmissionQueue(str(tmp_path / "queue.db"), gate.submit)
+        monkeypatch.setattr(image_service, "submission_queue", queue)
+        monkeypatch.setattr(image_service, "task_registry", Registry())
+        [job_id] = await queue.enqueue([{"name": "a"}])
+
+        # 提交协程尚未启动：立即推送queued，之后按心跳间隔产出None
+        events = await asyncio.wait_for(image_service.watch_travel_photo_result(job_id, heartbeat=0.05), 1)
+        queued, heartbeat = await collect(events, 2)
+        await queue.start()
+        await gate.started.wait()
+        [submitting] = await collect(events, 1)
+        gate.released.set()
+        rest = [event async for event in events]
+        await queue.stop()
+        queue.close()
+        return queued, heartbeat, submitting, rest
+
+    queued, heartbeat, submitting, rest = asyncio.run(main())
+    assert queued["status"] == "queued" and queued["image_url"] is None
+    assert heartbeat is None
+    assert submitting["status"] == "submitting"
+    assert [event for event in rest if event is not None] == [
+        {"task_id": "task-a", "status": "done", "image_url": "https://cdn/1.jpg", "thumbnail_url": None}]
+
+
+def test_failed_job_streams_failed_event(tmp_path, monkeypatch):
+    async def main():
+        gate = Gate(PermanentError("用户照片质量不合格"))
+        gate.released.set()
+        queue = SubmissionQueue(str(tmp_path / "queue.db"), gate.submit, permanent_errors=(PermanentError,))
+        monkeypatch.setattr(image_service, "submission_queue", queue)
+        [job_id] = await queue.enqueue([{"name": "a"}])
+        events = await image_service.watch_travel_photo_result(job_id, heartbeat=1)
+        await queue.start()
+        received = [event async for event in events]
+        await queue.stop()
+        queue.close()
+        return received
+
+    received = asyncio.run(main())
+    assert received[0]["status"] == "queued"
+    assert received[-1] == {"task_id": received[0]["task_id"], "status": "failed", "error": "用户照片质量不合格",
+                            "image_url": None, "thumbnail_url": None}
+
+
+def test_unknown_job_raises(tmp_path, monkeypatch):
+    async def main():
+        queue = SubmissionQueue(str(tmp_path / "queue.db"), Gate().submit)
+        monkeypatch.setattr(image_service, "submission_queue", queue)
+        try:
+            with pytest.raises(ValueError):
+                await image_service.watch_travel_photo_result("job-doesnotexist")
+        finally:
+            queue.close()
+
+    asyncio.run(main())
+
+
+def test_stop_while_woken(tmp_path):
+    async def main():
+        queue = SubmissionQueue(str(tmp_path / "queue.db"), Gate().submit)
+        await queue.start()
+        await asyncio.sleep(settings.SUBMISSION_QUEUE_POLL_INTERVAL / 2)
+        # 提交协程等待期间同时被唤醒和取消（如正在提交的任务恰好结束时关闭服务）
+        queue._wakeup.set()
+        await asyncio.wait_for(queue.stop(), 1)
+        queue.close()
+
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""
+任务状态推送的扇出测试
+用假的上游查询函数模拟火山引擎，检查1000个订阅者共享同一个上游轮询，并且内存和CPU开销在固定预算内；
+轮询协程被唤醒的同时停止时能够退出
+"""
+import asyncio
+import time
+import tracemalloc
+
+import pytest
+
+from app.core.config import settings
+from app.services.task_registry import TaskRegistry
+
+SUBSCRIBERS = 1000
+# 单核环境下实测峰值约4MB、CPU约0.3秒（含tracemalloc的开销），预算留出余量
+MEMORY_BUDGET = 8 * 1024 * 1024
+CPU_BUDGET = 2.0
+STATUSES = ["in_queue", "generating", "generating", "generating"]
+RESULT_URL = "https://example.com/generated_photo.jpg"
+
+
+@pytest.fixture
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(settings, "TASK_POLL_MIN_INTERVAL", 0.02)
+    monkeypatch.setattr(settings, "TASK_POLL_MAX_INTERVAL", 0.05)
+    monkeypatch.setattr(settings, "TASK_STORE_SYNC_INTERVAL", 0.05)
+
+
+def test_subscribers_share_one_upstream_watch(fast_polling):
+    calls = []
+
+    async def fake_query(task_id: str):
+        calls.append(task_id)
+        await asyncio.sleep(0.005)
+        if len(calls) > len(STATUSES):
+            return RESULT_URL
+        return {"task_id": task_id, "status": STATUSES[len(calls) - 1]}
+
+    async def subscribe(registry: TaskRegistry, entry) -> list:
+        return [event async for event in registry.watch(entry, heartbeat=1) if event is not None]
+
+    async def run():
+        registry = TaskRegistry(fake_query)
+        await registry.start()
+        try:
+            entry = await registry.register("7392616336519610409")
+            tracemalloc.start()
+            started = time.process_time()
+            streams = await asyncio.wait_for(
+                asyncio.gather(*(subscribe(registry, entry) for _ in range(SUBSCRIBERS))), timeout=10)
+            cpu = time.process_time() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        finally:
+            await registry.stop()
+        return streams, cpu, peak
+
+    streams, cpu, peak = asyncio.run(run())
+
+    assert len(streams) == SUBSCRIBERS
+    for events in streams:
+        assert events[-1]["status"] == "done"
+        assert events[-1]["image_url"] == RESULT_URL
+    # 每次状态变化只查询一次上游，与订阅者数量无关
+    assert len(calls) == len(STATUSES) + 1
+    assert peak < MEMORY_BUDGET, f"峰值内存{peak / 1024:.0f}KB超过预算"
+    assert cpu < CPU_BUDGET, f"CPU耗时{cpu:.2f}s超过预算"
+
+
+def test_stop_while_woken(fast_polling):
+    async def run():
+        registry = TaskRegistry(lambda task_id: None)
+        await registry.start()
+        await asyncio.sleep(settings.TASK_STORE_SYNC_INTERVAL / 2)
+        # 轮询协程等待期间同时被唤醒和取消（如关闭服务时恰好有任务登记）
+        registry._wakeup.set()
+        stopping = asyncio.ensure_future(registry.stop())
+        done, _ = await asyncio.wait({stopping}, timeout=1)
+        return bool(done)
+
+    assert asyncio.run(run())
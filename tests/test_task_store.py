@@ -0,0 +1,137 @@
+"""
+任务状态存储测试
+内存存储和sqlite存储行为一致：并发认领的任务互不重复，租约到期后由其他进程接手，
+写回状态即释放认领，purge只删除过期的终态任务
+"""
+import asyncio
+
+import pytest
+
+from app.services.task_store import MemoryTaskStore, SqliteTaskStore, TaskRecord
+
+NOW = 1000.0
+LEASE = 30.0
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_stores(request, tmp_path):
+    """
+    返回创建n个共享同一份数据的存储的函数：sqlite为同一文件上的多个连接（模拟多个worker进程）
+    """
+    stores = []
+
+    def make(count: int = 1) -> list:
+        if request.param == "memory":
+            created = [MemoryTaskStore()] * count
+        else:
+            created = [SqliteTaskStore(str(tmp_path / "tasks.db")) for _ in range(count)]
+        stores.extend(created)
+        return created
+
+    yield make
+    for store in stores:
+        store.close()
+
+
+def pending(task_id: str, next_poll_at: float = NOW) -> TaskRecord:
+    return TaskRecord(task_id, "in_queue", interval=1.0, next_poll_at=next_poll_at, updated_at=NOW)
+
+
+def test_concurrent_claims_are_exclusive(make_stores):
+    first, second = make_stores(2)
+
+    async def main():
+        await first.add([pending(f"task-{index}") for index in range(10)])
+        claims = await asyncio.gather(*(store.claim_due(NOW, 4, LEASE) for store in (first, second, first)))
+        # 所有任务都已被认领，再次认领时没有到期任务
+        again = await second.claim_due(NOW, 10, LEASE)
+        return [[record.task_id for record in claim] for claim in claims], again
+
+    claims, again = asyncio.run(main())
+    claimed = [task_id for claim in claims for task_id in claim]
+    assert sorted(claimed) == sorted(f"task-{index}" for index in range(10))
+    assert sorted(len(claim) for claim in claims) == [2, 4, 4]
+    assert again == []
+
+
+def test_expired_lease_handed_over(make_stores):
+    first, second = make_stores(2)
+
+    async def main():
+        await first.add([pending("task-1"), pending("task-2", next_poll_at=NOW + 100)])
+        [claimed] = await first.claim_due(NOW, 10, LEASE)
+        # 认领的进程没有写回（如进程崩溃），租约期间其他进程取不到，到期后接手
+        during = await second.claim_due(NOW + LEASE - 1, 10, LEASE)
+        after = await second.claim_due(NOW + LEASE, 10, LEASE)
+        return claimed, during, after
+
+    claimed, during, after = asyncio.run(main())
+    assert claimed.task_id == "task-1"
+    assert during == []
+    assert [record.task_id for record in after] == ["task-1"]
+    assert after[0].next_poll_at == NOW + LEASE
+
+
+def test_update_releases_claim(make_stores):
+    [store] = make_stores()
+
+    async def main():
+        await store.add([pending("task-1"), pending("task-2")])
+        claimed = await store.claim_due(NOW, 10, LEASE)
+        for record in claimed:
+            record.updated_at = NOW + 1
+            if record.task_id == "task-1":
+                record.next_poll_at = NOW + 2
+            else:
+                record.status, record.result = "done", "https://cdn/2.jpg"
+        await store.update_many(claimed)
+        # 写回的next_poll_at替换租约；进入终态的任务不再被认领
+        reclaimed = await store.claim_due(NOW + 2, 10, LEASE)
+        records = await store.get_many(["task-1", "task-2", "missing"])
+        return reclaimed, records, await store.count_pending(), await store.next_due()
+
+    reclaimed, records, count, next_due = asyncio.run(main())
+    assert [record.task_id for record in reclaimed] == ["task-1"]
+    assert sorted(records) == ["task-1", "task-2"]
+    assert records["task-2"].terminal and records["task-2"].result == "https://cdn/2.jpg"
+    assert count == 1
+    assert next_due == NOW + 2 + LEASE
+
+
+def test_purge_drops_only_old_terminal_records(make_stores):
+    [store] = make_stores()
+
+    async def main():
+        await store.add([
+            TaskRecord("old-done", "done", result="https://cdn/1.jpg", updated_at=NOW - 100),
+            TaskRecord("old-failed", "failed", updated_at=NOW - 100),
+            TaskRecord("recent-done", "done", result="https://cdn/2.jpg", updated_at=NOW),
+            TaskRecord("old-pending", "generating", updated_at=NOW - 100),
+        ])
+        purged = await store.purge(NOW - 10)
+        return purged, await store.get_many(["old-done", "old-failed", "recent-done", "old-pending"])
+
+    purged, records = asyncio.run(main())
+    assert purged == 2
+    assert sorted(records) == ["old-pending", "recent-done"]
+
+
+def test_sqlite_persists_across_reopen(tmp_path):
+    path = str(tmp_path / "tasks.db")
+
+    async def main():
+        store = SqliteTaskStore(path)
+        await store.add([pending("task-1")])
+        record = (await store.get_many(["task-1"]))["task-1"]
+        record.local_url = "/static/results/1.jpg"
+        await store.update_many([record])
+        store.close()
+        reopened = SqliteTaskStore(path)
+        try:
+            return await reopened.list_pending(10), await reopened.list_mirrored()
+        finally:
+            reopened.close()
+
+    records, mirrored = asyncio.run(main())
+    assert [record.task_id for record in records] == ["task-1"]
+    assert mirrored == ["task-1"]
@@ -0,0 +1,102 @@
+"""
+图片上传测试
+超大、像素数超限或无法识别的图片返回400；相同内容只存储一次；返回的URL可以通过静态文件服务访问
+"""
+import asyncio
+import io
+import struct
+import zlib
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from PIL import Image
+
+from app.api.routes import router
+from app.core.config import settings
+from app.utils.static_files import STATIC_URL_PREFIX, CachedStaticFiles
+
+
+def jpeg(color=(200, 120, 40), size=(64, 48)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def png_header(width: int, height: int) -> bytes:
+    """
+    只有文件头的PNG，声明的尺寸可以任意大
+    """
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", b"\x00" * 16)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    static = tmp_path / "static"
+    uploads = static / "uploads"
+    uploads.mkdir(parents=True)
+    monkeypatch.setattr(settings, "STATIC_FOLDER", str(static))
+    monkeypatch.setattr(settings, "UPLOAD_FOLDER", str(uploads))
+    monkeypatch.setattr(settings, "PUBLIC_BASE_URL", "")
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    app.mount(STATIC_URL_PREFIX, CachedStaticFiles(directory=str(static)), name="static")
+
+    def request(method: str, url: str, **kwargs) -> httpx.Response:
+        async def main():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as http:
+                return await http.request(method, url, **kwargs)
+
+        return asyncio.run(main())
+
+    request.uploads = uploads
+    return request
+
+
+def upload(client, data: bytes) -> httpx.Response:
+    return client("POST", "/api/upload", files={"file": ("photo.jpg", data, "image/jpeg")})
+
+
+def test_upload_is_served(client):
+    response = upload(client, jpeg())
+    assert response.status_code == 200
+    result = response.json()["result"]
+    assert result["url"] == "http://testserver" + result["path"]
+    served = client("GET", result["path"])
+    assert served.status_code == 200
+    with Image.open(io.BytesIO(served.content)) as image:
+        assert image.size == (64, 48)
+
+
+def test_same_content_stored_once(client):
+    first = upload(client, jpeg()).json()["result"]["path"]
+    second = upload(client, jpeg()).json()["result"]["path"]
+    other = upload(client, jpeg(color=(10, 20, 30))).json()["result"]["path"]
+    assert first == second != other
+    assert len(list(client.uploads.iterdir())) == 2
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"not an image",
+    # 超过PIL解压炸弹阈值的文件头
+    png_header(20000, 20000),
+    # 低于PIL阈值但超过IMAGE_MAX_PIXELS
+    png_header(10000, 8000),
+], ids=["empty", "unrecognized", "decompression-bomb", "too-many-pixels"])
+def test_invalid_upload_rejected(client, data):
+    response = upload(client, data)
+    assert response.status_code == 400
+    assert list(client.uploads.iterdir()) == []
+
+
+def test_oversized_upload_rejected(client, monkeypatch):
+    monkeypatch.setattr(settings, "IMAGE_MAX_UPLOAD_BYTES", 1024)
+    response = upload(client, jpeg(size=(512, 512)) + b"\x00" * 2048)
+    assert response.status_code == 400
+    assert "大小超过限制" in response.json()["detail"]
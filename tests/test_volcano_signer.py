@@ -0,0 +1,93 @@
+"""
+VolcanoSigner签名测试
+期望的请求头由改造前的signV4Request对相同输入计算得到，签名器的输出必须与之逐字节一致
+"""
+import datetime
+import json
+
+import pytest
+
+from app.utils.volcano_signer import VolcanoSigner, formatQuery, getSignatureKey
+
+ACCESS_KEY = "AKLTtestaccesskey"
+SECRET_KEY = "testsecretkey=="
+REGION = "cn-north-1"
+QUERY_RESULT_QUERY = formatQuery({"Action": "CVSync2AsyncGetResult", "Version": "2022-08-31"})
+SUBMIT_QUERY = formatQuery({"Action": "CVSync2AsyncSubmitTask", "Version": "2022-08-31"})
+QUERY_BODY = json.dumps({"req_key": "jimeng_t2i_v40", "task_id": "7392616336519610409",
+                         "req_json": json.dumps({"return_url": True})})
+SUBMIT_BODY = json.dumps({"req_key": "jimeng_t2i_v40", "prompt": "请将第一张图片中的人物自然地融入第二张图片的场景中"},
+                         ensure_ascii=False)
+SIGNED_HEADERS = "SignedHeaders=content-type;host;x-content-sha256;x-date"
+
+GOLDEN = [
+    (
+        ACCESS_KEY, SECRET_KEY, QUERY_RESULT_QUERY, QUERY_BODY, datetime.datetime(2024, 3, 15, 8, 30, 45),
+        {
+            "X-Date": "20240315T083045Z",
+            "Authorization": f"HMAC-SHA256 Credential={ACCESS_KEY}/20240315/cn-north-1/cv/request, {SIGNED_HEADERS}, "
+                             "Signature=5b019c25d7795576270756296d0e782fef015dcf4feda42d0ed57d15406464cc",
+            "X-Content-Sha256": "96412ba4b6798719a5e9e1d85af214485bc5d22cb8365f0bcf94aa0a3e6dd9f0",
+            "Content-Type": "application/json",
+        },
+    ),
+    (
+        ACCESS_KEY, SECRET_KEY, QUERY_RESULT_QUERY, QUERY_BODY, datetime.datetime(2024, 3, 16, 0, 0, 1),
+        {
+            "X-Date": "20240316T000001Z",
+            "Authorization": f"HMAC-SHA256 Credential={ACCESS_KEY}/20240316/cn-north-1/cv/request, {SIGNED_HEADERS}, "
+                             "Signature=a47a2b840128efaae48c05d124fdf953856c5b8f1daa78e40901a8f58248483a",
+            "X-Content-Sha256": "96412ba4b6798719a5e9e1d85af214485bc5d22cb8365f0bcf94aa0a3e6dd9f0",
+            "Content-Type": "application/json",
+        },
+    ),
+    (
+        ACCESS_KEY, SECRET_KEY, SUBMIT_QUERY, SUBMIT_BODY, datetime.datetime(2024, 3, 15, 8, 30, 45),
+        {
+            "X-Date": "20240315T083045Z",
+            "Authorization": f"HMAC-SHA256 Credential={ACCESS_KEY}/20240315/cn-north-1/cv/request, {SIGNED_HEADERS}, "
+                             "Signature=ca92871f56edd22f8ea7d4dc4ffce189bc71b11aa05202f392ad121106acf86a",
+            "X-Content-Sha256": "5b7b1afbbff06205491e54a9af4a83fbd4d8000abca26a41d65de5489bf38519",
+            "Content-Type": "application/json",
+        },
+    ),
+    (
+        "AKLTanotherkey", "anothersecret", QUERY_RESULT_QUERY, "", datetime.datetime(2024, 3, 15, 8, 30, 45),
+        {
+            "X-Date": "20240315T083045Z",
+            "Authorization": "HMAC-SHA256 Credential=AKLTanotherkey/20240315/cn-north-1/cv/request, "
+                             f"{SIGNED_HEADERS}, "
+                             "Signature=133f92cc47c8f66f16e46c8e08715f12ced864b17c71a0a405eb917382b8ce22",
+            "X-Content-Sha256": "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855",
+            "Content-Type": "application/json",
+        },
+    ),
+]
+
+
+@pytest.mark.parametrize("access_key, secret_key, query, body, now, expected", GOLDEN)
+def test_signature_matches_legacy(access_key, secret_key, query, body, now, expected):
+    signer = VolcanoSigner(access_key, secret_key, REGION)
+    assert signer.sign(query, body, now=now) == expected
+
+
+@pytest.mark.parametrize("access_key, secret_key, query, body, now, expected", GOLDEN)
+def test_bytes_body_matches_str_body(access_key, secret_key, query, body, now, expected):
+    signer = VolcanoSigner(access_key, secret_key, REGION)
+    assert signer.sign(query, body.encode("utf-8"), now=now) == expected
+
+
+def test_signer_is_reusable_across_days():
+    # 同一个签名器跨UTC日期签名时使用新日期的派生密钥
+    signer = VolcanoSigner(ACCESS_KEY, SECRET_KEY, REGION)
+    for access_key, secret_key, query, body, now, expected in GOLDEN[:3]:
+        assert signer.sign(query, body, now=now) == expected
+
+
+def test_signing_key_is_cached_per_day():
+    getSignatureKey.cache_clear()
+    signer = VolcanoSigner(ACCESS_KEY, SECRET_KEY, REGION)
+    for second in range(10):
+        signer.sign(QUERY_RESULT_QUERY, QUERY_BODY, now=datetime.datetime(2024, 3, 15, 8, 30, second))
+    info = getSignatureKey.cache_info()
+    assert (info.misses, info.hits) == (1, 9)